@@ -0,0 +1,81 @@
+"""
+Mesure la taille du prompt envoyé à Gemini avant/après le résumé extractif.
+
+Usage :
+    python benchmarks/bench_prompt_size.py                 # articles d'exemple (bruités)
+    python benchmarks/bench_prompt_size.py article1.txt …  # textes au format du scraper
+
+Avant = les 3000 premiers caractères bruts (ancien comportement), après = tools/summarizer.
+Les tokens sont estimés à ~4 caractères par token.
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.content_generator import ROLE_BLOCK, RULES_BLOCK, STYLE_BLOCK
+from tools.summarizer import summarize_source, PROMPT_CONTEXT_CHARS
+
+BOILERPLATE = (
+    "Nous utilisons des cookies pour améliorer votre expérience. Accepter tous les cookies.\n"
+    "Accueil | Tech | IA | Crypto | Jeux vidéo\n"
+    "Abonnez-vous à notre newsletter pour ne rien rater de l'actualité tech.\n"
+)
+RELATED = (
+    "Lire aussi : OpenAI prépare un nouveau modèle de raisonnement\n"
+    "Lire aussi : Les meilleures cartes graphiques du moment\n"
+    "Partager cet article sur X, Facebook et LinkedIn\n"
+    "© 2025 Média Tech. Tous droits réservés.\n"
+)
+
+def sample_article(title: str, paragraphs: list[str]) -> str:
+    body = "\n".join(paragraphs * 3)
+    return f"Title: {title}\nPublished: 2025-06-01\n\nContent:\n{BOILERPLATE}{body}\n{RELATED * 2}"
+
+SAMPLES = [
+    ("Mistral AI lève 600 M€", sample_article("Mistral AI lève 600 millions d'euros", [
+        "La startup française Mistral AI annonce une levée de 600 millions d'euros menée par General Catalyst.",
+        "L'opération valorise l'entreprise à 6 milliards d'euros, un record pour une jeune pousse européenne de l'IA.",
+        "Les fonds serviront à entraîner de nouveaux modèles open-weight et à étendre ses capacités de calcul en Europe.",
+        "Fondée en 2023 par d'anciens chercheurs de DeepMind et Meta, la société compte désormais plus de 150 employés.",
+    ])),
+    ("Nvidia Blackwell", sample_article("Nvidia dévoile Blackwell", [
+        "Nvidia présente l'architecture Blackwell avec 208 milliards de transistors.",
+        "Le GPU B200 promet des performances d'inférence 30 fois supérieures au H100 sur les grands modèles de langage.",
+        "La consommation d'énergie serait réduite d'un facteur 25 pour une charge équivalente selon le constructeur.",
+        "Les premières livraisons aux hébergeurs cloud sont prévues avant la fin de l'année.",
+    ])),
+]
+
+def prompt_chars(context: str) -> int:
+    return len(ROLE_BLOCK) + len(RULES_BLOCK) + len(STYLE_BLOCK) + len(context)
+
+def main(paths: list[str]):
+    articles = SAMPLES
+    if paths:
+        articles = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                articles.append((os.path.basename(path), f.read()))
+
+    print(f"Budget de contexte : {PROMPT_CONTEXT_CHARS} caractères\n")
+    total_before = total_after = 0
+    for topic, text in articles:
+        before = text[:3000]
+        started = time.perf_counter()
+        after = summarize_source(text, topic)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        before_chars, after_chars = prompt_chars(before), prompt_chars(after)
+        total_before += before_chars
+        total_after += after_chars
+        print(
+            f"{topic[:30]:<30} | contexte {len(before):>5} → {len(after):>5} car. | "
+            f"prompt ~{before_chars // 4:>5} → ~{after_chars // 4:>5} tok | résumé {elapsed_ms:.1f} ms"
+        )
+
+    print(f"\nRéduction totale du prompt : {1 - total_after / total_before:.0%}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
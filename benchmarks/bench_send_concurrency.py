@@ -0,0 +1,103 @@
+"""
+Mesure le temps de rattrapage d'une file de tweets dus, envoi séquentiel vs envoi parallèle.
+
+Usage :
+    python benchmarks/bench_send_concurrency.py                  # 40 tweets, 300 ms par appel
+    python benchmarks/bench_send_concurrency.py 100 0.5 --limit 60
+
+Aucun appel réseau : les clients Twitter sont remplacés par une fausse API locale
+(latence fixe par create_tweet, IDs séquentiels) et la base est un fichier temporaire.
+La dernière colonne vérifie que le quota mensuel (--limit) n'est jamais dépassé.
+"""
+import argparse
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import database
+import scheduler_service
+from tools import twitter
+
+class FakeTwitterAPI:
+    """Fausse API Twitter : chaque appel dure `latency` secondes, les IDs sont séquentiels."""
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def create_tweet(self, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            tweet_id = next(self._ids)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        return SimpleNamespace(data={'id': str(tweet_id)})
+
+    def media_upload(self, filename=None, file=None):
+        time.sleep(self.latency)
+        return SimpleNamespace(media_id=next(self._ids), expires_after_secs=86400)
+
+class FakeClients:
+    """Remplace twitter.TwitterClients : v2 et v1.1 pointent vers la même fausse API."""
+    api = None
+
+    def __init__(self, credentials: tuple):
+        self.v2 = self.v1 = FakeClients.api
+
+    def close(self):
+        pass
+
+def run(tweets: int, latency: float, concurrency: int, limit: int) -> tuple[float, int, int]:
+    database.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench_send.db")
+    database.init_db()
+    database.update_account(database.DEFAULT_ACCOUNT_ID, monthly_limit=limit)
+    due = datetime.now() - timedelta(minutes=1)
+    for i in range(tweets):
+        tweet_id = database.add_scheduled_tweet(f"Tweet de test {i}", due)
+        database.approve_tweet(tweet_id)
+
+    FakeClients.api = FakeTwitterAPI(latency)
+    twitter.reset_twitter_clients()
+    scheduler_service.SEND_CONCURRENCY = concurrency
+
+    started = time.perf_counter()
+    scheduler_service.check_and_send_tweets()
+    elapsed = time.perf_counter() - started
+    return elapsed, database.get_monthly_count(), FakeClients.api.peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tweets", nargs="?", type=int, default=40)
+    parser.add_argument("latency", nargs="?", type=float, default=0.3, help="latence d'un appel (s)")
+    parser.add_argument("--limit", type=int, default=database.DEFAULT_MONTHLY_LIMIT, help="quota mensuel")
+    args = parser.parse_args()
+
+    for name in ("TWITTER_API_KEY", "TWITTER_API_SECRET", "TWITTER_ACCESS_TOKEN", "TWITTER_ACCESS_TOKEN_SECRET"):
+        os.environ[name] = "bench"
+    twitter.TwitterClients = FakeClients
+    # Les journaux d'envoi (un par tweet) masqueraient les résultats
+    logging.getLogger().setLevel(logging.ERROR)
+
+    print(f"{args.tweets} tweets dus, {args.latency * 1000:.0f} ms par appel, quota {args.limit}")
+    for concurrency in (1, 2, 4, 8):
+        elapsed, sent, peak = run(args.tweets, args.latency, concurrency, args.limit)
+        print(
+            f"workers {concurrency:>2} | {elapsed:6.2f} s | {sent / elapsed:6.1f} tweets/s | "
+            f"appels simultanés max {peak:>2} | envoyés {sent}/{min(args.tweets, args.limit)}"
+            f"{'' if sent <= args.limit else '  QUOTA DÉPASSÉ'}"
+        )
+
+if __name__ == "__main__":
+    main()
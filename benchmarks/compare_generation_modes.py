@@ -0,0 +1,66 @@
+"""
+Compare le coût par tweet (tokens, latence) du mode batch et des appels unitaires.
+
+Usage :
+    python benchmarks/compare_generation_modes.py            # appels réels (GEMINI_API_KEY requise)
+    python benchmarks/compare_generation_modes.py --from-db  # moyennes enregistrées par le worker
+    LLM_PROVIDER=stub python benchmarks/compare_generation_modes.py  # hors ligne, fournisseur local
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# On mesure le coût des appels au modèle : pas de cache des générations
+os.environ.setdefault("GENERATION_CACHE_ENABLED", "0")
+
+from tools.generation_service import GenerationService, GENERATION_BATCH_SIZE
+
+SAMPLE_ARTICLES = [
+    {'topic': "Mistral AI lève 600 M€", 'source_content': "Title: Mistral AI lève 600 millions d'euros\n\nContent:\nLa startup française Mistral AI annonce une levée de 600 millions d'euros menée par General Catalyst, valorisant l'entreprise à 6 milliards. Les fonds serviront à entraîner de nouveaux modèles open-weight et à étendre ses capacités de calcul en Europe."},
+    {'topic': "Nvidia Blackwell", 'source_content': "Title: Nvidia dévoile Blackwell\n\nContent:\nNvidia présente l'architecture Blackwell avec 208 milliards de transistors. Le GPU B200 promet des performances d'inférence 30 fois supérieures au H100 sur les grands modèles de langage, pour une consommation réduite."},
+    {'topic': "Twitch et les streamers", 'source_content': "Title: Twitch change le partage des revenus\n\nContent:\nTwitch annonce que les streamers partenaires pourront conserver 70 % des revenus d'abonnement dès 100 abonnés actifs, contre 50 % auparavant. Le changement entre en vigueur le mois prochain."},
+    {'topic': "Bitcoin ETF", 'source_content': "Title: Les ETF Bitcoin dépassent 50 milliards\n\nContent:\nLes ETF Bitcoin au comptant américains cumulent plus de 50 milliards de dollars d'actifs sous gestion, un an après leur lancement. BlackRock détient à lui seul près de la moitié des encours."},
+    {'topic': "GTA VI", 'source_content': "Title: GTA VI repoussé\n\nContent:\nRockstar Games confirme le report de GTA VI à l'automne de l'année prochaine. Le studio évoque la nécessité de peaufiner le jeu, très attendu après une bande-annonce vue plus de 200 millions de fois."},
+]
+
+def summarize(label: str, results: list[dict], wall_ms: float):
+    ok = [r for r in results if "Error" not in r['tweet']]
+    if not ok:
+        print(f"{label}: aucun tweet généré ({results[0]['tweet'] if results else 'aucun résultat'})")
+        return
+    avg = lambda key: sum(r[key] for r in ok) / len(ok)
+    print(
+        f"{label:<8} | {len(ok)}/{len(results)} tweets | prompt {avg('prompt_tokens'):>6.0f} tok/tweet | "
+        f"sortie {avg('output_tokens'):>5.0f} tok/tweet | latence {avg('latency_ms'):>6.0f} ms/tweet | total {wall_ms:.0f} ms"
+    )
+
+async def run_live():
+    service = GenerationService()
+    requests = [dict(article, tone="informative") for article in SAMPLE_ARTICLES]
+
+    started = time.perf_counter()
+    single = [await service.generate_with_stats(r['topic'], r['source_content'], r['tone']) for r in requests]
+    summarize("single", single, (time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    batch = await service.generate_batch(requests, batch_size=GENERATION_BATCH_SIZE)
+    summarize("batch", batch, (time.perf_counter() - started) * 1000)
+
+def show_db_summary():
+    from database import get_generation_metrics_summary
+    rows = get_generation_metrics_summary()
+    if not rows:
+        print("Aucune métrique de génération enregistrée.")
+    for row in rows:
+        print(
+            f"{row['mode']:<8} | {row['tweets']} tweets | prompt {row['avg_prompt_tokens']:.0f} tok/tweet | "
+            f"sortie {row['avg_output_tokens']:.0f} tok/tweet | latence {row['avg_latency_ms']:.0f} ms/tweet"
+        )
+
+if __name__ == "__main__":
+    if "--from-db" in sys.argv:
+        show_db_summary()
+    else:
+        asyncio.run(run_live())
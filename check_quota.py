@@ -1,39 +1,37 @@
-import sqlite3
 from datetime import datetime, timedelta
+from database import get_accounts, get_usage_counts, get_db_connection
 
 def count_recent_tweets():
-    conn = sqlite3.connect('tweets.db')
+    # Compteurs d'usage : lecture directe, sans parcourir l'historique des tweets
+    now = datetime.now()
+    today, month = now.strftime('%Y-%m-%d'), now.strftime('%Y-%m')
+
+    for account in get_accounts(active_only=False):
+        daily = get_usage_counts(account['id'], today)
+        monthly = get_usage_counts(account['id'], month)
+        print(
+            f"[{account['name']}] Posts envoyés aujourd'hui : {daily.get('sent', 0)} "
+            f"(échecs {daily.get('failed', 0)}) | ce mois : {monthly.get('sent', 0)}/{account['monthly_limit']}"
+        )
+
+    # Détails des envois des dernières 24h (index status, status_updated_at)
+    yesterday = now - timedelta(days=1)
+    conn = get_db_connection()
     cursor = conn.cursor()
-    
-    # Calculer la date d'hier à la même heure
-    yesterday = datetime.now() - timedelta(days=1)
-    
-    cursor.execute('''
-        SELECT COUNT(*) 
-        FROM tweets 
-        WHERE status = 'sent' 
-        AND created_at >= ?
-    ''', (yesterday,))
-    
-    count = cursor.fetchone()[0]
-    
-    print(f"Tweets envoyés ces dernières 24h : {count}")
-    
-    # Détails
     cursor.execute('''
-        SELECT created_at, content 
-        FROM tweets 
-        WHERE status = 'sent' 
-        AND created_at >= ?
-        ORDER BY created_at DESC
+        SELECT status_updated_at, content
+        FROM tweets
+        WHERE status = 'sent'
+        AND status_updated_at >= ?
+        ORDER BY status_updated_at DESC
     ''', (yesterday,))
-    
+
     tweets = cursor.fetchall()
     if tweets:
         print("\nDétails :")
         for t in tweets:
             print(f"- {t[0]} : {t[1][:50]}...")
-            
+
     conn.close()
 
 if __name__ == "__main__":
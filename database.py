@@ -1,9 +1,15 @@
 import sqlite3
 import os
+import json
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 
 DB_NAME = "tweets.db"
+# Compte créé à l'initialisation (identifiants TWITTER_* du .env) : compte des données existantes
+DEFAULT_ACCOUNT_ID = 1
+DEFAULT_MONTHLY_LIMIT = 500
+# Statuts comptés dans usage_counters (transitions finales d'un envoi)
+USAGE_COUNTED_STATUSES = ('sent', 'failed', 'skipped')
 
 def get_db_connection():
     conn = sqlite3.connect(DB_NAME)
@@ -20,7 +26,7 @@ def init_db():
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         content TEXT NOT NULL,
         scheduled_time TIMESTAMP NOT NULL,
-        status TEXT NOT NULL DEFAULT 'awaiting_approval', -- awaiting_approval, pending, sent, failed, skipped
+        status TEXT NOT NULL DEFAULT 'awaiting_approval', -- awaiting_approval, pending, sending, sent, failed, skipped
         twitter_id TEXT,
         error_message TEXT,
         source_url TEXT,
@@ -48,6 +54,69 @@ def init_db():
         cursor.execute('ALTER TABLE tweets ADD COLUMN thread_content TEXT')
     except sqlite3.OperationalError:
         pass # La colonne existe déjà
+
+    # Migration : IDs Twitter des parties de thread déjà publiées (reprise après échec)
+    try:
+        cursor.execute('ALTER TABLE tweets ADD COLUMN thread_posted_ids TEXT')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+
+    # Migration : media_id pré-uploadé (avant l'heure d'envoi) et sa date d'expiration
+    try:
+        cursor.execute('ALTER TABLE tweets ADD COLUMN media_id TEXT')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+    try:
+        cursor.execute('ALTER TABLE tweets ADD COLUMN media_expires_at TIMESTAMP')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+
+    # Migration : début de l'envoi en cours (statut 'sending'), pour reprendre un envoi interrompu
+    try:
+        cursor.execute('ALTER TABLE tweets ADD COLUMN sending_at TIMESTAMP')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+    
+    # Migration : date du dernier changement de statut (période des compteurs d'usage)
+    try:
+        cursor.execute('ALTER TABLE tweets ADD COLUMN status_updated_at TIMESTAMP')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tweets_status_updated ON tweets (status, status_updated_at)')
+    
+    # Migration : nombre de posts facturés par l'API pour l'envoi en cours (parties de thread restantes), fixé à la réservation
+    try:
+        cursor.execute('ALTER TABLE tweets ADD COLUMN post_count INTEGER')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+    # Migration : posts de ce tweet déjà comptés dans le compteur 'sent' (parties publiées avant un échec)
+    try:
+        cursor.execute('ALTER TABLE tweets ADD COLUMN billed_posts INTEGER DEFAULT 0')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+    
+    # Comptes Twitter : identifiants lus dans le .env ({env_prefix}API_KEY, ...), quota mensuel par compte
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS accounts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        env_prefix TEXT NOT NULL DEFAULT 'TWITTER_',
+        monthly_limit INTEGER NOT NULL DEFAULT 500,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute(
+        "INSERT OR IGNORE INTO accounts (id, name, env_prefix, monthly_limit) VALUES (?, 'default', 'TWITTER_', ?)",
+        (DEFAULT_ACCOUNT_ID, DEFAULT_MONTHLY_LIMIT)
+    )
+    
+    # Migration : compte de publication (les tweets existants appartiennent au compte par défaut)
+    try:
+        cursor.execute(f'ALTER TABLE tweets ADD COLUMN account_id INTEGER DEFAULT {DEFAULT_ACCOUNT_ID}')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tweets_account_status ON tweets (account_id, status)')
     
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS monitored_topics (
@@ -67,6 +136,18 @@ def init_db():
     except sqlite3.OperationalError:
         pass # La colonne existe déjà
     
+    # Migration : compte qui publie les tweets générés pour ce sujet
+    try:
+        cursor.execute(f'ALTER TABLE monitored_topics ADD COLUMN account_id INTEGER DEFAULT {DEFAULT_ACCOUNT_ID}')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+    
+    # Migration : curseur de recherche Twitter (ID du dernier tweet vu pour ce sujet)
+    try:
+        cursor.execute('ALTER TABLE monitored_topics ADD COLUMN since_id TEXT')
+    except sqlite3.OperationalError:
+        pass # La colonne existe déjà
+    
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS processed_urls (
         url TEXT PRIMARY KEY,
@@ -83,12 +164,244 @@ def init_db():
     )
     ''')
     
+    # File de travaux persistante (scrape, génération...) pour survivre aux redémarrages
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        payload TEXT NOT NULL DEFAULT '{}', -- JSON
+        state TEXT NOT NULL DEFAULT 'queued', -- queued, running, done, failed
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 3,
+        available_at TIMESTAMP NOT NULL,
+        locked_at TIMESTAMP,
+        last_error TEXT,
+        dedup_key TEXT UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (state, available_at)')
+    
+    # Cache des générations (clé = hash du contenu source normalisé, sujet, ton, modèle, version du prompt)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS generation_cache (
+        key TEXT PRIMARY KEY,
+        tweet TEXT NOT NULL,
+        model TEXT,
+        prompt_version TEXT,
+        hits INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL,
+        last_used_at TIMESTAMP NOT NULL
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_generation_cache_lru ON generation_cache (last_used_at)')
+    
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS generation_cache_stats (
+        event TEXT PRIMARY KEY, -- hit, miss
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    
+    # Coûts de génération par tweet (comparaison mode batch / appels unitaires)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS generation_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mode TEXT NOT NULL, -- single, batch
+        prompt_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        latency_ms INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Latence de chaque envoi (téléchargement et upload de l'image, publication)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS send_metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tweet_id INTEGER,
+        status TEXT NOT NULL, -- sent, rate_limited, failed
+        error_class TEXT,
+        download_ms INTEGER DEFAULT 0,
+        upload_ms INTEGER DEFAULT 0,
+        post_ms INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Fenêtres de rate limit Twitter par endpoint et par compte (en-têtes x-rate-limit-*)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        endpoint TEXT NOT NULL,
+        account TEXT NOT NULL,
+        remaining INTEGER,
+        limit_total INTEGER,
+        reset_at TIMESTAMP,
+        next_allowed_at TIMESTAMP, -- NULL : appel autorisé
+        updated_at TIMESTAMP,
+        PRIMARY KEY (endpoint, account)
+    )
+    ''')
+    
+    # Santé des instances Nitter (moyennes glissantes) et pause après échecs, conservées entre deux exécutions
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS nitter_health (
+        instance TEXT PRIMARY KEY,
+        requests INTEGER NOT NULL DEFAULT 0,
+        latency_ms REAL NOT NULL DEFAULT 0,
+        rate_limit_rate REAL NOT NULL DEFAULT 0,
+        empty_rate REAL NOT NULL DEFAULT 0,
+        error_rate REAL NOT NULL DEFAULT 0,
+        consecutive_failures INTEGER NOT NULL DEFAULT 0,
+        cooldown_until TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    ''')
+    
+    # media_id Twitter déjà uploadés, par hash de l'image et par compte (valables quelques heures)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS media_cache (
+        image_hash TEXT NOT NULL,
+        account TEXT NOT NULL,
+        source_url TEXT,
+        media_id TEXT NOT NULL,
+        expires_at TIMESTAMP NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (image_hash, account)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_media_cache_url ON media_cache (source_url, account)')
+    
+    # Compteurs d'usage par compte, par période ('AAAA-MM' ou 'AAAA-MM-JJ') et par statut :
+    # tenus à jour à chaque changement de statut, le quota se lit sans parcourir l'historique
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'usage_counters'")
+    backfill_usage = cursor.fetchone() is None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS usage_counters (
+        account_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (account_id, period, status)
+    )
+    ''')
+
+    # Tweets suivis par le top (métadonnées, une ligne par tweet) et séries de leurs métriques :
+    # une ligne compacte par relevé (horodatage en secondes epoch, sans rowid), groupée par tweet
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tracked_tweets (
+        tweet_id TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        text TEXT NOT NULL,
+        topic TEXT,
+        created_at TIMESTAMP NOT NULL,
+        first_seen_at TIMESTAMP NOT NULL,
+        last_seen_at TIMESTAMP NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS tweet_metric_snapshots (
+        tweet_id TEXT NOT NULL,
+        captured_at INTEGER NOT NULL,
+        likes INTEGER NOT NULL,
+        retweets INTEGER NOT NULL,
+        views INTEGER NOT NULL,
+        PRIMARY KEY (tweet_id, captured_at)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_metric_snapshots_captured ON tweet_metric_snapshots (captured_at)')
+
     conn.commit()
     conn.close()
     
-    # Charger les sujets fixes après l'initialisation
+    # Base existante : compteurs reconstruits une fois depuis tout l'historique
+    if backfill_usage:
+        reconcile_usage_counters()
+    
+    # Charger les comptes puis les sujets fixes après l'initialisation
+    load_accounts_from_env()
     load_fixed_topics()
 
+def load_accounts_from_env():
+    """
+    Déclare les comptes de la variable TWITTER_ACCOUNTS ("nom:PREFIXE_,nom2:PREFIXE2_").
+    Les identifiants d'un compte sont lus dans {PREFIXE}API_KEY, {PREFIXE}API_SECRET, etc.
+    """
+    accounts_env = os.getenv("TWITTER_ACCOUNTS")
+    if not accounts_env:
+        return "No TWITTER_ACCOUNTS found in environment."
+    
+    count_added = 0
+    for entry in [a.strip() for a in accounts_env.split(',') if a.strip()]:
+        name, _, env_prefix = entry.partition(':')
+        env_prefix = env_prefix.strip() or f"TWITTER_{name.strip().upper()}_"
+        if add_account(name.strip(), env_prefix) is not None:
+            count_added += 1
+    return f"Loaded {count_added} new accounts from env."
+
+def add_account(name: str, env_prefix: str, monthly_limit: int = DEFAULT_MONTHLY_LIMIT) -> Optional[int]:
+    """Ajoute un compte Twitter. Retourne son ID, ou None s'il existe déjà."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'INSERT OR IGNORE INTO accounts (name, env_prefix, monthly_limit) VALUES (?, ?, ?)',
+        (name, env_prefix, monthly_limit)
+    )
+    
+    account_id = cursor.lastrowid if cursor.rowcount else None
+    conn.commit()
+    conn.close()
+    return account_id
+
+def update_account(account_id: int, monthly_limit: Optional[int] = None, is_active: Optional[bool] = None):
+    """Modifie le quota mensuel et/ou l'activation d'un compte."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    if monthly_limit is not None:
+        cursor.execute('UPDATE accounts SET monthly_limit = ? WHERE id = ?', (monthly_limit, account_id))
+    if is_active is not None:
+        cursor.execute('UPDATE accounts SET is_active = ? WHERE id = ?', (1 if is_active else 0, account_id))
+    
+    conn.commit()
+    conn.close()
+
+def get_accounts(active_only: bool = True) -> List[Dict]:
+    """Récupère les comptes Twitter."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    query = 'SELECT * FROM accounts'
+    if active_only:
+        query += ' WHERE is_active = 1'
+    cursor.execute(query + ' ORDER BY id')
+    
+    accounts = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return accounts
+
+def get_account(account_id: int) -> Optional[Dict]:
+    """Retourne un compte par son ID, ou None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM accounts WHERE id = ?', (account_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def get_account_by_name(name: str) -> Optional[Dict]:
+    """Retourne un compte par son nom, ou None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM accounts WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
 def load_fixed_topics():
     """Charge les sujets fixes depuis la variable d'environnement FIXED_TOPICS."""
     fixed_topics_env = os.getenv("FIXED_TOPICS")
@@ -143,14 +456,19 @@ def get_setting(key: str, default: str = None) -> str:
     finally:
         conn.close()
 
-def add_scheduled_tweet(content: str, run_date: datetime, source_url: str = None, image_url: str = None) -> int:
+def add_scheduled_tweet(content: str, run_date: datetime, source_url: str = None, image_url: str = None,
+                        error_message: str = None, thread_content: str = None,
+                        account_id: int = DEFAULT_ACCOUNT_ID) -> int:
     """Ajoute un tweet à la file d'attente (en attente de validation)."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute(
-        'INSERT INTO tweets (content, scheduled_time, status, source_url, image_url) VALUES (?, ?, ?, ?, ?)',
-        (content, run_date, 'awaiting_approval', source_url, image_url)
+        '''
+        INSERT INTO tweets (content, scheduled_time, status, source_url, image_url, error_message, thread_content, account_id) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''',
+        (content, run_date, 'awaiting_approval', source_url, image_url, error_message, thread_content, account_id)
     )
     
     tweet_id = cursor.lastrowid
@@ -198,158 +516,571 @@ def delete_scheduled_tweet(tweet_id: int):
     conn.commit()
     conn.close()
 
+def _usage_periods(moment: datetime) -> tuple:
+    """Périodes des compteurs d'usage d'un instant : (mois, jour)."""
+    return moment.strftime('%Y-%m'), moment.strftime('%Y-%m-%d')
+
+def _increment_usage(cursor, account_id: int, status: str, moment: datetime, amount: int = 1):
+    """Incrémente les compteurs mensuel et journalier (dans la transaction de l'appelant)."""
+    for period in _usage_periods(moment):
+        cursor.execute(
+            '''
+            INSERT INTO usage_counters (account_id, period, status, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT(account_id, period, status) DO UPDATE SET count = count + excluded.count
+            ''',
+            (account_id, period, status, amount)
+        )
+
 def update_tweet_status(tweet_id: int, status: str, twitter_id: Optional[str] = None, error: Optional[str] = None):
-    """Met à jour le statut d'un tweet."""
+    """
+    Met à jour le statut d'un tweet et, dans la même transaction, les compteurs d'usage de son compte.
+    Le compteur 'sent' compte les posts facturés : toutes les parties d'un thread, y compris celles
+    publiées avant un échec ou un rate limit. Les autres compteurs comptent les tweets.
+    """
     conn = get_db_connection()
+    conn.isolation_level = None # Transactions gérées manuellement
     cursor = conn.cursor()
     
-    cursor.execute(
-        '''
-        UPDATE tweets 
-        SET status = ?, twitter_id = ?, error_message = ? 
-        WHERE id = ?
-        ''',
-        (status, twitter_id, error, tweet_id)
-    )
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute(
+            'SELECT status, account_id, post_count, billed_posts, thread_posted_ids FROM tweets WHERE id = ?', (tweet_id,)
+        )
+        previous = cursor.fetchone()
     
-    conn.commit()
-    conn.close()
+        now = datetime.now()
+        cursor.execute(
+            '''
+            UPDATE tweets
+            SET status = ?, twitter_id = ?, error_message = ?, status_updated_at = ?
+            WHERE id = ?
+            ''',
+            (status, twitter_id, error, now, tweet_id)
+        )
+        if previous:
+            account_id = previous['account_id'] or DEFAULT_ACCOUNT_ID
+            # Posts publiés : parties de thread enregistrées, ou tous les posts réservés à l'envoi
+            billed = previous['billed_posts'] or 0
+            posted = len(json.loads(previous['thread_posted_ids'] or '[]'))
+            if status == 'sent' and previous['status'] != 'sent':
+                posted = max(posted, billed + (previous['post_count'] or 1))
+            if posted > billed:
+                _increment_usage(cursor, account_id, 'sent', now, posted - billed)
+                cursor.execute('UPDATE tweets SET billed_posts = ? WHERE id = ?', (posted, tweet_id))
+            # Seul un changement de statut est compté (pas une simple mise à jour de l'erreur)
+            if previous['status'] != status and status in USAGE_COUNTED_STATUSES and status != 'sent':
+                _increment_usage(cursor, account_id, status, now)
+    
+        cursor.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
 
-def get_monthly_count() -> int:
-    """Compte le nombre de tweets envoyés ce mois-ci."""
+def reserve_tweet_send(tweet_id: int, monthly_limit: int, posts: int = 1) -> str:
+    """
+    Réserve atomiquement un tweet pour l'envoi et `posts` places dans le quota mensuel de son compte
+    (un thread de N parties est facturé N posts par l'API ; à la reprise, seules les parties restantes).
+    Les envois en cours ('sending') comptent dans le quota : des envois parallèles
+    (threads ou processus) ne peuvent pas dépasser monthly_limit.
+
+    Returns:
+        'reserved', 'quota_exceeded' ou 'unavailable' (tweet déjà pris ou plus en attente).
+    """
     conn = get_db_connection()
+    conn.isolation_level = None # Transactions gérées manuellement
     cursor = conn.cursor()
     
-    now = datetime.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    cursor.execute(
-        '''
-        SELECT COUNT(*) as count 
-        FROM tweets 
-        WHERE status = 'sent' 
-        AND scheduled_time >= ?
-        ''',
-        (start_of_month,)
-    )
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        
+        now = datetime.now()
+        cursor.execute('SELECT account_id FROM tweets WHERE id = ?', (tweet_id,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute('ROLLBACK')
+            return 'unavailable'
+        account_id = row['account_id'] or DEFAULT_ACCOUNT_ID
     
-    result = cursor.fetchone()
-    conn.close()
-    return result['count'] if result else 0
-
-# --- Monitoring Functions ---
+        # Posts envoyés ce mois (compteur d'usage) + posts des envois en cours (index account_id, status)
+        cursor.execute(
+            '''
+            SELECT
+                (SELECT COALESCE(SUM(count), 0) FROM usage_counters
+                 WHERE account_id = ? AND period = ? AND status = 'sent')
+                + (SELECT COALESCE(SUM(COALESCE(post_count, 1)), 0) FROM tweets
+                   WHERE account_id = ? AND status = 'sending') as count
+            ''',
+            (account_id, _usage_periods(now)[0], account_id)
+        )
+        if cursor.fetchone()['count'] + posts > monthly_limit:
+            cursor.execute('ROLLBACK')
+            return 'quota_exceeded'
+        
+        cursor.execute(
+            "UPDATE tweets SET status = 'sending', sending_at = ?, post_count = ? WHERE id = ? AND status = 'pending'",
+            (now, posts, tweet_id)
+        )
+        if cursor.rowcount == 0:
+            cursor.execute('ROLLBACK')
+            return 'unavailable'
+        
+        cursor.execute('COMMIT')
+        return 'reserved'
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
 
-def add_monitored_topic(query: str, interval_minutes: int = 60, source_type: str = 'web_search') -> int:
-    """Ajoute un sujet à surveiller."""
+def requeue_stale_sends(lease_seconds: int = 600) -> int:
+    """Remet en attente les envois interrompus (processus arrêté pendant l'envoi)."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute(
-        'INSERT INTO monitored_topics (query, interval_minutes, source_type) VALUES (?, ?, ?)',
-        (query, interval_minutes, source_type)
+        "UPDATE tweets SET status = 'pending', sending_at = NULL WHERE status = 'sending' AND sending_at < ?",
+        (datetime.now() - timedelta(seconds=lease_seconds),)
     )
     
-    topic_id = cursor.lastrowid
+    count = cursor.rowcount
     conn.commit()
     conn.close()
-    return topic_id
-
-def get_active_topics() -> List[Dict]:
-    """Récupère les sujets actifs."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM monitored_topics WHERE is_active = 1')
-    
-    topics = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return topics
+    return count
 
-def update_topic_last_run(topic_id: int):
-    """Met à jour la date de dernière exécution d'un sujet."""
+def get_recent_tweets(limit: int = 300) -> List[Dict]:
+    """Récupère les derniers tweets envoyés ou en file (id, content), du plus récent au plus ancien."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute(
-        'UPDATE monitored_topics SET last_run = ? WHERE id = ?',
-        (datetime.now(), topic_id)
+        '''
+        SELECT id, content FROM tweets 
+        WHERE status IN ('sent', 'pending', 'awaiting_approval') 
+        ORDER BY created_at DESC, id DESC LIMIT ?
+        ''',
+        (limit,)
     )
     
-    conn.commit()
+    tweets = [dict(row) for row in cursor.fetchall()]
     conn.close()
+    return tweets
 
-def is_url_processed(url: str) -> bool:
-    """Vérifie si une URL a déjà été traitée."""
+def get_usage_counts(account_id: Optional[int] = None, period: Optional[str] = None) -> Dict[str, int]:
+    """
+    Compteurs d'usage {statut: nombre} d'une période ('AAAA-MM' ou 'AAAA-MM-JJ', défaut : mois en cours),
+    tous comptes ou un seul compte.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT 1 FROM processed_urls WHERE url = ?', (url,))
-    result = cursor.fetchone()
+    query = 'SELECT status, SUM(count) as count FROM usage_counters WHERE period = ?'
+    params = [period or _usage_periods(datetime.now())[0]]
+    if account_id is not None:
+        query += ' AND account_id = ?'
+        params.append(account_id)
+    cursor.execute(query + ' GROUP BY status', params)
     
+    counts = {row['status']: row['count'] for row in cursor.fetchall()}
     conn.close()
-    return result is not None
+    return counts
 
-def mark_url_processed(url: str, topic_id: int):
-    """Marque une URL comme traitée."""
+def get_monthly_count(account_id: Optional[int] = None) -> int:
+    """Nombre de posts envoyés ce mois-ci (tous comptes, ou un seul compte ; un par partie de thread), lu dans les compteurs d'usage."""
+    return get_usage_counts(account_id).get('sent', 0)
+
+def reconcile_usage_counters(since: Optional[datetime] = None) -> int:
+    """
+    Recalcule les compteurs 'sent' depuis la table tweets, à partir du mois de `since`
+    (None : tout l'historique). Retourne le nombre de compteurs corrigés.
+    Seul 'sent' (posts facturés, celui du quota) se déduit de l'état des tweets : 'failed' et
+    'skipped' comptent des transitions (un tweet en échec puis renvoyé reste compté en échec).
+    """
     conn = get_db_connection()
+    conn.isolation_level = None # Transactions gérées manuellement
     cursor = conn.cursor()
     
+    first_period = _usage_periods(since)[0] if since else ''
     try:
+        cursor.execute('BEGIN IMMEDIATE')
         cursor.execute(
-            'INSERT INTO processed_urls (url, topic_id) VALUES (?, ?)',
-            (url, topic_id)
+            "SELECT account_id, period, count FROM usage_counters WHERE status = 'sent' AND period >= ?", (first_period,)
         )
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass # Déjà existe
+        before = {(row['account_id'], row['period']): row['count'] for row in cursor.fetchall()}
+    
+        # Période d'un tweet : date de son dernier changement de statut (date prévue pour l'historique) ;
+        # un tweet envoyé compte ses posts (parties de thread), un thread interrompu ses parties déjà comptées
+        cursor.execute(
+            '''
+            WITH changes AS (
+                SELECT COALESCE(account_id, ?) as account_id,
+                       CAST(COALESCE(status_updated_at, scheduled_time) AS TEXT) as moment,
+                       CASE WHEN status = 'sent'
+                            THEN MAX(COALESCE(json_array_length(thread_posted_ids), 0), COALESCE(billed_posts, 0), 1)
+                            ELSE billed_posts END as amount
+                FROM tweets WHERE status = 'sent' OR billed_posts > 0
+            )
+            SELECT account_id, substr(moment, 1, 7) as period, SUM(amount) as count
+            FROM changes WHERE substr(moment, 1, 7) >= ? GROUP BY 1, 2
+            UNION ALL
+            SELECT account_id, substr(moment, 1, 10) as period, SUM(amount) as count
+            FROM changes WHERE substr(moment, 1, 7) >= ? GROUP BY 1, 2
+            ''',
+            (DEFAULT_ACCOUNT_ID, first_period, first_period)
+        )
+        after = {(row['account_id'], row['period']): row['count'] for row in cursor.fetchall()}
+    
+        cursor.execute("DELETE FROM usage_counters WHERE status = 'sent' AND period >= ?", (first_period,))
+        cursor.executemany(
+            "INSERT INTO usage_counters (account_id, period, status, count) VALUES (?, ?, 'sent', ?)",
+            [(*key, count) for key, count in after.items()]
+        )
+        cursor.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute('ROLLBACK')
+        raise
     finally:
         conn.close()
+    
+    return sum(1 for key in before.keys() | after.keys() if before.get(key, 0) != after.get(key, 0))
 
-def delete_monitored_topic(topic_id: int):
-    """Supprime (désactive) un sujet."""
+def update_rate_limit(endpoint: str, account: str, remaining: Optional[int], limit_total: Optional[int],
+                      reset_at: Optional[datetime], next_allowed_at: Optional[datetime]):
+    """Enregistre l'état de la fenêtre de rate limit d'un endpoint pour un compte."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('UPDATE monitored_topics SET is_active = 0 WHERE id = ?', (topic_id,))
+    cursor.execute(
+        '''
+        INSERT INTO rate_limits (endpoint, account, remaining, limit_total, reset_at, next_allowed_at, updated_at) 
+        VALUES (?, ?, ?, ?, ?, ?, ?) 
+        ON CONFLICT(endpoint, account) DO UPDATE SET 
+            remaining = excluded.remaining, limit_total = excluded.limit_total, reset_at = excluded.reset_at, 
+            next_allowed_at = excluded.next_allowed_at, updated_at = excluded.updated_at
+        ''',
+        (endpoint, account, remaining, limit_total, reset_at, next_allowed_at, datetime.now())
+    )
     
     conn.commit()
     conn.close()
 
-def get_tweets_awaiting_approval():
-    """Récupère tous les tweets en attente de validation."""
+def get_rate_limit(endpoint: str, account: str) -> Optional[Dict]:
+    """Retourne l'état de rate limit (dates converties en datetime) ou None."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT * FROM tweets 
-        WHERE status = 'awaiting_approval'
-        ORDER BY created_at DESC
-    ''')
+    cursor.execute('SELECT * FROM rate_limits WHERE endpoint = ? AND account = ?', (endpoint, account))
+    row = cursor.fetchone()
+    conn.close()
     
-    tweets = [dict(row) for row in cursor.fetchall()]
+    if not row:
+        return None
+    state = dict(row)
+    for key in ('reset_at', 'next_allowed_at', 'updated_at'):
+        if state[key]:
+            state[key] = datetime.fromisoformat(state[key])
+    return state
+
+def get_nitter_health() -> Dict[str, Dict]:
+    """État de santé de chaque instance Nitter connue, par URL (cooldown_until converti en datetime)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM nitter_health')
+    rows = [dict(row) for row in cursor.fetchall()]
     conn.close()
-    return tweets
+    
+    for state in rows:
+        if state['cooldown_until']:
+            state['cooldown_until'] = datetime.fromisoformat(state['cooldown_until'])
+    return {state['instance']: state for state in rows}
 
-def approve_tweet(tweet_id: int):
-    """Approuve un tweet pour envoi."""
+def save_nitter_health(instance: str, requests: int, latency_ms: float, rate_limit_rate: float, empty_rate: float,
+                       error_rate: float, consecutive_failures: int, cooldown_until: Optional[datetime]):
+    """Enregistre l'état de santé d'une instance Nitter."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute(
-        'UPDATE tweets SET status = ? WHERE id = ?',
-        ('pending', tweet_id)
+        '''
+        INSERT INTO nitter_health (instance, requests, latency_ms, rate_limit_rate, empty_rate, error_rate, 
+                                   consecutive_failures, cooldown_until, updated_at) 
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) 
+        ON CONFLICT(instance) DO UPDATE SET 
+            requests = excluded.requests, latency_ms = excluded.latency_ms, 
+            rate_limit_rate = excluded.rate_limit_rate, empty_rate = excluded.empty_rate, 
+            error_rate = excluded.error_rate, consecutive_failures = excluded.consecutive_failures, 
+            cooldown_until = excluded.cooldown_until, updated_at = excluded.updated_at
+        ''',
+        (instance, requests, latency_ms, rate_limit_rate, empty_rate, error_rate,
+         consecutive_failures, cooldown_until, datetime.now())
     )
     
     conn.commit()
     conn.close()
 
-def reject_tweet(tweet_id: int):
-    """Rejette un tweet (le supprime)."""
+# --- Engagement Time-Series ---
+
+def record_metric_snapshots(tweets: List[Dict], captured_at: Optional[datetime] = None) -> int:
+    """
+    Enregistre un relevé des métriques (likes, retweets, vues) des tweets du top et met à jour
+    leurs métadonnées. Retourne le nombre de tweets relevés.
+    """
+    captured_at = captured_at or datetime.now()
+    captured_epoch = int(captured_at.timestamp())
+    # Un même tweet peut remonter sous plusieurs sujets : un seul relevé par tweet
+    unique = {tweet['id']: tweet for tweet in tweets}
+    if not unique:
+        return 0
+
     conn = get_db_connection()
     cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM tweets WHERE id = ?', (tweet_id,))
-    
+
+    cursor.executemany(
+        '''
+        INSERT INTO tracked_tweets (tweet_id, url, text, topic, created_at, first_seen_at, last_seen_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(tweet_id) DO UPDATE SET
+            text = excluded.text, last_seen_at = excluded.last_seen_at
+        ''',
+        [
+            (t['id'], t['url'], t['text'], t.get('topic'), t['created_at'], captured_at, captured_at)
+            for t in unique.values()
+        ]
+    )
+    cursor.executemany(
+        'INSERT OR REPLACE INTO tweet_metric_snapshots (tweet_id, captured_at, likes, retweets, views) VALUES (?, ?, ?, ?, ?)',
+        [(t['id'], captured_epoch, t['likes'], t['retweets'], t.get('views', 0)) for t in unique.values()]
+    )
+
+    conn.commit()
+    conn.close()
+    return len(unique)
+
+def get_tracked_tweets(since: datetime, limit: int = 60) -> List[Dict]:
+    """Tweets suivis publiés depuis `since` (id, url, topic), les plus récemment relevés d'abord."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        'SELECT tweet_id AS id, url, topic FROM tracked_tweets WHERE created_at >= ? ORDER BY last_seen_at DESC LIMIT ?',
+        (since, limit)
+    )
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return rows
+
+def get_engagement_velocity(window_hours: float, now: Optional[datetime] = None) -> List[Dict]:
+    """
+    Dernier relevé de chaque tweet relevé dans les window_hours dernières heures, avec sa vélocité
+    d'engagement (likes + 2 x retweets gagnés par heure depuis le relevé précédent).
+    Calculé en une requête (fonctions de fenêtre) : une ligne par tweet, quel que soit le nombre de relevés.
+    velocity vaut None pour un tweet relevé une seule fois dans la fenêtre.
+    """
+    now = now or datetime.now()
+    since = int((now - timedelta(hours=window_hours)).timestamp())
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(
+        '''
+        WITH series AS (
+            SELECT tweet_id, captured_at, likes, retweets, views,
+                   likes + 2 * retweets AS engagement,
+                   LAG(likes + 2 * retweets) OVER by_time AS previous_engagement,
+                   LAG(captured_at) OVER by_time AS previous_captured_at,
+                   ROW_NUMBER() OVER (PARTITION BY tweet_id ORDER BY captured_at DESC) AS recency
+            FROM tweet_metric_snapshots
+            WHERE captured_at >= ?
+            WINDOW by_time AS (PARTITION BY tweet_id ORDER BY captured_at)
+        )
+        SELECT s.tweet_id AS id, t.url, t.text, t.topic, t.created_at, s.captured_at,
+               s.likes, s.retweets, s.views, s.engagement,
+               CASE WHEN s.previous_captured_at IS NOT NULL AND s.captured_at > s.previous_captured_at
+                    THEN (s.engagement - s.previous_engagement) * 3600.0 / (s.captured_at - s.previous_captured_at)
+               END AS velocity
+        FROM series s
+        JOIN tracked_tweets t ON t.tweet_id = s.tweet_id
+        WHERE s.recency = 1
+        ''',
+        (since,)
+    )
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+
+    for row in rows:
+        row['created_at'] = datetime.fromisoformat(str(row['created_at']))
+        row['captured_at'] = datetime.fromtimestamp(row['captured_at'])
+    return rows
+
+def purge_old_metric_snapshots(days: int) -> int:
+    """Supprime les relevés (et les tweets suivis) de plus de `days` jours ; retourne le nombre de relevés supprimés."""
+    cutoff = datetime.now() - timedelta(days=days)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('DELETE FROM tweet_metric_snapshots WHERE captured_at < ?', (int(cutoff.timestamp()),))
+    count = cursor.rowcount
+    cursor.execute('DELETE FROM tracked_tweets WHERE last_seen_at < ?', (cutoff,))
+
+    conn.commit()
+    conn.close()
+    return count
+
+# --- Monitoring Functions ---
+
+def add_monitored_topic(query: str, interval_minutes: int = 60, source_type: str = 'web_search',
+                        account_id: int = DEFAULT_ACCOUNT_ID) -> int:
+    """Ajoute un sujet à surveiller (les tweets générés seront publiés par account_id)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'INSERT INTO monitored_topics (query, interval_minutes, source_type, account_id) VALUES (?, ?, ?, ?)',
+        (query, interval_minutes, source_type, account_id)
+    )
+    
+    topic_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return topic_id
+
+def get_active_topics() -> List[Dict]:
+    """Récupère les sujets actifs."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM monitored_topics WHERE is_active = 1')
+    
+    topics = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return topics
+
+def update_topic_last_run(topic_id: int):
+    """Met à jour la date de dernière exécution d'un sujet."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'UPDATE monitored_topics SET last_run = ? WHERE id = ?',
+        (datetime.now(), topic_id)
+    )
+    
+    conn.commit()
+    conn.close()
+
+def update_topic_since_id(topic_id: int, since_id: str):
+    """Avance le curseur de recherche Twitter d'un sujet (jamais vers un ID plus ancien)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'UPDATE monitored_topics SET since_id = ? '
+        'WHERE id = ? AND (since_id IS NULL OR CAST(since_id AS INTEGER) < CAST(? AS INTEGER))',
+        (str(since_id), topic_id, str(since_id))
+    )
+    
+    conn.commit()
+    conn.close()
+
+def get_processed_urls(urls: List[str]) -> set:
+    """Sous-ensemble des URLs déjà traitées (une seule requête pour tout un lot)."""
+    if not urls:
+        return set()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    placeholders = ','.join('?' * len(urls))
+    cursor.execute(f'SELECT url FROM processed_urls WHERE url IN ({placeholders})', list(urls))
+    processed = {row['url'] for row in cursor.fetchall()}
+    
+    conn.close()
+    return processed
+
+def is_url_processed(url: str) -> bool:
+    """Vérifie si une URL a déjà été traitée."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT 1 FROM processed_urls WHERE url = ?', (url,))
+    result = cursor.fetchone()
+    
+    conn.close()
+    return result is not None
+
+def mark_url_processed(url: str, topic_id: int):
+    """Marque une URL comme traitée."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(
+            'INSERT INTO processed_urls (url, topic_id) VALUES (?, ?)',
+            (url, topic_id)
+        )
+        conn.commit()
+    except sqlite3.IntegrityError:
+        pass # Déjà existe
+    finally:
+        conn.close()
+
+def delete_monitored_topic(topic_id: int):
+    """Supprime (désactive) un sujet."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('UPDATE monitored_topics SET is_active = 0 WHERE id = ?', (topic_id,))
+    
+    conn.commit()
+    conn.close()
+
+def get_tweets_awaiting_approval():
+    """Récupère tous les tweets en attente de validation."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT * FROM tweets 
+        WHERE status = 'awaiting_approval'
+        ORDER BY created_at DESC
+    ''')
+    
+    tweets = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return tweets
+
+def _enqueue_media_prefetch(cursor, tweet_id: int, image_url: str):
+    """Met en file le pré-upload de l'image d'un tweet (un job par couple tweet/image)."""
+    _insert_job(cursor, 'prefetch_media', {'tweet_id': tweet_id}, dedup_key=f"prefetch_media:{tweet_id}:{image_url}")
+
+def approve_tweet(tweet_id: int):
+    """Approuve un tweet pour envoi (et lance le pré-upload de son image)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'UPDATE tweets SET status = ? WHERE id = ?',
+        ('pending', tweet_id)
+    )
+    cursor.execute('SELECT image_url FROM tweets WHERE id = ?', (tweet_id,))
+    row = cursor.fetchone()
+    if row and row['image_url']:
+        _enqueue_media_prefetch(cursor, tweet_id, row['image_url'])
+    
+    conn.commit()
+    conn.close()
+
+def reject_tweet(tweet_id: int):
+    """Rejette un tweet (le supprime)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('DELETE FROM tweets WHERE id = ?', (tweet_id,))
+    
     conn.commit()
     conn.close()
 
@@ -368,12 +1099,12 @@ def send_tweet_now(tweet_id: int):
     conn.close()
 
 def update_tweet_content(tweet_id: int, new_content: str):
-    """Met à jour le contenu d'un tweet."""
+    """Met à jour le contenu d'un tweet (le découpage en thread éventuel est à recalculer)."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute(
-        'UPDATE tweets SET content = ? WHERE id = ?',
+        'UPDATE tweets SET content = ?, thread_content = NULL WHERE id = ?',
         (new_content, tweet_id)
     )
     
@@ -381,17 +1112,72 @@ def update_tweet_content(tweet_id: int, new_content: str):
     conn.close()
 
 def update_tweet_image(tweet_id: int, image_url: str):
-    """Met à jour l'image d'un tweet."""
+    """Met à jour l'image d'un tweet (le media_id pré-uploadé de l'ancienne image est oublié)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'UPDATE tweets SET image_url = ?, media_id = NULL, media_expires_at = NULL WHERE id = ?',
+        (image_url, tweet_id)
+    )
+    cursor.execute("SELECT status FROM tweets WHERE id = ?", (tweet_id,))
+    row = cursor.fetchone()
+    if image_url and row and row['status'] == 'pending':
+        _enqueue_media_prefetch(cursor, tweet_id, image_url)
+    
+    conn.commit()
+    conn.close()
+
+def attach_tweet_image_if_missing(tweet_id: int, image_url: str) -> bool:
+    """Rattache une image à un tweet pas encore envoyé, sauf si une image a déjà été choisie."""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute(
-        'UPDATE tweets SET image_url = ? WHERE id = ?',
+        '''
+        UPDATE tweets SET image_url = ?, media_id = NULL, media_expires_at = NULL 
+        WHERE id = ? AND (image_url IS NULL OR image_url = '') 
+        AND status IN ('awaiting_approval', 'pending')
+        ''',
         (image_url, tweet_id)
     )
     
+    updated = cursor.rowcount > 0
+    if updated:
+        cursor.execute("SELECT status FROM tweets WHERE id = ?", (tweet_id,))
+        if cursor.fetchone()['status'] == 'pending':
+            _enqueue_media_prefetch(cursor, tweet_id, image_url)
+    conn.commit()
+    conn.close()
+    return updated
+
+def get_tweet(tweet_id: int) -> Optional[Dict]:
+    """Retourne un tweet par son ID, ou None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT * FROM tweets WHERE id = ?', (tweet_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def set_tweet_media(tweet_id: int, image_url: str, media_id: str, expires_at: datetime) -> bool:
+    """Enregistre le media_id pré-uploadé, si le tweet attend toujours son envoi avec la même image."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        UPDATE tweets SET media_id = ?, media_expires_at = ? 
+        WHERE id = ? AND image_url = ? AND status = 'pending'
+        ''',
+        (str(media_id), expires_at, tweet_id, image_url)
+    )
+    
+    updated = cursor.rowcount > 0
     conn.commit()
     conn.close()
+    return updated
 
 def update_tweet_thread_content(tweet_id: int, thread_content: str):
     """Met à jour le contenu du thread d'un tweet."""
@@ -406,6 +1192,19 @@ def update_tweet_thread_content(tweet_id: int, thread_content: str):
     conn.commit()
     conn.close()
 
+def record_thread_progress(tweet_id: int, posted_ids: List[str]):
+    """Enregistre les IDs des parties de thread publiées (appelé après chaque partie)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'UPDATE tweets SET thread_posted_ids = ? WHERE id = ?',
+        (json.dumps(posted_ids), tweet_id)
+    )
+    
+    conn.commit()
+    conn.close()
+
 
 def delete_old_awaiting_tweets(hours: int = 24) -> int:
     """Supprime les tweets en attente de validation depuis plus de X heures."""
@@ -424,6 +1223,438 @@ def delete_old_awaiting_tweets(hours: int = 24) -> int:
     conn.close()
     return count
 
+# --- Generation Cache ---
+
+def get_generation_cache_entry(key: str, ttl_hours: float) -> Optional[str]:
+    """Retourne le tweet en cache pour cette clé s'il n'a pas expiré (et le marque comme utilisé)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now()
+    cursor.execute(
+        'SELECT tweet FROM generation_cache WHERE key = ? AND created_at >= ?',
+        (key, now - timedelta(hours=ttl_hours))
+    )
+    row = cursor.fetchone()
+    if row:
+        cursor.execute(
+            'UPDATE generation_cache SET hits = hits + 1, last_used_at = ? WHERE key = ?',
+            (now, key)
+        )
+        conn.commit()
+    
+    conn.close()
+    return row['tweet'] if row else None
+
+def put_generation_cache_entry(key: str, tweet: str, model: str, prompt_version: str, max_entries: int):
+    """Enregistre une génération ; au-delà de max_entries, les entrées les moins récemment utilisées sont évincées."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now()
+    cursor.execute(
+        '''
+        INSERT OR REPLACE INTO generation_cache (key, tweet, model, prompt_version, hits, created_at, last_used_at) 
+        VALUES (?, ?, ?, ?, 0, ?, ?)
+        ''',
+        (key, tweet, model, prompt_version, now, now)
+    )
+    cursor.execute(
+        '''
+        DELETE FROM generation_cache WHERE key IN (
+            SELECT key FROM generation_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+        )
+        ''',
+        (max_entries,)
+    )
+    
+    conn.commit()
+    conn.close()
+
+def purge_expired_generation_cache(ttl_hours: float) -> int:
+    """Supprime les générations en cache plus vieilles que le TTL."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'DELETE FROM generation_cache WHERE created_at < ?',
+        (datetime.now() - timedelta(hours=ttl_hours),)
+    )
+    
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+def increment_generation_cache_stat(event: str):
+    """Incrémente le compteur de hits ou de misses du cache de génération."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        INSERT INTO generation_cache_stats (event, count) VALUES (?, 1)
+        ON CONFLICT(event) DO UPDATE SET count = count + 1
+        ''',
+        (event,)
+    )
+    
+    conn.commit()
+    conn.close()
+
+def get_generation_cache_stats() -> Dict[str, int]:
+    """Retourne {'hit', 'miss', 'entries'} pour le tableau de bord."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    stats = {'hit': 0, 'miss': 0, 'entries': 0}
+    try:
+        cursor.execute('SELECT event, count FROM generation_cache_stats')
+        for row in cursor.fetchall():
+            stats[row['event']] = row['count']
+        cursor.execute('SELECT COUNT(*) as count FROM generation_cache')
+        stats['entries'] = cursor.fetchone()['count']
+    except sqlite3.OperationalError:
+        pass # Tables pas encore créées
+    finally:
+        conn.close()
+    return stats
+
+# --- Media Cache ---
+
+def get_cached_media(account: str, image_hash: Optional[str] = None, source_url: Optional[str] = None) -> Optional[Dict]:
+    """Retourne {'media_id', 'expires_at'} encore valide pour une image (par hash, ou par URL source), ou None."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    column, value = ('image_hash', image_hash) if image_hash else ('source_url', source_url)
+    cursor.execute(
+        f'''
+        SELECT media_id, expires_at FROM media_cache 
+        WHERE {column} = ? AND account = ? AND expires_at > ? 
+        ORDER BY expires_at DESC LIMIT 1
+        ''',
+        (value, account, datetime.now())
+    )
+    row = cursor.fetchone()
+    conn.close()
+    if not row:
+        return None
+    return {'media_id': row['media_id'], 'expires_at': datetime.fromisoformat(row['expires_at'])}
+
+def put_cached_media_id(image_hash: str, account: str, source_url: str, media_id: str, expires_at: datetime):
+    """Enregistre le media_id obtenu pour une image."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        INSERT OR REPLACE INTO media_cache (image_hash, account, source_url, media_id, expires_at, created_at) 
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''',
+        (image_hash, account, source_url, str(media_id), expires_at, datetime.now())
+    )
+    
+    conn.commit()
+    conn.close()
+
+def purge_expired_media_cache() -> int:
+    """Supprime les media_id expirés."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('DELETE FROM media_cache WHERE expires_at <= ?', (datetime.now(),))
+    
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+# --- Generation Metrics ---
+
+def record_generation_metric(mode: str, prompt_tokens: int = 0, output_tokens: int = 0, latency_ms: int = 0):
+    """Enregistre le coût (tokens, latence) d'un tweet généré."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        'INSERT INTO generation_metrics (mode, prompt_tokens, output_tokens, latency_ms) VALUES (?, ?, ?, ?)',
+        (mode, prompt_tokens, output_tokens, latency_ms)
+    )
+    
+    conn.commit()
+    conn.close()
+
+def get_generation_metrics_summary() -> List[Dict]:
+    """Moyennes par tweet (tokens, latence) pour chaque mode de génération."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT mode, COUNT(*) as tweets, 
+               AVG(prompt_tokens) as avg_prompt_tokens, 
+               AVG(output_tokens) as avg_output_tokens, 
+               AVG(latency_ms) as avg_latency_ms
+        FROM generation_metrics 
+        GROUP BY mode
+    ''')
+    
+    summary = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return summary
+
+# --- Send Metrics ---
+
+def record_send_metric(tweet_id: Optional[int], status: str, error_class: Optional[str] = None,
+                       download_ms: int = 0, upload_ms: int = 0, post_ms: int = 0):
+    """Enregistre la latence d'un envoi de tweet."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        '''
+        INSERT INTO send_metrics (tweet_id, status, error_class, download_ms, upload_ms, post_ms) 
+        VALUES (?, ?, ?, ?, ?, ?)
+        ''',
+        (tweet_id, status, error_class, download_ms, upload_ms, post_ms)
+    )
+    
+    conn.commit()
+    conn.close()
+
+def get_send_metrics_summary() -> List[Dict]:
+    """Nombre d'envois et latences moyennes par statut."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT status, COUNT(*) as sends, 
+               AVG(download_ms) as avg_download_ms, 
+               AVG(upload_ms) as avg_upload_ms, 
+               AVG(post_ms) as avg_post_ms, 
+               MAX(download_ms + upload_ms + post_ms) as max_total_ms
+        FROM send_metrics 
+        GROUP BY status
+    ''')
+    
+    summary = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    return summary
+
+# --- Job Queue Functions ---
+
+def _job_from_row(row) -> Dict:
+    job = dict(row)
+    job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+    return job
+
+def _insert_job(cursor, job_type: str, payload: Dict, dedup_key: Optional[str] = None,
+                available_at: Optional[datetime] = None, max_attempts: int = 3) -> Optional[int]:
+    now = datetime.now()
+    cursor.execute(
+        '''
+        INSERT OR IGNORE INTO jobs (type, payload, state, max_attempts, available_at, dedup_key, updated_at)
+        VALUES (?, ?, 'queued', ?, ?, ?, ?)
+        ''',
+        (job_type, json.dumps(payload or {}), max_attempts, available_at or now, dedup_key, now)
+    )
+    return cursor.lastrowid if cursor.rowcount else None
+
+def enqueue_job(job_type: str, payload: Dict, dedup_key: Optional[str] = None,
+                available_at: Optional[datetime] = None, max_attempts: int = 3) -> Optional[int]:
+    """
+    Ajoute un travail à la file persistante.
+    Retourne l'ID du job, ou None si un job avec la même dedup_key existe déjà.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    job_id = _insert_job(cursor, job_type, payload, dedup_key, available_at, max_attempts)
+    
+    conn.commit()
+    conn.close()
+    return job_id
+
+def claim_job(job_types: Optional[List[str]] = None) -> Optional[Dict]:
+    """
+    Réserve atomiquement le prochain job disponible (passage à l'état 'running').
+    Deux workers ne peuvent jamais réserver le même job.
+    """
+    conn = get_db_connection()
+    conn.isolation_level = None # Transactions gérées manuellement
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        
+        now = datetime.now()
+        query = "SELECT * FROM jobs WHERE state = 'queued' AND available_at <= ?"
+        params = [now]
+        if job_types:
+            query += f" AND type IN ({','.join('?' for _ in job_types)})"
+            params.extend(job_types)
+        query += ' ORDER BY available_at ASC, id ASC LIMIT 1'
+        
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        if not row:
+            cursor.execute('COMMIT')
+            return None
+        
+        cursor.execute(
+            '''
+            UPDATE jobs 
+            SET state = 'running', attempts = attempts + 1, locked_at = ?, updated_at = ? 
+            WHERE id = ?
+            ''',
+            (now, now, row['id'])
+        )
+        cursor.execute('SELECT * FROM jobs WHERE id = ?', (row['id'],))
+        job = _job_from_row(cursor.fetchone())
+        cursor.execute('COMMIT')
+        return job
+    except Exception:
+        if conn.in_transaction:
+            cursor.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+def ack_job(job_id: int, next_job: Optional[Dict] = None):
+    """
+    Marque un job comme terminé.
+    Si next_job est fourni ({'type', 'payload', 'dedup_key'}), l'étape suivante est
+    mise en file dans la même transaction : le résultat d'une étape coûteuse n'est jamais perdu.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    if next_job:
+        _insert_job(
+            cursor,
+            next_job['type'],
+            next_job.get('payload', {}),
+            dedup_key=next_job.get('dedup_key'),
+            available_at=next_job.get('available_at'),
+            max_attempts=next_job.get('max_attempts', 3)
+        )
+    
+    cursor.execute(
+        "UPDATE jobs SET state = 'done', locked_at = NULL, last_error = NULL, updated_at = ? WHERE id = ?",
+        (datetime.now(), job_id)
+    )
+    
+    conn.commit()
+    conn.close()
+
+def fail_job(job_id: int, error: str, retry_delay_seconds: int = 300) -> str:
+    """
+    Enregistre l'échec d'un job.
+    Le job est remis en file avec un backoff exponentiel tant qu'il reste des tentatives,
+    sinon il passe à l'état 'failed' et libère sa dedup_key (le même travail pourra être remis en file).
+    Retourne le nouvel état.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT attempts, max_attempts FROM jobs WHERE id = ?', (job_id,))
+    row = cursor.fetchone()
+    if not row:
+        conn.close()
+        return 'missing'
+    
+    now = datetime.now()
+    if row['attempts'] >= row['max_attempts']:
+        state = 'failed'
+        available_at = now
+    else:
+        state = 'queued'
+        available_at = now + timedelta(seconds=retry_delay_seconds * (2 ** max(row['attempts'] - 1, 0)))
+    
+    cursor.execute(
+        '''
+        UPDATE jobs 
+        SET state = ?, available_at = ?, locked_at = NULL, last_error = ?, updated_at = ?,
+            dedup_key = CASE WHEN ? = 'failed' THEN NULL ELSE dedup_key END
+        WHERE id = ?
+        ''',
+        (state, available_at, error, now, state, job_id)
+    )
+    
+    conn.commit()
+    conn.close()
+    return state
+
+def purge_finished_jobs(days: int) -> int:
+    """Supprime les jobs terminés ('done') ou abandonnés ('failed') depuis plus de `days` jours ; retourne leur nombre."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "DELETE FROM jobs WHERE state IN ('done', 'failed') AND updated_at < ?",
+        (datetime.now() - timedelta(days=days),)
+    )
+    
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+def release_job(job_id: int, note: Optional[str] = None):
+    """
+    Remet un job en file sans consommer de tentative
+    (travail interrompu par l'échéance du cycle, reporté au cycle suivant).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now()
+    cursor.execute(
+        '''
+        UPDATE jobs 
+        SET state = 'queued', attempts = MAX(attempts - 1, 0), available_at = ?, 
+            locked_at = NULL, last_error = ?, updated_at = ? 
+        WHERE id = ?
+        ''',
+        (now, note, now, job_id)
+    )
+    
+    conn.commit()
+    conn.close()
+
+def requeue_stale_jobs(lease_seconds: int = 900) -> int:
+    """
+    Remet en file les jobs restés 'running' au-delà du bail (worker arrêté en plein travail).
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cutoff_time = datetime.now() - timedelta(seconds=lease_seconds)
+    cursor.execute(
+        '''
+        UPDATE jobs 
+        SET state = 'queued', locked_at = NULL, updated_at = ? 
+        WHERE state = 'running' AND locked_at < ?
+        ''',
+        (datetime.now(), cutoff_time)
+    )
+    
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+def get_job_counts() -> Dict[str, int]:
+    """Compte les jobs par état (pour l'interface)."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT state, COUNT(*) as count FROM jobs GROUP BY state')
+    counts = {row['state']: row['count'] for row in cursor.fetchall()}
+    
+    conn.close()
+    return counts
+
 if __name__ == "__main__":
     # Test rapide si exécuté directement
     init_db()
@@ -1,9 +1,14 @@
 import streamlit as st
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from tools.scraper import scrape_website
 from tools.scraper import scrape_website
-from tools.content_generator import generate_tweet_content
+from tools.content_generator import stream_tweet_content, clean_tweet
+from tools.llm_providers import get_provider
+from tools.tweet_validator import weighted_length
+from tools.thread_composer import split_into_thread, compose_thread_content
 from tools.twitter import post_tweet
 import database
 from database import (
@@ -11,7 +16,8 @@ from database import (
     delete_scheduled_tweet, get_active_topics, add_monitored_topic, 
     delete_scheduled_tweet, get_active_topics, add_monitored_topic, 
     delete_scheduled_tweet, get_active_topics, add_monitored_topic, 
-    delete_monitored_topic, load_fixed_topics
+    delete_monitored_topic, load_fixed_topics, get_generation_cache_stats,
+    get_send_metrics_summary, get_accounts, get_nitter_health, record_metric_snapshots
 )
 from monitoring_service import run_monitoring_cycle
 
@@ -50,15 +56,45 @@ if page == "Dashboard":
     col1, col2 = st.columns(2)
     
     with col1:
-        count = get_monthly_count()
-        limit = 500
-        st.metric("Tweets envoyés ce mois", f"{count} / {limit}", delta=limit-count, delta_color="normal")
-        st.progress(count / limit)
+        # Quota mensuel propre à chaque compte
+        for account in get_accounts():
+            count = get_monthly_count(account['id'])
+            limit = account['monthly_limit']
+            st.metric(f"Tweets envoyés ce mois ({account['name']})", f"{count} / {limit}", delta=limit-count, delta_color="normal")
+            st.progress(min(count / limit, 1.0) if limit else 1.0)
         
     with col2:
         pending = len(get_all_pending_tweets())
         st.metric("Tweets en attente", pending)
 
+    # Cache des générations : chaque hit est un appel Gemini économisé
+    cache_stats = get_generation_cache_stats()
+    lookups = cache_stats['hit'] + cache_stats['miss']
+    col_hit, col_miss, col_rate, col_entries = st.columns(4)
+    col_hit.metric("Cache : hits", cache_stats['hit'])
+    col_miss.metric("Cache : misses", cache_stats['miss'])
+    col_rate.metric("Taux de hit", f"{cache_stats['hit'] / lookups:.0%}" if lookups else "—")
+    col_entries.metric("Entrées en cache", cache_stats['entries'])
+
+    # Latence des envois (image : téléchargement + upload, puis publication)
+    send_metrics = get_send_metrics_summary()
+    if send_metrics:
+        st.subheader("Latence des envois")
+        st.dataframe(
+            [
+                {
+                    "Statut": m['status'],
+                    "Envois": m['sends'],
+                    "Téléchargement (ms)": round(m['avg_download_ms'] or 0),
+                    "Upload (ms)": round(m['avg_upload_ms'] or 0),
+                    "Publication (ms)": round(m['avg_post_ms'] or 0),
+                    "Max total (ms)": m['max_total_ms'],
+                }
+                for m in send_metrics
+            ],
+            use_container_width=True
+        )
+
     # Zone de Test Configuration
     with st.expander("🛠️ Test Configuration (Debug)"):
         st.info("Utilisez ce bouton pour tester l'envoi d'un tweet EN DIRECT (sans passer par la file d'attente).")
@@ -66,10 +102,12 @@ if page == "Dashboard":
         if st.button("Envoyer Tweet Test (Sync)"):
             with st.spinner("Envoi en cours..."):
                 res = post_tweet(test_msg)
-                if "Error" in res:
-                    st.error(f"❌ Échec : {res}")
+                if res.ok:
+                    st.success(f"✅ Succès : {res} ({res.post_ms} ms)")
+                elif res.status == 'rate_limited':
+                    st.warning(f"⏳ Rate limit : nouvel essai possible après {res.retry_after:%H:%M:%S}")
                 else:
-                    st.success(f"✅ Succès : {res}")
+                    st.error(f"❌ Échec ({res.error_class}) : {res.error}")
 
 # --- GENERATOR ---
 elif page == "Générateur de Tweets":
@@ -83,20 +121,46 @@ elif page == "Générateur de Tweets":
         generate_btn = st.form_submit_button("Générer le tweet")
         
     if generate_btn and topic:
-        with st.spinner("Génération en cours..."):
-            context = ""
+        started = time.perf_counter()
+        context = ""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Le client LLM est préparé pendant le scraping de l'article
+            warm_up = executor.submit(get_provider().warm_up)
             if url:
-                try:
-                    # Utilisation d'une nouvelle boucle d'événements pour éviter les conflits
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    context = loop.run_until_complete(scrape_website(url))
-                    loop.close()
-                except Exception as e:
-                    st.error(f"Erreur scraping: {e}")
-            
-            tweet = generate_tweet_content(topic, source_content=context, tone=tone)
-            st.session_state['generated_tweet'] = tweet
+                with st.status("Scraping de l'article...", expanded=False) as scrape_status:
+                    try:
+                        # asyncio.run dans un thread : boucle d'événements dédiée au scraping
+                        scrape_result = executor.submit(asyncio.run, scrape_website(url)).result()
+                        context = scrape_result.get('content') or ""
+                        if scrape_result.get('error'):
+                            st.warning(f"Scraping : {scrape_result['error']}")
+                        scrape_status.update(label=f"Article récupéré en {time.perf_counter() - started:.1f} s", state="complete")
+                    except Exception as e:
+                        scrape_status.update(label="Échec du scraping", state="error")
+                        st.error(f"Erreur scraping: {e}")
+            try:
+                warm_up.result()
+            except Exception:
+                pass # L'erreur éventuelle sera remontée par la génération
+        
+        scrape_seconds = time.perf_counter() - started
+        timings = {}
+        
+        def timed_stream():
+            # Mesure du temps jusqu'au premier fragment (TTFT)
+            generation_started = time.perf_counter()
+            for chunk in stream_tweet_content(topic, source_content=context, tone=tone):
+                timings.setdefault('ttft', time.perf_counter() - generation_started)
+                yield chunk
+            timings['total'] = time.perf_counter() - generation_started
+        
+        st.subheader("Génération")
+        streamed = st.write_stream(timed_stream())
+        st.caption(
+            f"Scraping : {scrape_seconds:.1f} s · Premier token : {timings.get('ttft', 0):.1f} s · "
+            f"Génération : {timings.get('total', 0):.1f} s"
+        )
+        st.session_state['generated_tweet'] = clean_tweet(streamed if isinstance(streamed, str) else "".join(streamed))
             
     if 'generated_tweet' in st.session_state:
         st.subheader("Prévisualisation")
@@ -106,15 +170,18 @@ elif page == "Générateur de Tweets":
         if len(edited_tweet) > 25000:
             st.warning("Attention : Le tweet dépasse 25000 caractères !")
             
-        col1, col2 = st.columns(2)
+        col1, col2, col3 = st.columns(3)
         with col1:
             schedule_date = st.date_input("Date d'envoi", value=datetime.now())
         with col2:
             schedule_time = st.time_input("Heure d'envoi", value=datetime.now())
+        with col3:
+            accounts = get_accounts()
+            account = st.selectbox("Compte", accounts, format_func=lambda a: a['name'])
         
         if st.button("Planifier l'envoi", type="primary"):
             run_at = datetime.combine(schedule_date, schedule_time)
-            add_scheduled_tweet(edited_tweet, run_at)
+            add_scheduled_tweet(edited_tweet, run_at, account_id=account['id'])
             st.success(f"Tweet planifié pour le {run_at} (en attente de validation) !")
             st.session_state.tweet_preview = None
             st.rerun()
@@ -216,6 +283,9 @@ elif page == "✅ Validation":
                     st.caption(f"📅 Programmé pour : {tweet['scheduled_time']}")
                     if tweet.get('source_url'):
                         st.caption(f"🔗 Source : {tweet['source_url']}")
+                    if tweet.get('error_message'):
+                        # Problèmes restants après les régénérations automatiques
+                        st.warning(tweet['error_message'])
                         
                     # Zone d'édition
                     # On calcule d'abord pour afficher l'info APRES la zone de texte pour éviter le layout jitter
@@ -243,7 +313,13 @@ elif page == "✅ Validation":
                     if chars > 25000:
                          st.error(f"⚠️ **Trop long !** {chars}/25000 caractères")
                     else:
-                         st.caption(f"✅ {chars}/25000 caractères (Premium)")
+                         st.caption(f"✅ {chars}/25000 caractères (Premium) · {weighted_length(current_content_val)} pondérés")
+
+                    thread_parts = split_into_thread(current_content_val)
+                    if len(thread_parts) > 1:
+                        with st.expander(f"🧵 Sera publié en thread de {len(thread_parts)} tweets"):
+                            for part in thread_parts:
+                                st.text(part)
 
                     # Boutons d'action
                     col1, col2, col3 = st.columns([1, 1, 3])
@@ -252,6 +328,7 @@ elif page == "✅ Validation":
                             # Sauvegarder les modifications
                             if new_content != tweet['content']:
                                 update_tweet_content(tweet['id'], new_content)
+                                update_tweet_thread_content(tweet['id'], compose_thread_content(new_content))
                             
                             if new_img_url != tweet.get('image_url', ''):
                                 update_tweet_image(tweet['id'], new_img_url)
@@ -269,13 +346,14 @@ elif page == "✅ Validation":
 elif page == "🏆 Top Tweets":
     st.header("🏆 Top Tweets Français Tech")
     
-    st.info("📊 Récupère les 3 tweets français les plus populaires des dernières 24h sur l'IA, Twitch, Crypto et Jeux Vidéo")
+    st.info("📊 Récupère les 3 tweets français les plus populaires des dernières 24h sur l'IA, Twitch, Crypto et Jeux Vidéo, et suit ceux qui montent le plus vite")
     
-    from tools.twitter_scraper import scrape_top_french_tech_tweets
+    from tools.twitter_scraper import collect_french_tech_tweets, top_by_engagement
+    from tools.trending import get_trending_tweets, TRENDING_SNAPSHOT_MINUTES
     
     # Avertissement
     st.success("✅ Utilise le scraping web (pas de quota API)")
-    st.caption("⏱️ Le chargement peut prendre 10-20 secondes...")
+    st.caption("⏱️ Le chargement prend au plus quelques secondes (sujets cherchés en parallèle)...")
     
     if st.button("🔄 Actualiser le Top 3", type="primary"):
         with st.spinner("Scraping Twitter..."):
@@ -283,9 +361,12 @@ elif page == "🏆 Top Tweets":
                 # Utiliser asyncio pour appeler la fonction asynchrone
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
-                top_tweets = loop.run_until_complete(scrape_top_french_tech_tweets())
+                collected = loop.run_until_complete(collect_french_tech_tweets())
                 loop.close()
                 
+                # Le relevé alimente aussi les séries d'engagement (tendances)
+                record_metric_snapshots(collected)
+                top_tweets = top_by_engagement(collected)
                 st.session_state['top_tweets'] = top_tweets
                 st.session_state['last_refresh'] = datetime.now()
                 
@@ -296,6 +377,47 @@ elif page == "🏆 Top Tweets":
                 import traceback
                 st.code(traceback.format_exc())
     
+    # Santé des instances Nitter (routage des recherches)
+    nitter_health = get_nitter_health()
+    if nitter_health:
+        with st.expander("🩺 Instances Nitter"):
+            st.dataframe(
+                [
+                    {
+                        "Instance": h['instance'],
+                        "Requêtes": h['requests'],
+                        "Latence (ms)": round(h['latency_ms']),
+                        "Rate limits": f"{h['rate_limit_rate']:.0%}",
+                        "Vides": f"{h['empty_rate']:.0%}",
+                        "Erreurs": f"{h['error_rate']:.0%}",
+                        "En pause jusqu'à": h['cooldown_until'].strftime('%H:%M:%S') if h['cooldown_until'] and h['cooldown_until'] > datetime.now() else "—",
+                    }
+                    for h in nitter_health.values()
+                ],
+                use_container_width=True
+            )
+
+    # Tendances : vélocité d'engagement calculée sur les relevés périodiques du worker
+    trending = get_trending_tweets(limit=5)
+    if trending:
+        with st.expander("📈 Tendances (vélocité d'engagement)", expanded=True):
+            st.caption(f"Engagement (likes + 2 x retweets) gagné par heure, pénalisé par l'âge. Relevé toutes les {TRENDING_SNAPSHOT_MINUTES} min.")
+            st.dataframe(
+                [
+                    {
+                        "Tweet": t['text'][:80],
+                        "Sujet": t['topic'] or "—",
+                        "Engagement/h": round(t['velocity']) if t['velocity'] is not None else "—",
+                        "Likes": t['likes'],
+                        "Retweets": t['retweets'],
+                        "Publié": t['created_at'].strftime('%H:%M'),
+                        "Lien": t['url'],
+                    }
+                    for t in trending
+                ],
+                use_container_width=True
+            )
+
     # Affichage des résultats
     if 'top_tweets' in st.session_state and st.session_state['top_tweets']:
         st.success(f"✅ Dernière mise à jour : {st.session_state.get('last_refresh', 'N/A').strftime('%Y-%m-%d %H:%M:%S')}")
@@ -415,10 +537,14 @@ elif page == "Veille Automatique":
         with col2:
             source_type = st.selectbox("Type de source", ["web_search", "twitter", "specific_url"])
             
-        interval = st.number_input("Intervalle (minutes)", min_value=10, value=60)
+        col_interval, col_account = st.columns(2)
+        with col_interval:
+            interval = st.number_input("Intervalle (minutes)", min_value=10, value=60)
+        with col_account:
+            topic_account = st.selectbox("Compte de publication", get_accounts(), format_func=lambda a: a['name'])
         
         if st.form_submit_button("Ajouter"):
-            add_monitored_topic(new_topic, interval, source_type)
+            add_monitored_topic(new_topic, interval, source_type, account_id=topic_account['id'])
             st.success(f"Sujet '{new_topic}' ({source_type}) ajouté !")
             st.success(f"Sujet '{new_topic}' ({source_type}) ajouté !")
             st.success(f"Sujet '{new_topic}' ({source_type}) ajouté !")
@@ -1,36 +1,165 @@
 import asyncio
 import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timedelta
 from duckduckgo_search import DDGS
 from database import (
-    get_active_topics, update_topic_last_run, is_url_processed, 
-    mark_url_processed, add_scheduled_tweet
+    get_active_topics, update_topic_last_run, is_url_processed, get_processed_urls, update_topic_since_id,
+    mark_url_processed, add_scheduled_tweet,
+    enqueue_job, claim_job, ack_job, fail_job, release_job, requeue_stale_jobs,
+    attach_tweet_image_if_missing, record_generation_metric, get_tweet, set_tweet_media,
+    get_account, DEFAULT_ACCOUNT_ID
 )
-from tools.twitter import search_tweets
+from tools.twitter import search_tweets, prepare_media
 from tools.scraper import scrape_website, get_links_from_page
 from tools.content_generator import generate_tweet_content
+from tools.generation_service import get_generation_service, GEMINI_MAX_CONCURRENCY, GENERATION_BATCH_SIZE
+from tools.image_finder import find_best_image
+from tools.tweet_validator import validate_tweet, extract_key_facts, get_recent_index
+from tools.thread_composer import compose_thread_content
 
 logger = logging.getLogger(__name__)
 
+MAX_ITEMS_PER_CYCLE = 3
+
+# Échéance globale d'un cycle de veille (secondes) : le travail non terminé est reporté
+CYCLE_DEADLINE_SECONDS = int(os.getenv("MONITORING_CYCLE_DEADLINE", "300"))
+
+# Timeouts par étape (secondes), appliqués avec annulation
+STAGE_TIMEOUTS = {
+    'discover': int(os.getenv("DISCOVER_TIMEOUT", "45")),
+    'scrape': int(os.getenv("SCRAPE_TIMEOUT", "45")),
+    'image': int(os.getenv("IMAGE_SEARCH_TIMEOUT", "15")),
+    'generate': int(os.getenv("GENERATE_TIMEOUT", "60")),
+}
+
+# Mode de génération des jobs groupés : 'single' (un appel par article) ou 'batch' (K articles par appel)
+GENERATION_MODE = os.getenv("GENERATION_MODE", "single")
+# Pré-upload des images approuvées : au plus tôt ce délai (heures) avant l'envoi (un media_id expire après 24h)
+MEDIA_PREFETCH_LEAD_HOURS = int(os.getenv("MEDIA_PREFETCH_LEAD_HOURS", "6"))
+# Modèle des brouillons de veille (ex: un modèle rapide et moins cher) ; défaut : modèle du fournisseur
+DRAFT_MODEL = os.getenv("LLM_DRAFT_MODEL") or None
+
+# Nombre max de régénérations d'un brouillon rejeté par la validation
+MAX_REGENERATIONS = int(os.getenv("MAX_REGENERATIONS", "2"))
+
+# Attente max (secondes) de l'image après la génération ; au-delà elle est rattachée plus tard
+IMAGE_WAIT_SECONDS = float(os.getenv("IMAGE_WAIT_SECONDS", "3"))
+
+# La recherche d'image tourne en parallèle de la génération, hors du chemin critique
+_image_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="monitoring-image")
+# Recherches d'image encore en cours à la planification du tweet, par id de tweet -> (future, date) :
+# le job 'attach_image' reprend leur résultat au lieu de refaire les HEAD checks et la recherche.
+# Partagé entre le thread de veille et le worker de jobs ; une entrée jamais reprise expire.
+_image_discoveries = {}
+_image_discoveries_lock = threading.Lock()
+IMAGE_DISCOVERY_TTL_SECONDS = 3600
+
+def _register_image_discovery(tweet_id: int, future: Future):
+    """Garde la recherche d'image d'un tweet pour son job 'attach_image' (et oublie les entrées expirées)."""
+    now = time.monotonic()
+    with _image_discoveries_lock:
+        for expired_id in [key for key, (_, added_at) in _image_discoveries.items() if now - added_at > IMAGE_DISCOVERY_TTL_SECONDS]:
+            del _image_discoveries[expired_id]
+        _image_discoveries[tweet_id] = (future, now)
+
+def _take_image_discovery(tweet_id: int) -> Future | None:
+    """Retire et retourne la recherche d'image en cours d'un tweet (None si inconnue ou expirée)."""
+    with _image_discoveries_lock:
+        entry = _image_discoveries.pop(tweet_id, None)
+    if entry is None or time.monotonic() - entry[1] > IMAGE_DISCOVERY_TTL_SECONDS:
+        return None
+    return entry[0]
+
+class StageTimeout(Exception):
+    """Une étape du pipeline a dépassé son timeout."""
+    def __init__(self, stage: str, timeout: float, deadline_reached: bool = False):
+        self.stage = stage
+        self.timeout = timeout
+        # True si le timeout a été raccourci par l'échéance du cycle (travail à reporter)
+        self.deadline_reached = deadline_reached
+        super().__init__(f"Stage '{stage}' timed out after {timeout:.0f}s")
+
+def _stage_timeout(stage: str, deadline: float | None) -> tuple[float, bool]:
+    """Timeout effectif d'une étape : min(timeout de l'étape, temps restant avant l'échéance)."""
+    timeout = STAGE_TIMEOUTS[stage]
+    if deadline is None:
+        return timeout, False
+    remaining = deadline - time.monotonic()
+    if remaining < timeout:
+        return max(remaining, 0), True
+    return timeout, False
+
+def call_with_timeout(stage: str, func, *args, deadline: float | None = None, **kwargs):
+    """
+    Exécute un appel bloquant (DDG, Gemini) avec un timeout dur, dans son propre thread démon.
+    Au-delà, le cycle n'attend plus le résultat (le thread est abandonné) et StageTimeout est levée.
+    Un thread par appel : des appels bloqués n'occupent pas la place des suivants.
+    """
+    timeout, deadline_reached = _stage_timeout(stage, deadline)
+    future = Future()
+    
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, name=f"monitoring-{stage}", daemon=True).start()
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        logger.warning(f"Stage '{stage}' call abandoned after {timeout:.0f}s (thread left running).")
+        raise StageTimeout(stage, timeout, deadline_reached)
+
+def run_async_with_timeout(stage: str, coro, deadline: float | None = None):
+    """
+    Exécute une coroutine avec un timeout dur ; elle est annulée au-delà
+    (Playwright ferme alors le navigateur, voir le watchdog de tools.scraper).
+    """
+    timeout, deadline_reached = _stage_timeout(stage, deadline)
+    try:
+        return asyncio.run(asyncio.wait_for(coro, timeout=timeout))
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage, timeout, deadline_reached)
+
 def run_monitoring_cycle():
     """
     Cycle principal de veille.
-    Parcourt tous les sujets actifs et lance le traitement si l'intervalle est écoulé.
+    Parcourt tous les sujets actifs, met en file les nouveaux items si l'intervalle est écoulé,
+    puis consomme la file de jobs (scrape -> génération).
     """
     logger.info("Starting monitoring cycle...")
+    deadline = time.monotonic() + CYCLE_DEADLINE_SECONDS
     try:
         topics = get_active_topics()
         
-        for topic in topics:
+        for index, topic in enumerate(topics):
+            if time.monotonic() >= deadline:
+                # last_run non mis à jour : ces sujets seront traités au prochain cycle
+                logger.warning(f"Cycle deadline reached, carrying over {len(topics) - index} topics to next cycle.")
+                break
             try:
-                process_topic(topic)
+                process_topic(topic, deadline=deadline)
             except Exception as e:
                 logger.error(f"Error processing topic {topic['query']}: {e}")
     except Exception as e:
         logger.error(f"Critical error in monitoring cycle: {e}")
+    
+    try:
+        run_pending_jobs(deadline=deadline)
+    except Exception as e:
+        logger.error(f"Critical error while running jobs: {e}")
 
-def process_topic(topic):
-    """Traite un sujet spécifique selon son type."""
+def process_topic(topic, deadline: float | None = None):
+    """
+    Traite un sujet spécifique selon son type.
+    Si l'échéance du cycle interrompt la découverte, le sujet est reporté au cycle suivant.
+    """
     # Vérification de l'intervalle
     last_run = topic['last_run']
     if last_run:
@@ -52,20 +181,35 @@ def process_topic(topic):
     
     if source_type == 'twitter':
         # Recherche Twitter
-        tweets = search_tweets(topic['query'])
-        for tweet in tweets:
-            tweet_url = f"https://twitter.com/user/status/{tweet['id']}"
+        # Seuls les tweets plus récents que le curseur du sujet sont demandés
+        account = get_account(topic.get('account_id') or DEFAULT_ACCOUNT_ID)
+        search = call_with_timeout(
+            'discover', search_tweets, topic['query'], since_id=topic.get('since_id'), account=account,
+            deadline=deadline
+        )
+        # Recherche tronquée (pages, rate limit, erreur) : les tweets entre le curseur et le plus
+        # ancien retourné sont sautés ; le curseur avance quand même, sinon chaque relevé
+        # retéléchargerait les mêmes tweets récents
+        if search.truncated:
+            logger.info(f"Search for {topic['query']} truncated, older tweets skipped.")
+        # Du plus ancien au plus récent : le curseur n'avance que sur les tweets examinés
+        for tweet in reversed(search.tweets):
+            username = tweet.get('username') or 'user'
             potential_items.append({
-                'url': tweet_url,
-                'title': f"Tweet from {tweet['id']}",
+                'url': f"https://twitter.com/{username}/status/{tweet['id']}",
+                'title': f"Tweet from @{username}" if tweet.get('username') else f"Tweet from {tweet['id']}",
                 'content': tweet['text'],
+                'tweet_id': tweet['id'],
                 'is_tweet': True
             })
                 
     elif source_type == 'specific_url':
         # Surveillance d'une page spécifique (Deep Scan)
         try:
-            links = asyncio.run(get_links_from_page(topic['query']))
+            timeout, _ = _stage_timeout('discover', deadline)
+            links = run_async_with_timeout(
+                'discover', get_links_from_page(topic['query'], watchdog_seconds=timeout), deadline=deadline
+            )
             
             if not links:
                 logger.warning(f"No links found for {topic['query']} (possibly blocked), attempting fallback search...")
@@ -81,7 +225,9 @@ def process_topic(topic):
                     search_query = f"{domain_part} {path_part}"
                     logger.info(f"Fallback query: {search_query}")
                     
-                    results = DDGS().text(search_query, region='us-en', max_results=5)
+                    results = call_with_timeout(
+                        'discover', lambda: DDGS().text(search_query, region='us-en', max_results=5), deadline=deadline
+                    )
                     for res in results:
                         potential_items.append({
                             'url': res['href'], 
@@ -90,17 +236,21 @@ def process_topic(topic):
                             'is_tweet': False
                         })
                     logger.info(f"Fallback search found {len(results)} items.")
+                except StageTimeout:
+                    raise
                 except Exception as e:
                     logger.error(f"Fallback search failed: {e}")
             else:
                 for link in links:
                     potential_items.append({'url': link, 'title': 'New Link', 'is_tweet': False})
+        except StageTimeout:
+            raise
         except Exception as e:
             logger.error(f"Error monitoring URL {topic['query']}: {e}")
             
     else: # web_search (défaut)
         try:
-            results = DDGS().text(topic['query'], max_results=5)
+            results = call_with_timeout('discover', lambda: DDGS().text(topic['query'], max_results=5), deadline=deadline)
             for res in results:
                 potential_items.append({
                     'url': res['href'], 
@@ -108,16 +258,25 @@ def process_topic(topic):
                     'snippet': res.get('body', ''), # Capture snippet for fallback
                     'is_tweet': False
                 })
+        except StageTimeout:
+            raise
         except Exception as e:
             logger.error(f"Search failed for {topic['query']}: {e}")
 
-    # --- 2. Traitement des nouveaux items ---
+    # --- 2. Mise en file des nouveaux items ---
+    # Chaque candidat devient un job persistant : un redémarrage du worker
+    # ne perd plus les items trouvés mais pas encore générés.
     
-    items_processed = 0
+    items_queued = 0
+    since_id = None
+    # Dédoublonnage de tous les candidats en une requête
+    processed = get_processed_urls([item['url'] for item in potential_items])
     
     for item in potential_items:
+        since_id = item.get('tweet_id') or since_id
+        
         # Vérifier si déjà traité
-        if is_url_processed(item['url']):
+        if item['url'] in processed:
             continue
 
         # Exclusion Actustream Player
@@ -125,95 +284,448 @@ def process_topic(topic):
             logger.info(f"Skipping excluded URL: {item['url']}")
             mark_url_processed(item['url'], topic['id'])
             continue
-            
-        logger.info(f"New content found: {item['url']}")
         
-        # Préparation du contenu source
-        source_content = item.get('content', '')
-        image_url = None
+        payload = {
+            'topic_id': topic['id'],
+            'topic_query': topic['query'],
+            'account_id': topic.get('account_id') or DEFAULT_ACCOUNT_ID,
+            'item': item,
+            'slot': items_queued
+        }
         
-        # Deep Scraping si nécessaire (pour les liens web)
-        if not item.get('is_tweet'):
-            try:
-                # On scrape TOUJOURS pour avoir le contenu complet et l'image
-                scrape_result = asyncio.run(scrape_website(item['url']))
-                
-                if isinstance(scrape_result, dict):
-                    source_content = scrape_result.get('content', '')
-                    image_url = scrape_result.get('image_url')
-                else:
-                    source_content = scrape_result
-                
-                # Fallback Image Search si pas d'image trouvée
-                if not image_url:
-                    try:
-                        logger.info(f"No image found for {item['url']}, searching fallback...")
-                        # Utiliser le titre ou une partie de l'URL pour la recherche
-                        search_term = item.get('title') or topic['query']
-                        ddgs = DDGS()
-                        images = ddgs.images(search_term, max_results=1)
-                        if images:
-                            image_url = images[0]['image']
-                            logger.info(f"Fallback image found: {image_url}")
-                    except Exception as e:
-                        logger.warning(f"Fallback image search failed: {e}")
-
-                # Ignorer si contenu trop court (probablement erreur ou page vide)
-                # Ignorer si contenu trop court (probablement erreur ou page vide)
-                if len(source_content) < 200:
-                    logger.warning(f"Content too short for {item['url']} ({len(source_content)} chars).")
-                    
-                    # FALLBACK: Utiliser le snippet si disponible
-                    if item.get('snippet'):
-                        logger.info(f"Using fallback snippet for {item['url']}")
-                        source_content = f"Title: {item.get('title')}\nSnippet: {item.get('snippet')}\n(Scraping failed or content too short)"
-                    else:
-                        logger.warning("No snippet available for fallback. Skipping.")
-                        mark_url_processed(item['url'], topic['id']) # Marquer pour ne pas réessayer en boucle
-                        continue
-                    
-            except Exception as e:
-                logger.error(f"Failed to scrape {item['url']}: {e}")
-                # FALLBACK on error
-                if item.get('snippet'):
-                    logger.info(f"Using fallback snippet after error for {item['url']}")
-                    source_content = f"Title: {item.get('title')}\nSnippet: {item.get('snippet')}\n(Scraping error: {str(e)})"
-                else:
-                    continue
-
-        # --- 3. Génération du tweet ---
-        
-        prompt_topic = topic['query']
+        # Les tweets n'ont pas besoin d'être scrapés : génération directe
+        job_type = 'generate' if item.get('is_tweet') else 'scrape'
         if item.get('is_tweet'):
-            prompt_topic = f"Réaction au tweet sur {topic['query']}"
-            
-        tweet_content = generate_tweet_content(
-            topic=prompt_topic,
-            source_content=source_content,
-            tone="informative"
-        )
-        
-        if "Error" in tweet_content:
-            logger.error(f"Failed to generate tweet for {item['url']}: {tweet_content}")
-            continue
-
-        # --- 4. Planification ---
-        
-        # On étale les tweets si on en trouve plusieurs d'un coup (toutes les 5 min)
-        delay_minutes = 5 + (items_processed * 5)
-        run_at = datetime.now() + timedelta(minutes=delay_minutes)
+            payload['source_content'] = item.get('content', '')
         
-        add_scheduled_tweet(tweet_content, run_at, source_url=item['url'], image_url=image_url)
+        job_id = enqueue_job(job_type, payload, dedup_key=f"{job_type}:{item['url']}")
+        if job_id is None:
+            continue # Déjà en file (cycle précédent)
         
-        # --- 5. Clôture item ---
-        mark_url_processed(item['url'], topic['id'])
-        items_processed += 1
+        logger.info(f"New content found: {item['url']} (queued as {job_type} job {job_id})")
+        items_queued += 1
         
         # Limite de sécurité : max 3 tweets par cycle pour un même sujet pour éviter le spam
-        if items_processed >= 3:
+        if items_queued >= MAX_ITEMS_PER_CYCLE:
             break
     
+    # Les tweets non examinés (limite atteinte) restent après le curseur pour le prochain cycle
+    if since_id:
+        update_topic_since_id(topic['id'], since_id)
+    
     # Mise à jour du last_run global du sujet
     update_topic_last_run(topic['id'])
-    if items_processed > 0:
-        logger.info(f"Successfully scheduled {items_processed} tweets for {topic['query']}")
+    if items_queued > 0:
+        logger.info(f"Queued {items_queued} items for {topic['query']}")
+
+# --- Job handlers ---
+
+def process_scrape_job(job, deadline: float | None = None) -> dict | None:
+    """
+    Scrape l'article d'un candidat.
+    Retourne le job de génération à enchaîner (avec le contenu scrapé dans son payload),
+    ou None si l'item doit être abandonné. Lève une exception pour réessayer plus tard.
+    """
+    payload = job['payload']
+    item = payload['item']
+    
+    if is_url_processed(item['url']):
+        return None
+    
+    image_candidates = []
+    try:
+        # On scrape TOUJOURS pour avoir le contenu complet et les images candidates
+        # Watchdog armé sur le timeout de l'étape : Chromium bloqué en plein scrape est tué
+        timeout, _ = _stage_timeout('scrape', deadline)
+        scrape_result = run_async_with_timeout(
+            'scrape', scrape_website(item['url'], watchdog_seconds=timeout), deadline=deadline
+        )
+        
+        if isinstance(scrape_result, dict):
+            if scrape_result.get('error'):
+                logger.info(f"Skipping {item['url']}: {scrape_result['error']}")
+                mark_url_processed(item['url'], payload['topic_id'])
+                return None
+            source_content = scrape_result.get('content') or ''
+            image_candidates = scrape_result.get('image_candidates') or []
+            if not image_candidates and scrape_result.get('image_url'):
+                image_candidates = [{'url': scrape_result['image_url'], 'source': 'og'}]
+        else:
+            source_content = scrape_result or ''
+        
+        # Le choix de l'image (HEAD checks, recherche de secours) se fait pendant la génération
+
+        # Ignorer si contenu trop court (probablement erreur ou page vide)
+        if len(source_content) < 200:
+            logger.warning(f"Content too short for {item['url']} ({len(source_content)} chars).")
+            
+            # FALLBACK: Utiliser le snippet si disponible
+            if item.get('snippet'):
+                logger.info(f"Using fallback snippet for {item['url']}")
+                source_content = f"Title: {item.get('title')}\nSnippet: {item.get('snippet')}\n(Scraping failed or content too short)"
+            else:
+                logger.warning("No snippet available for fallback. Skipping.")
+                mark_url_processed(item['url'], payload['topic_id']) # Marquer pour ne pas réessayer en boucle
+                return None
+            
+    except StageTimeout:
+        raise # Reporté (échéance) ou réessayé plus tard (page bloquée)
+    except Exception as e:
+        logger.error(f"Failed to scrape {item['url']}: {e}")
+        # FALLBACK on error
+        if not item.get('snippet'):
+            raise # Le job sera réessayé plus tard
+        logger.info(f"Using fallback snippet after error for {item['url']}")
+        source_content = f"Title: {item.get('title')}\nSnippet: {item.get('snippet')}\n(Scraping error: {str(e)})"
+    
+    return {
+        'type': 'generate',
+        'payload': {**payload, 'source_content': source_content, 'image_candidates': image_candidates},
+        'dedup_key': f"generate:{item['url']}"
+    }
+
+def _prepare_generation(job) -> dict | None:
+    """
+    Prépare la génération d'un job : requête LLM et recherche d'image lancée en parallèle.
+    Retourne None si l'item a déjà été traité.
+    """
+    payload = job['payload']
+    item = payload['item']
+    
+    # Idempotence : si le worker a été arrêté après la planification, ne pas dupliquer
+    if is_url_processed(item['url']):
+        return None
+    
+    # Découverte d'image lancée en parallèle de la génération
+    image_future = None
+    image_candidates = []
+    if not item.get('is_tweet'):
+        image_candidates = payload.get('image_candidates') or []
+        if not image_candidates and payload.get('image_url'):
+            image_candidates = [{'url': payload['image_url'], 'source': 'og'}] # Jobs créés avant les candidates
+        image_future = _image_executor.submit(
+            find_best_image, image_candidates, search_term=item.get('title') or payload['topic_query']
+        )
+    
+    prompt_topic = payload['topic_query']
+    if item.get('is_tweet'):
+        prompt_topic = f"Réaction au tweet sur {payload['topic_query']}"
+    
+    return {
+        'job': job,
+        'request': {
+            'topic': prompt_topic,
+            'source_content': payload.get('source_content', ''),
+            'tone': "informative",
+            'model': DRAFT_MODEL
+        },
+        'image_future': image_future,
+        'image_candidates': image_candidates
+    }
+
+def _validate_draft(context: dict, tweet_content: str, deadline: float | None = None) -> tuple[str, dict]:
+    """
+    Valide le brouillon (longueur pondérée, chiffres clés du titre, quasi-doublon d'un tweet récent).
+    Seul un brouillon en échec est régénéré, avec les problèmes en consigne, au plus MAX_REGENERATIONS fois
+    et jamais au-delà de l'échéance du cycle (le dernier brouillon est alors gardé).
+    Retourne (dernier brouillon, résultat de sa validation).
+    """
+    item = context['job']['payload']['item']
+    required_facts = [] if item.get('is_tweet') else extract_key_facts(item.get('title'))
+    index = get_recent_index()
+    
+    validation = validate_tweet(tweet_content, required_facts, index)
+    attempts = 0
+    while not validation['ok'] and attempts < MAX_REGENERATIONS:
+        attempts += 1
+        logger.info(f"Draft for {item['url']} rejected ({'; '.join(validation['problems'])}), regenerating ({attempts}/{MAX_REGENERATIONS}).")
+        try:
+            draft = call_with_timeout(
+                'generate', generate_tweet_content, **context['request'], feedback="\n".join(validation['problems']),
+                deadline=deadline
+            )
+        except StageTimeout as e:
+            logger.warning(f"Regeneration stopped for {item['url']}: {e}")
+            break
+        if "Error" in draft:
+            logger.warning(f"Regeneration failed for {item['url']}: {draft}")
+            break
+        tweet_content = draft
+        validation = validate_tweet(tweet_content, required_facts, index)
+    
+    return tweet_content, validation
+
+def _finalize_generation(context: dict, tweet_content: str, deadline: float | None = None) -> dict | None:
+    """Valide et planifie le tweet généré ; retourne un job 'attach_image' si l'image n'est pas prête."""
+    payload = context['job']['payload']
+    item = payload['item']
+    
+    if "Error" in tweet_content:
+        raise RuntimeError(f"Failed to generate tweet for {item['url']}: {tweet_content}")
+
+    tweet_content, validation = _validate_draft(context, tweet_content, deadline)
+    if validation['duplicate']:
+        # Même après régénération : l'article n'apporte rien de neuf, on ne le planifie pas
+        mark_url_processed(item['url'], payload['topic_id'])
+        logger.info(f"Draft for {item['url']} duplicates tweet {validation['similar_to']}, skipped.")
+        return None
+    # Brouillon encore invalide : planifié quand même, avec les problèmes visibles à la validation
+    validation_note = None if validation['ok'] else "Validation : " + " ".join(validation['problems'])
+
+    # Image prête ? Sinon le tweet est planifié sans, et l'image sera rattachée par un job
+    image_url = None
+    image_pending = False
+    if context['image_future']:
+        try:
+            image_url = context['image_future'].result(timeout=IMAGE_WAIT_SECONDS)
+        except FutureTimeoutError:
+            image_pending = True
+            logger.info(f"Image for {item['url']} not ready, will be attached later.")
+        except Exception as e:
+            logger.warning(f"Image discovery failed for {item['url']}: {e}")
+
+    # On étale les tweets si on en trouve plusieurs d'un coup (toutes les 5 min)
+    delay_minutes = 5 + (payload.get('slot', 0) * 5)
+    run_at = datetime.now() + timedelta(minutes=delay_minutes)
+    
+    # Texte encore trop long : publié en thread numéroté
+    tweet_id = add_scheduled_tweet(
+        tweet_content, run_at, source_url=item['url'], image_url=image_url, error_message=validation_note,
+        thread_content=compose_thread_content(tweet_content),
+        account_id=payload.get('account_id') or DEFAULT_ACCOUNT_ID
+    )
+    get_recent_index().add(tweet_id, tweet_content)
+    mark_url_processed(item['url'], payload['topic_id'])
+    logger.info(f"Tweet scheduled for {item['url']}")
+    
+    if image_pending:
+        _register_image_discovery(tweet_id, context['image_future'])
+        return {
+            'type': 'attach_image',
+            'payload': {
+                'tweet_id': tweet_id,
+                'image_candidates': context['image_candidates'],
+                'search_term': item.get('title') or payload['topic_query']
+            },
+            'dedup_key': f"attach_image:{tweet_id}"
+        }
+    return None
+
+def process_generate_job(job, deadline: float | None = None) -> dict | None:
+    """
+    Génère le tweet d'un item scrapé et le planifie (en attente de validation).
+    L'image est cherchée en parallèle ; si elle n'est pas prête à temps, retourne
+    un job 'attach_image' qui la rattachera au tweet plus tard.
+    """
+    context = _prepare_generation(job)
+    if context is None:
+        return None
+    
+    tweet_content = call_with_timeout('generate', generate_tweet_content, **context['request'], deadline=deadline)
+    return _finalize_generation(context, tweet_content, deadline)
+
+def process_generate_jobs_concurrently(jobs: list[dict], deadline: float | None = None):
+    """
+    Génère les tweets de plusieurs jobs en parallèle via le service de génération
+    (concurrence bornée + limite de débit) ; chaque job est finalisé dès que son tweet arrive.
+    En mode 'batch', les articles sont regroupés dans des appels uniques.
+    """
+    contexts = []
+    for job in jobs:
+        try:
+            context = _prepare_generation(job)
+        except Exception as e:
+            _handle_job_error(job, e)
+            continue
+        if context is None:
+            ack_job(job['id'])
+        else:
+            contexts.append(context)
+    
+    if not contexts:
+        return
+    
+    timeout, deadline_reached = _stage_timeout('generate', deadline)
+    # Jobs dont la finalisation n'a pas commencé : reportés (ou remis en file) si le timeout tombe.
+    # Une finalisation réserve son job sous le verrou : un job commencé n'est jamais aussi reporté
+    pending = dict(enumerate(contexts))
+    pending_lock = threading.Lock()
+    # Pool dédié (appels LLM et finalisations) : abandonné sans attente à l'expiration,
+    # là où asyncio.run attendrait la fin des threads du pool par défaut
+    executor = ThreadPoolExecutor(
+        max_workers=GEMINI_MAX_CONCURRENCY + len(contexts), thread_name_prefix="monitoring-generate"
+    )
+    loop = asyncio.new_event_loop()
+    loop.set_default_executor(executor)
+    end = loop.time() + timeout
+    
+    def finalize(index: int, stats: dict):
+        with pending_lock:
+            # Timeout déjà tombé : le job a été reporté, il ne doit plus être planifié ici
+            if pending.pop(index, None) is None:
+                return
+        context = contexts[index]
+        if "Error" not in stats['tweet']:
+            record_generation_metric(stats['mode'], stats['prompt_tokens'], stats['output_tokens'], stats['latency_ms'])
+        _run_job_step(context['job'], lambda: _finalize_generation(context, stats['tweet'], deadline))
+    
+    async def finalize_within_deadline(index: int, stats: dict):
+        # La finalisation (attente d'image, DB, régénérations) ne doit pas bloquer la boucle ;
+        # chaque finalisation n'a que le temps restant avant l'échéance
+        await asyncio.wait_for(loop.run_in_executor(executor, finalize, index, stats), timeout=max(end - loop.time(), 0))
+    
+    async def consume():
+        service = get_generation_service()
+        requests = [c['request'] for c in contexts]
+        if GENERATION_MODE == 'batch':
+            results = await service.generate_batch(requests)
+            for index, stats in enumerate(results):
+                await finalize_within_deadline(index, stats)
+            return
+        async for index, stats in service.generate_many_with_stats(requests):
+            await finalize_within_deadline(index, stats)
+    
+    try:
+        loop.run_until_complete(asyncio.wait_for(consume(), timeout=timeout))
+    except asyncio.TimeoutError:
+        with pending_lock:
+            unclaimed = list(pending.values())
+            pending.clear()
+        # Les finalisations déjà commencées terminent (ack ou erreur) dans leur thread
+        for context in unclaimed:
+            _handle_job_error(context['job'], StageTimeout('generate', timeout, deadline_reached))
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        executor.shutdown(wait=False, cancel_futures=True)
+        loop.close()
+
+def process_attach_image_job(job, deadline: float | None = None) -> None:
+    """
+    Rattache une image à un tweet déjà planifié (si elle n'était pas prête à temps).
+    La recherche lancée pendant la génération est reprise ; elle n'est refaite depuis les
+    candidates du payload que si elle n'existe plus (worker redémarré, échec).
+    """
+    payload = job['payload']
+    future = _take_image_discovery(payload['tweet_id'])
+    if future is not None:
+        timeout, deadline_reached = _stage_timeout('image', deadline)
+        try:
+            image_url = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # Toujours en cours : la reprise du job attendra la même recherche
+            _register_image_discovery(payload['tweet_id'], future)
+            raise StageTimeout('image', timeout, deadline_reached)
+    else:
+        image_url = call_with_timeout(
+            'image', find_best_image, payload.get('image_candidates') or [],
+            search_term=payload.get('search_term'), deadline=deadline
+        )
+    if image_url and attach_tweet_image_if_missing(payload['tweet_id'], image_url):
+        logger.info(f"Image attached to tweet {payload['tweet_id']}: {image_url}")
+    return None
+
+def process_prefetch_media_job(job, deadline: float | None = None) -> dict | None:
+    """
+    Pré-uploade l'image d'un tweet approuvé et stocke son media_id sur la ligne :
+    à l'heure d'envoi, la publication se résume à un appel create_tweet.
+    """
+    tweet_id = job['payload']['tweet_id']
+    tweet = get_tweet(tweet_id)
+    if not tweet or tweet['status'] != 'pending' or not tweet['image_url']:
+        return None
+    if tweet['media_id'] and datetime.fromisoformat(tweet['media_expires_at']) > datetime.now():
+        return None
+    
+    # Envoi lointain : le media_id expirerait avant, on reporte le pré-upload
+    scheduled_time = datetime.fromisoformat(tweet['scheduled_time'])
+    prefetch_at = scheduled_time - timedelta(hours=MEDIA_PREFETCH_LEAD_HOURS)
+    if prefetch_at > datetime.now():
+        return {
+            'type': 'prefetch_media',
+            'payload': {'tweet_id': tweet_id},
+            'dedup_key': f"prefetch_media:{tweet_id}:{tweet['image_url']}:{prefetch_at.isoformat()}",
+            'available_at': prefetch_at
+        }
+    
+    # media_id propre au compte qui publiera le tweet
+    prepared = prepare_media(tweet['image_url'], get_account(tweet['account_id'] or DEFAULT_ACCOUNT_ID))
+    if not prepared:
+        # L'envoi retentera l'upload (ou partira sans image)
+        logger.warning(f"Media prefetch failed for tweet {tweet_id}: {tweet['image_url']}")
+        return None
+    if set_tweet_media(tweet_id, tweet['image_url'], prepared['media_id'], prepared['expires_at']):
+        logger.info(f"Media pre-uploaded for tweet {tweet_id} (media_id {prepared['media_id']}).")
+    return None
+
+JOB_HANDLERS = {
+    'scrape': process_scrape_job,
+    'generate': process_generate_job,
+    'attach_image': process_attach_image_job,
+    'prefetch_media': process_prefetch_media_job,
+}
+
+def _handle_job_error(job: dict, error: Exception):
+    """Reporte (échéance du cycle) ou remet en file avec backoff un job en échec."""
+    if isinstance(error, StageTimeout) and error.deadline_reached:
+        release_job(job['id'], note=str(error))
+        state = 'queued'
+        logger.warning(f"Job {job['id']} ({job['type']}) interrupted by cycle deadline, carried over.")
+    elif isinstance(error, StageTimeout):
+        state = fail_job(job['id'], str(error))
+        logger.error(f"Job {job['id']} ({job['type']}) timed out (attempt {job['attempts']}, now {state}).")
+    else:
+        state = fail_job(job['id'], str(error))
+        logger.error(f"Job {job['id']} ({job['type']}) failed (attempt {job['attempts']}, now {state}): {error}")
+    if job['type'] == 'attach_image' and state != 'queued':
+        # Rattachement abandonné : sa recherche d'image ne sera plus reprise
+        _take_image_discovery(job['payload']['tweet_id'])
+
+def _run_job_step(job: dict, step):
+    """Exécute une étape de job puis l'acquitte (avec son éventuel job suivant) ou gère l'échec."""
+    try:
+        next_job = step()
+        ack_job(job['id'], next_job=next_job)
+    except Exception as e:
+        _handle_job_error(job, e)
+
+def run_pending_jobs(max_jobs: int = 20, deadline: float | None = None) -> int:
+    """
+    Boucle de consommation de la file de jobs.
+    Réserve les jobs, les exécute puis les acquitte (ou les remet en file en cas d'échec).
+    Les jobs de génération disponibles sont traités ensemble, en parallèle.
+    Aucun job n'est démarré après l'échéance ; un job interrompu par elle est reporté sans pénalité.
+    """
+    # Reprendre les jobs abandonnés par un worker arrêté en plein travail
+    requeued = requeue_stale_jobs()
+    if requeued > 0:
+        logger.info(f"Requeued {requeued} interrupted jobs.")
+    
+    processed = 0
+    while processed < max_jobs:
+        if deadline is not None and time.monotonic() >= deadline:
+            logger.warning("Cycle deadline reached, remaining jobs carried over to next cycle.")
+            break
+        
+        job = claim_job(list(JOB_HANDLERS))
+        if not job:
+            break
+        
+        if job['type'] == 'generate':
+            jobs = [job]
+            # Mode batch : de quoi remplir un appel groupé ; sinon un job par appel simultané
+            group_size = GENERATION_BATCH_SIZE if GENERATION_MODE == 'batch' else GEMINI_MAX_CONCURRENCY
+            while len(jobs) < group_size and processed + len(jobs) < max_jobs:
+                extra = claim_job(['generate'])
+                if not extra:
+                    break
+                jobs.append(extra)
+            if len(jobs) > 1:
+                process_generate_jobs_concurrently(jobs, deadline=deadline)
+                processed += len(jobs)
+                continue
+        
+        handler = JOB_HANDLERS[job['type']]
+        _run_job_step(job, lambda: handler(job, deadline=deadline))
+        processed += 1
+    
+    return processed
@@ -1,23 +1,145 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from database import get_pending_tweets, update_tweet_status, get_monthly_count, get_setting
-from tools.twitter import post_tweet
+from database import (
+    get_pending_tweets, update_tweet_status, get_monthly_count, get_setting, record_thread_progress, record_send_metric,
+    reserve_tweet_send, requeue_stale_sends, get_accounts, DEFAULT_ACCOUNT_ID
+)
+from tools.twitter import post_tweet, post_thread, PostResult
+from tools.thread_composer import parse_thread_content, split_into_thread
+from tools.tweet_validator import weighted_length, TWEET_MAX_WEIGHTED_LENGTH
+from tools import rate_limits
+import itertools
+import json
 import logging
-from datetime import datetime
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-MONTHLY_LIMIT = 500
+# Envois simultanés (rattrapage après une pause ou une panne) et durée au-delà de laquelle
+# un envoi resté 'sending' est considéré comme interrompu (secondes)
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", "4"))
+SEND_LEASE_SECONDS = int(os.getenv("SEND_LEASE_SECONDS", "600"))
+# Durée de conservation des jobs terminés ou abandonnés (jours)
+JOBS_RETENTION_DAYS = int(os.getenv("JOBS_RETENTION_DAYS", "7"))
+
+def _post_count(tweet: dict) -> int:
+    """Posts que l'API facturera pour cet envoi : un par partie de thread pas encore publiée."""
+    thread_parts = parse_thread_content(tweet.get('thread_content'))
+    if not thread_parts and weighted_length(tweet['content']) > TWEET_MAX_WEIGHTED_LENGTH:
+        thread_parts = split_into_thread(tweet['content'])
+    if not thread_parts:
+        return 1
+    posted = json.loads(tweet.get('thread_posted_ids') or '[]')
+    return max(len(thread_parts) - len(posted), 0)
+
+def _post(tweet: dict, account: dict) -> PostResult:
+    """Publie un tweet de la file (thread si nécessaire, media_id pré-uploadé si valide)."""
+    image_url = tweet.get('image_url')
+    media_ids = None
+    if tweet.get('media_id') and datetime.fromisoformat(str(tweet['media_expires_at'])) > datetime.now():
+        media_ids = [tweet['media_id']]
+    thread_parts = parse_thread_content(tweet.get('thread_content'))
+    if thread_parts or weighted_length(tweet['content']) > TWEET_MAX_WEIGHTED_LENGTH:
+        # Thread : reprise après la dernière partie publiée si un envoi précédent a échoué
+        return post_thread(
+            tweet['content'],
+            image_url=image_url,
+            parts=thread_parts,
+            posted_ids=json.loads(tweet.get('thread_posted_ids') or '[]'),
+            on_part_posted=lambda ids, tweet_id=tweet['id']: record_thread_progress(tweet_id, ids),
+            media_ids=media_ids,
+            account=account
+        )
+    if media_ids:
+        return post_tweet(tweet['content'], media_ids=media_ids, account=account)
+    return post_tweet(tweet['content'], image_url=image_url, account=account)
+
+def _send_one(tweet: dict, account: dict, rate_limited: threading.Event) -> str:
+    """
+    Réserve le tweet (et sa place dans le quota de son compte) puis l'envoie.
+    Retourne 'sent', 'failed', 'rate_limited', 'skipped', 'deferred' ou 'unavailable'.
+    """
+    # Un autre envoi du même compte a atteint la limite : inutile d'appeler l'API
+    if rate_limited.is_set():
+        return 'deferred'
+    
+    reservation = reserve_tweet_send(tweet['id'], account['monthly_limit'], posts=_post_count(tweet))
+    if reservation == 'quota_exceeded':
+        logger.warning(f"Monthly limit reached for account {account['name']}. Skipping tweet {tweet['id']}.")
+        update_tweet_status(tweet['id'], 'skipped', error=f"Monthly limit reached ({account['monthly_limit']} tweets)")
+        return 'skipped'
+    if reservation != 'reserved':
+        # Déjà pris par un autre envoi (ou plus en attente)
+        return 'unavailable'
+    
+    logger.info(f"Sending tweet {tweet['id']} ({account['name']}): {tweet['content'][:30]}...")
+    result = _post(tweet, account)
+    
+    try:
+        record_send_metric(
+            tweet['id'], result.status, result.error_class,
+            result.download_ms, result.upload_ms, result.post_ms
+        )
+    except sqlite3.Error as e:
+        # Le tweet est peut-être déjà publié : une métrique perdue ne doit pas bloquer la mise à jour du statut
+        logger.warning(f"Could not record send metric: {e}")
+    
+    if result.status == 'rate_limited':
+        # Rate limit (429) : les tweets du compte restent en attente jusqu'à la réinitialisation de la fenêtre
+        rate_limited.set()
+        logger.warning(f"Account {account['name']} rate limited until {result.retry_after:%H:%M:%S}. Leaving its tweets pending.")
+        update_tweet_status(tweet['id'], 'pending', error=f"Rate Limit (429) - Will retry after {result.retry_after:%Y-%m-%d %H:%M:%S}")
+    elif not result.ok:
+        logger.error(f"Failed to send tweet {tweet['id']}: {result.error_class}: {result.error}")
+        update_tweet_status(tweet['id'], 'failed', error=str(result))
+    else:
+        logger.info(f"Tweet {tweet['id']} sent successfully in {result.total_ms} ms. Twitter ID: {result.tweet_id}")
+        update_tweet_status(tweet['id'], 'sent', twitter_id=result.tweet_id)
+    return result.status
+
+def _sendable_tweets(account: dict, tweets: list[dict]) -> list[dict]:
+    """Tweets d'un compte à envoyer maintenant : rien si le compte est limité ou son quota atteint."""
+    retry_at = rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS, account['name'])
+    if retry_at:
+        logger.info(f"Account {account['name']} rate limited until {retry_at:%H:%M:%S}. Its tweets stay pending.")
+        return []
+    
+    current_count = get_monthly_count(account['id'])
+    logger.info(f"Monthly count for {account['name']}: {current_count}/{account['monthly_limit']}")
+    if current_count >= account['monthly_limit']:
+        for tweet in tweets:
+            logger.warning(f"Monthly limit reached ({current_count}). Skipping tweet {tweet['id']}.")
+            update_tweet_status(
+                tweet['id'], 
+                'skipped', 
+                error=f"Monthly limit reached ({account['monthly_limit']} tweets)"
+            )
+        return []
+    return tweets
 
 def check_and_send_tweets():
-    """Vérifie les tweets en attente et les envoie si le quota le permet."""
+    """
+    Vérifie les tweets en attente et les envoie si le quota de leur compte le permet.
+    Les tweets dus sont envoyés en parallèle (SEND_CONCURRENCY workers), en alternant les
+    comptes ; chaque envoi réserve atomiquement sa place dans le quota mensuel de son compte,
+    et un compte limité (429) n'arrête que ses propres envois.
+    """
     # Vérifier si en pause
     if get_setting("pause_mode", "False") == "True":
         logger.info("Bot is in PAUSE mode. Skipping tweet check.")
         return
 
+    # Envois interrompus (arrêt du worker en plein envoi) : remis en attente
+    requeued = requeue_stale_sends(SEND_LEASE_SECONDS)
+    if requeued > 0:
+        logger.info(f"Requeued {requeued} interrupted sends.")
+
     logger.info("Checking for pending tweets...")
     
     pending_tweets = get_pending_tweets()
@@ -26,49 +148,46 @@ def check_and_send_tweets():
         logger.info("No pending tweets.")
         return
 
-    current_count = get_monthly_count()
-    logger.info(f"Current monthly count: {current_count}/{MONTHLY_LIMIT}")
-
+    accounts = {account['id']: account for account in get_accounts(active_only=False)}
+    by_account = {}
     for tweet in pending_tweets:
-        # Vérification stricte du quota
-        if current_count >= MONTHLY_LIMIT:
-            logger.warning(f"Monthly limit reached ({current_count}). Skipping tweet {tweet['id']}.")
-            update_tweet_status(
-                tweet['id'], 
-                'skipped', 
-                error="Monthly limit reached (500 tweets)"
-            )
+        by_account.setdefault(tweet.get('account_id') or DEFAULT_ACCOUNT_ID, []).append(tweet)
+
+    queues = []
+    for account_id, tweets in by_account.items():
+        account = accounts.get(account_id)
+        if not account or not account['is_active']:
+            logger.warning(f"Account {account_id} missing or inactive: {len(tweets)} tweets left pending.")
             continue
+        sendable = _sendable_tweets(account, tweets)
+        if sendable:
+            queues.append([(tweet, account) for tweet in sendable])
+
+    # Tour de rôle entre comptes : un gros retard sur un compte ne fait pas attendre les autres
+    jobs = [job for batch in itertools.zip_longest(*queues) for job in batch if job]
+    if not jobs:
+        return
 
-        logger.info(f"Sending tweet {tweet['id']}: {tweet['content'][:30]}...")
-        
-        # Tentative d'envoi (avec image si disponible)
-        image_url = tweet.get('image_url')
-        result = post_tweet(tweet['content'], image_url=image_url)
-        
-        if "Error" in result:
-            logger.error(f"Failed to send tweet {tweet['id']}: {result}")
-            
-            # Gestion spécifique du Rate Limit (429)
-            if "429" in result or "Too Many Requests" in result:
-                logger.warning("Rate Limit detected (429). Leaving tweet in pending state for retry later.")
-                # On ne change PAS le statut, il sera repris au prochain cycle (ou on pourrait ajouter un backoff)
-                # Optionnel : Mettre un message d'erreur temporaire sans changer le statut 'pending'
-                update_tweet_status(tweet['id'], 'pending', error="Rate Limit (429) - Will retry later")
-            else:
-                update_tweet_status(tweet['id'], 'failed', error=result)
-        else:
-            # Extraction de l'ID (format supposé: "Tweet posted successfully! ID: 12345")
+    rate_limited = {account_id: threading.Event() for account_id in by_account}
+    workers = max(1, min(SEND_CONCURRENCY, len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sender") as executor:
+        futures = {
+            executor.submit(_send_one, tweet, account, rate_limited[account['id']]): tweet
+            for tweet, account in jobs
+        }
+        outcomes = {}
+        for future in as_completed(futures):
             try:
-                twitter_id = result.split("ID: ")[1].strip()
-            except:
-                twitter_id = "unknown"
-                
-            logger.info(f"Tweet {tweet['id']} sent successfully. Twitter ID: {twitter_id}")
-            update_tweet_status(tweet['id'], 'sent', twitter_id=twitter_id)
-            current_count += 1
+                outcome = future.result()
+            except Exception as e:
+                # Erreur inattendue (base indisponible...) : le tweet sera repris après le bail
+                logger.error(f"Unexpected error while sending tweet {futures[future]['id']}: {e}")
+                outcome = 'error'
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    
+    logger.info(f"Send cycle finished: {outcomes}")
 
-from monitoring_service import run_monitoring_cycle
+from monitoring_service import run_monitoring_cycle, run_pending_jobs
 
 def start_scheduler():
     """Démarre le planificateur en arrière-plan."""
@@ -92,6 +211,15 @@ def start_scheduler():
         replace_existing=True
     )
     
+    # Consommation de la file de jobs (reprises, backoff) entre deux cycles de veille
+    scheduler.add_job(
+        run_pending_jobs,
+        trigger=IntervalTrigger(seconds=30),
+        id='job_worker',
+        name='Run pending pipeline jobs',
+        replace_existing=True
+    )
+    
     scheduler.start()
     logger.info("Scheduler started.")
     
@@ -106,12 +234,24 @@ def start_scheduler():
     )
     
     # Nettoyage des vieux tweets en attente (toutes les heures)
-    from database import delete_old_awaiting_tweets
+    from database import (
+        delete_old_awaiting_tweets, purge_expired_generation_cache, purge_expired_media_cache, purge_finished_jobs
+    )
+    from tools.generation_cache import CACHE_TTL_HOURS
     
     def run_cleanup():
         count = delete_old_awaiting_tweets(hours=24)
         if count > 0:
             logger.info(f"Cleaned up {count} old awaiting tweets.")
+        purged = purge_expired_generation_cache(CACHE_TTL_HOURS)
+        if purged > 0:
+            logger.info(f"Purged {purged} expired generation cache entries.")
+        purged = purge_expired_media_cache()
+        if purged > 0:
+            logger.info(f"Purged {purged} expired media cache entries.")
+        purged = purge_finished_jobs(JOBS_RETENTION_DAYS)
+        if purged > 0:
+            logger.info(f"Purged {purged} finished jobs.")
 
     scheduler.add_job(
         run_cleanup,
@@ -121,4 +261,44 @@ def start_scheduler():
         replace_existing=True
     )
 
+    # Réconciliation des compteurs d'usage avec la table tweets (mois précédent et mois en cours)
+    from database import reconcile_usage_counters
+
+    def run_usage_reconciliation():
+        start_of_previous_month = (datetime.now().replace(day=1) - timedelta(days=1)).replace(day=1)
+        corrected = reconcile_usage_counters(since=start_of_previous_month)
+        if corrected > 0:
+            logger.warning(f"Usage counters drifted: {corrected} counters corrected.")
+
+    scheduler.add_job(
+        run_usage_reconciliation,
+        trigger=IntervalTrigger(hours=24),
+        id='usage_reconciliation',
+        name='Reconcile usage counters',
+        replace_existing=True
+    )
+
+    # Relevés périodiques des métriques du top (séries d'engagement pour les tendances)
+    from database import purge_old_metric_snapshots
+    from tools.trending import record_snapshot, TRENDING_SNAPSHOT_MINUTES, TRENDING_RETENTION_DAYS
+
+    def run_trending_snapshot():
+        try:
+            count = record_snapshot()
+        except Exception as e:
+            logger.error(f"Trending snapshot failed: {e}")
+            return
+        logger.info(f"Recorded engagement snapshot for {count} tweets.")
+        purged = purge_old_metric_snapshots(TRENDING_RETENTION_DAYS)
+        if purged > 0:
+            logger.info(f"Purged {purged} old engagement snapshots.")
+
+    scheduler.add_job(
+        run_trending_snapshot,
+        trigger=IntervalTrigger(minutes=TRENDING_SNAPSHOT_MINUTES),
+        id='trending_snapshot',
+        name='Record top tweets engagement snapshot',
+        replace_existing=True
+    )
+
     return scheduler
@@ -2,7 +2,7 @@ from mcp.server.fastmcp import FastMCP
 from tools.scraper import scrape_website
 from tools.search import search_web as search_web_func
 from tools.twitter import post_tweet as post_tweet_func
-from database import init_db, add_scheduled_tweet, get_monthly_count
+from database import init_db, add_scheduled_tweet, get_monthly_count, get_accounts, get_account_by_name, DEFAULT_ACCOUNT_ID
 from scheduler_service import start_scheduler
 from datetime import datetime
 
@@ -45,28 +45,35 @@ def post_tweet(content: str) -> str:
         content: Le contenu du tweet (max 280 caractères).
         
     Returns:
-        L'ID du tweet publié ou un message d'erreur.
+        L'ID du tweet publié ou un message d'erreur (avec la date de reprise en cas de rate limit).
         
     Note:
         Nécessite la configuration des credentials Twitter dans le fichier .env
     """
-    return post_tweet_func(content)
+    result = post_tweet_func(content)
+    if result.status == 'rate_limited':
+        return f"Rate limited: retry after {result.retry_after:%Y-%m-%d %H:%M:%S}."
+    return str(result)
 
 @mcp.tool()
-def schedule_tweet(content: str, run_at: str) -> str:
+def schedule_tweet(content: str, run_at: str, account: str = "") -> str:
     """
     Programme un tweet pour une date et heure future.
     
     Args:
         content: Le contenu du tweet.
         run_at: La date et l'heure d'envoi au format ISO (ex: '2023-12-25T10:00:00').
+        account: Nom du compte de publication (défaut: compte principal).
         
     Returns:
         Confirmation de la programmation ou message d'erreur.
     """
     try:
         run_date = datetime.fromisoformat(run_at)
-        tweet_id = add_scheduled_tweet(content, run_date)
+        account_row = get_account_by_name(account) if account else None
+        if account and not account_row:
+            return f"Error: Unknown account '{account}'."
+        tweet_id = add_scheduled_tweet(content, run_date, account_id=account_row['id'] if account_row else DEFAULT_ACCOUNT_ID)
         return f"Tweet scheduled successfully! ID: {tweet_id}, Time: {run_date}"
     except ValueError:
         return "Error: Invalid date format. Please use ISO format (YYYY-MM-DDTHH:MM:SS)."
@@ -79,45 +86,54 @@ def get_tweet_stats() -> str:
     Retourne les statistiques d'utilisation du bot (quota mensuel).
     
     Returns:
-        Le nombre de tweets envoyés ce mois-ci et le quota restant.
-    """
-    count = get_monthly_count()
-    limit = 500
-    remaining = limit - count
-    return f"Monthly Usage: {count}/{limit} tweets.\nRemaining: {remaining} tweets."
+        Le nombre de tweets envoyés ce mois-ci et le quota restant, pour chaque compte.
+    """
+    lines = []
+    for account in get_accounts():
+        count = get_monthly_count(account['id'])
+        limit = account['monthly_limit']
+        lines.append(f"[{account['name']}] Monthly Usage: {count}/{limit} tweets. Remaining: {limit - count} tweets.")
+    return "\n".join(lines)
 
-from tools.content_generator import generate_tweet_content
+from tools.generation_service import get_generation_service
 
 @mcp.tool()
-def generate_tweet(topic: str, context: str = "", tone: str = "professional") -> str:
+async def generate_tweet(topic: str, context: str = "", tone: str = "professional", model: str = "") -> str:
     """
-    Génère un tweet engageant avec l'IA Gemini.
+    Génère un tweet engageant avec le fournisseur LLM configuré (Gemini par défaut).
     
     Args:
         topic: Le sujet du tweet.
         context: Contexte optionnel (ex: contenu d'un article).
         tone: Le ton souhaité (défaut: professional).
+        model: Modèle à utiliser (défaut: modèle du fournisseur).
         
     Returns:
         Le contenu du tweet généré.
     """
-    return generate_tweet_content(topic, source_content=context if context else None, tone=tone)
+    return await get_generation_service().generate(
+        topic, source_content=context if context else None, tone=tone, model=model or None
+    )
 
 from database import add_monitored_topic, get_active_topics, delete_monitored_topic
 
 @mcp.tool()
-def monitor_topic(query: str, interval_minutes: int = 60) -> str:
+def monitor_topic(query: str, interval_minutes: int = 60, account: str = "") -> str:
     """
     Ajoute un sujet à la veille automatique.
     
     Args:
         query: Le sujet ou mot-clé à surveiller.
         interval_minutes: L'intervalle de vérification en minutes (défaut: 60).
+        account: Nom du compte qui publiera les tweets générés (défaut: compte principal).
         
     Returns:
         Confirmation de l'ajout.
     """
-    topic_id = add_monitored_topic(query, interval_minutes)
+    account_row = get_account_by_name(account) if account else None
+    if account and not account_row:
+        return f"Error: Unknown account '{account}'."
+    topic_id = add_monitored_topic(query, interval_minutes, account_id=account_row['id'] if account_row else DEFAULT_ACCOUNT_ID)
     return f"Topic '{query}' added to monitoring (ID: {topic_id}, Interval: {interval_minutes}m)."
 
 @mcp.tool()
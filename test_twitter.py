@@ -25,8 +25,8 @@ def test_twitter_credentials():
     result = post_tweet(test_content)
     print(f"\nRésultat: {result}")
     
-    if "Error" in result:
-        if "credentials not found" in result:
+    if not result.ok:
+        if result.error_class == 'MissingCredentials':
             print("\n⚠️  INFO: Credentials Twitter non configurés dans .env")
         else:
             print("\n❌ ÉCHEC: Erreur lors de la publication")
@@ -12,3 +12,42 @@ def mock_env_vars(monkeypatch):
     monkeypatch.setenv("TWITTER_API_SECRET", "test_secret")
     monkeypatch.setenv("TWITTER_ACCESS_TOKEN", "test_token")
     monkeypatch.setenv("TWITTER_ACCESS_TOKEN_SECRET", "test_token_secret")
+
+@pytest.fixture
+def temp_db(monkeypatch, tmp_path):
+    """Fixture qui redirige la base SQLite vers un fichier temporaire initialisé."""
+    import database
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "test_tweets.db"))
+    monkeypatch.delenv("FIXED_TOPICS", raising=False)
+    database.init_db()
+    return database
+
+@pytest.fixture(autouse=True)
+def reset_llm_providers(monkeypatch):
+    """Les fournisseurs LLM (et le modèle Gemini) sont mis en cache par processus : on repart de zéro à chaque test."""
+    from tools.content_generator import rate_limiter
+    from tools.llm_providers import reset_providers
+    # Cache des générations désactivé par défaut (les tests du cache l'activent explicitement)
+    monkeypatch.setenv("GENERATION_CACHE_ENABLED", "0")
+    # Pas de limite de débit Gemini pendant les tests
+    monkeypatch.setattr(rate_limiter, "requests_per_minute", 0)
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+    reset_providers()
+    yield
+    reset_providers()
+
+@pytest.fixture(autouse=True)
+def reset_recent_tweets_index():
+    """L'index des tweets récents est partagé par le processus : vidé entre les tests."""
+    from tools.tweet_validator import reset_recent_index
+    reset_recent_index()
+    yield
+    reset_recent_index()
+
+@pytest.fixture(autouse=True)
+def reset_twitter_client_registry():
+    """Les clients Twitter sont partagés par le processus : chaque test repart d'un registre vide."""
+    from tools.twitter import reset_twitter_clients
+    reset_twitter_clients()
+    yield
+    reset_twitter_clients()
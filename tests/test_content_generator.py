@@ -6,7 +6,7 @@ def test_generate_tweet_success(mocker, monkeypatch):
     monkeypatch.setenv("GEMINI_API_KEY", "test_key")
     
     # Mock de GenerativeModel
-    mock_model = mocker.patch("tools.content_generator.genai.GenerativeModel")
+    mock_model = mocker.patch("tools.llm_providers.genai.GenerativeModel")
     mock_instance = mock_model.return_value
     
     # Mock de la réponse
@@ -38,7 +38,7 @@ def test_generate_tweet_api_error(mocker, monkeypatch):
     """Test erreur API."""
     monkeypatch.setenv("GEMINI_API_KEY", "test_key")
     
-    mock_model = mocker.patch("tools.content_generator.genai.GenerativeModel")
+    mock_model = mocker.patch("tools.llm_providers.genai.GenerativeModel")
     mock_instance = mock_model.return_value
     mock_instance.generate_content.side_effect = Exception("API Error")
     
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from tools import generation_cache
+from tools.content_generator import RateLimiter, generate_tweet_content
+from tools.generation_service import GenerationService
+
+@pytest.fixture
+def cache_db(temp_db, monkeypatch):
+    """Base temporaire avec le cache des générations activé."""
+    monkeypatch.setenv("GENERATION_CACHE_ENABLED", "1")
+    monkeypatch.setenv("GEMINI_API_KEY", "test_key")
+    return temp_db
+
+@pytest.fixture
+def mock_gemini(mocker):
+    mocker.patch("tools.llm_providers.genai.configure")
+    mock_model = mocker.patch("tools.llm_providers.genai.GenerativeModel")
+    mock_model.return_value.generate_content.return_value = mocker.Mock(text='"Tweet généré"')
+    return mock_model.return_value.generate_content
+
+def test_same_source_is_served_from_cache(cache_db, mock_gemini):
+    """Le même article (aux espaces près) ne déclenche qu'un seul appel Gemini."""
+    first = generate_tweet_content("AI", source_content="Un article   sur l'IA.")
+    second = generate_tweet_content("AI", source_content="Un article sur\nl'IA.")
+
+    assert first == second == "Tweet généré"
+    mock_gemini.assert_called_once()
+    assert cache_db.get_generation_cache_stats() == {'hit': 1, 'miss': 1, 'entries': 1}
+
+def test_tone_and_prompt_version_change_the_key(cache_db, monkeypatch):
+    """Un autre ton ou une nouvelle version du prompt invalide le cache."""
+    key = generation_cache.make_cache_key("AI", "Article", "professional", "gemini")
+    assert key != generation_cache.make_cache_key("AI", "Article", "humoristique", "gemini")
+
+    monkeypatch.setattr(generation_cache, "prompt_version", lambda: "autre-version")
+    assert key != generation_cache.make_cache_key("AI", "Article", "professional", "gemini")
+
+def test_errors_are_not_cached(cache_db, mock_gemini):
+    """Un échec de génération n'est jamais mis en cache."""
+    mock_gemini.side_effect = Exception("quota")
+    assert generate_tweet_content("AI", source_content="Article").startswith("Error")
+
+    mock_gemini.side_effect = None
+    assert generate_tweet_content("AI", source_content="Article") == "Tweet généré"
+    assert mock_gemini.call_count == 2
+
+def test_ttl_and_lru_eviction(cache_db):
+    """Les entrées expirées ne sont plus servies et le cache est borné (LRU)."""
+    cache_db.put_generation_cache_entry("a", "Tweet A", "gemini", "v1", max_entries=2)
+    cache_db.put_generation_cache_entry("b", "Tweet B", "gemini", "v1", max_entries=2)
+    # "a" est relu : "b" devient la moins récemment utilisée
+    assert cache_db.get_generation_cache_entry("a", ttl_hours=1) == "Tweet A"
+    cache_db.put_generation_cache_entry("c", "Tweet C", "gemini", "v1", max_entries=2)
+
+    assert cache_db.get_generation_cache_entry("b", ttl_hours=1) is None
+    assert cache_db.get_generation_cache_entry("c", ttl_hours=1) == "Tweet C"
+
+    conn = cache_db.get_db_connection()
+    conn.execute('UPDATE generation_cache SET created_at = ? WHERE key = ?', (datetime.now() - timedelta(hours=5), "a"))
+    conn.commit()
+    conn.close()
+
+    assert cache_db.get_generation_cache_entry("a", ttl_hours=1) is None
+    assert cache_db.purge_expired_generation_cache(ttl_hours=1) == 1
+
+def test_batch_only_sends_uncached_articles(cache_db, mock_gemini, mocker):
+    """En mode batch, les articles déjà générés sont servis par le cache."""
+    generate_tweet_content("Sujet 0", source_content="Article 0")
+    mock_gemini.reset_mock()
+    mock_gemini.return_value = mocker.Mock(text='[{"id": 1, "tweet": "Tweet 1"}, {"id": 2, "tweet": "Tweet 2"}]')
+
+    service = GenerationService(limiter=RateLimiter(0))
+    requests = [{'topic': f"Sujet {i}", 'source_content': f"Article {i}"} for i in range(3)]
+    results = asyncio.run(service.generate_batch(requests))
+
+    assert [r['mode'] for r in results] == ['cache', 'batch', 'batch']
+    assert [r['tweet'] for r in results] == ["Tweet généré", "Tweet 1", "Tweet 2"]
+    mock_gemini.assert_called_once()
+    assert cache_db.get_generation_cache_stats()['entries'] == 3
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+import pytest
+from tools.content_generator import RateLimiter, generate_tweet_content
+from tools.generation_service import GenerationService
+from tools.llm_providers import get_provider
+
+def test_model_is_configured_once(mocker, monkeypatch):
+    """genai.configure et GenerativeModel ne sont appelés qu'une fois pour plusieurs générations."""
+    monkeypatch.setenv("GEMINI_API_KEY", "test_key")
+    mock_configure = mocker.patch("tools.llm_providers.genai.configure")
+    mock_model = mocker.patch("tools.llm_providers.genai.GenerativeModel")
+    mock_model.return_value.generate_content.return_value = mocker.Mock(text="Tweet")
+    
+    generate_tweet_content("AI")
+    generate_tweet_content("Crypto")
+    
+    mock_configure.assert_called_once_with(api_key="test_key")
+    mock_model.assert_called_once()
+    
+    # Rotation de clé : reconfiguration
+    monkeypatch.setenv("GEMINI_API_KEY", "new_key")
+    get_provider("gemini").get_model()
+    assert mock_configure.call_count == 2
+
+def test_rate_limiter_spaces_requests_beyond_quota():
+    """Au-delà de N requêtes dans la fenêtre, le créneau suivant est repoussé."""
+    limiter = RateLimiter(2, period=10)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(10, abs=0.5)
+
+def test_generate_many_bounded_concurrency(mocker, monkeypatch):
+    """generate_many respecte la concurrence max et renvoie un résultat par requête."""
+    monkeypatch.setenv("GEMINI_API_KEY", "test_key")
+    mocker.patch("tools.llm_providers.genai.configure")
+    mock_model = mocker.patch("tools.llm_providers.genai.GenerativeModel")
+    
+    lock = threading.Lock()
+    state = {'running': 0, 'max': 0}
+    def fake_generate(prompt, request_options=None):
+        with lock:
+            state['running'] += 1
+            state['max'] = max(state['max'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+        return mocker.Mock(text=f'"Tweet {len(prompt)}"')
+    mock_model.return_value.generate_content.side_effect = fake_generate
+    
+    service = GenerationService(max_concurrency=2, limiter=RateLimiter(0))
+    requests = [{'topic': f"Sujet {i}"} for i in range(6)]
+    results = service.generate_many_sync(requests)
+    
+    assert len(results) == 6
+    assert all(r.startswith("Tweet") for r in results)
+    assert state['max'] == 2
+
+def test_generate_many_yields_as_completed(mocker, monkeypatch):
+    """Les résultats arrivent dans l'ordre de complétion, avec leur index."""
+    monkeypatch.setenv("GEMINI_API_KEY", "test_key")
+    service = GenerationService(max_concurrency=4, limiter=RateLimiter(0))
+    
+    async def fake_generate(topic, source_content=None, tone="professional", model=None):
+        await asyncio.sleep(0.1 if topic == "lent" else 0)
+        return {'tweet': f"Tweet {topic}"}
+    mocker.patch.object(service, "generate_with_stats", side_effect=fake_generate)
+    
+    async def collect():
+        return [item async for item in service.generate_many([{'topic': "lent"}, {'topic': "rapide"}])]
+    
+    assert asyncio.run(collect()) == [(1, "Tweet rapide"), (0, "Tweet lent")]
+
+def _fake_response(mocker, text, prompt_tokens=0, output_tokens=0):
+    response = mocker.Mock(text=text)
+    response.usage_metadata.prompt_token_count = prompt_tokens
+    response.usage_metadata.candidates_token_count = output_tokens
+    return response
+
+def test_generate_batch_single_call(mocker, monkeypatch):
+    """Le mode batch génère K tweets en un appel et répartit les coûts par tweet."""
+    monkeypatch.setenv("GEMINI_API_KEY", "test_key")
+    mocker.patch("tools.llm_providers.genai.configure")
+    mock_model = mocker.patch("tools.llm_providers.genai.GenerativeModel")
+    mock_model.return_value.generate_content.return_value = _fake_response(
+        mocker, '```json\n[{"id": 2, "tweet": "Tweet B"}, {"id": 1, "tweet": "Tweet A"}]\n```', 900, 100
+    )
+    
+    service = GenerationService(limiter=RateLimiter(0))
+    results = asyncio.run(service.generate_batch([{'topic': "A"}, {'topic': "B"}]))
+    
+    assert [r['tweet'] for r in results] == ["Tweet A", "Tweet B"]
+    assert all(r['mode'] == 'batch' for r in results)
+    assert results[0]['prompt_tokens'] == 450
+    assert mock_model.return_value.generate_content.call_count == 1
+    prompt = mock_model.return_value.generate_content.call_args.args[0]
+    assert prompt.count("RÈGLES D'OR") == 1
+
+def test_generate_batch_falls_back_on_malformed_output(mocker, monkeypatch):
+    """Les articles absents d'une réponse malformée sont régénérés par appels unitaires."""
+    monkeypatch.setenv("GEMINI_API_KEY", "test_key")
+    mocker.patch("tools.llm_providers.genai.configure")
+    mock_model = mocker.patch("tools.llm_providers.genai.GenerativeModel")
+    mock_model.return_value.generate_content.side_effect = [
+        _fake_response(mocker, '[{"id": 1, "tweet": "Tweet A"}, {"id": 2}]'),
+        _fake_response(mocker, 'Tweet B (unitaire)', 500, 40),
+    ]
+    
+    service = GenerationService(limiter=RateLimiter(0))
+    results = asyncio.run(service.generate_batch([{'topic': "A"}, {'topic': "B"}]))
+    
+    assert results[0] == {'tweet': "Tweet A", 'mode': 'batch', 'prompt_tokens': 0, 'output_tokens': 0, 'latency_ms': results[0]['latency_ms']}
+    assert results[1]['tweet'] == "Tweet B (unitaire)"
+    assert results[1]['mode'] == 'single'
+    assert results[1]['prompt_tokens'] == 500
+
+def test_stream_yields_chunks_as_they_arrive(mocker, monkeypatch):
+    """Le streaming relaie les fragments Gemini au fil de l'eau."""
+    monkeypatch.setenv("GEMINI_API_KEY", "test_key")
+    mocker.patch("tools.llm_providers.genai.configure")
+    mock_model = mocker.patch("tools.llm_providers.genai.GenerativeModel")
+    mock_model.return_value.generate_content.return_value = iter([
+        mocker.Mock(text="355 milliards"), mocker.Mock(text=" de paramètres"), mocker.Mock(text=" 🤯")
+    ])
+    
+    service = GenerationService(limiter=RateLimiter(0))
+    async def collect():
+        return [chunk async for chunk in service.stream("GLM-4.5")]
+    
+    assert asyncio.run(collect()) == ["355 milliards", " de paramètres", " 🤯"]
+    assert mock_model.return_value.generate_content.call_args.kwargs['stream'] is True
+
+def test_stream_with_stub_matches_full_generation():
+    """Concaténés, les fragments du stub donnent le même tweet que l'appel complet."""
+    from tools.llm_providers import StubProvider
+    stub = StubProvider(latency=0, chunk_delay=0)
+    service = GenerationService(provider=stub)
+    
+    async def run():
+        chunks = [chunk async for chunk in service.stream("AI")]
+        return chunks, await service.generate("AI")
+    
+    chunks, tweet = asyncio.run(run())
+    assert len(chunks) > 1
+    assert "".join(chunks) == tweet
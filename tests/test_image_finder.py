@@ -0,0 +1,40 @@
+from tools.image_finder import find_best_image, score_candidate
+
+def test_score_rejects_unusable_images():
+    """Les images non supportées ou trop lourdes/petites sont écartées."""
+    candidate = {'url': 'http://x/img', 'source': 'og'}
+    assert score_candidate(candidate, None) is None
+    assert score_candidate(candidate, {'content_type': 'image/svg+xml', 'content_length': 50000}) is None
+    assert score_candidate(candidate, {'content_type': 'image/jpeg', 'content_length': 20 * 1024 * 1024}) is None
+    assert score_candidate(candidate, {'content_type': 'image/jpeg', 'content_length': 500}) is None
+    assert score_candidate(candidate, {'content_type': 'image/jpeg', 'content_length': 50000}) is not None
+
+def test_find_best_image_prefers_valid_og_image(mocker):
+    """L'og:image valide l'emporte sur les images d'article."""
+    heads = {
+        'http://x/og.jpg': {'content_type': 'image/jpeg', 'content_length': 80000},
+        'http://x/body.png': {'content_type': 'image/png', 'content_length': 80000},
+    }
+    mocker.patch("tools.image_finder.head_check", side_effect=lambda url: heads.get(url))
+    mock_ddgs = mocker.patch("tools.image_finder.DDGS")
+    
+    best = find_best_image([
+        {'url': 'http://x/body.png', 'source': 'article', 'width': 800},
+        {'url': 'http://x/og.jpg', 'source': 'og'},
+    ], search_term="AI")
+    
+    assert best == 'http://x/og.jpg'
+    mock_ddgs.assert_not_called()
+
+def test_find_best_image_falls_back_to_search(mocker):
+    """Sans image de page exploitable, on utilise la recherche d'images."""
+    mocker.patch("tools.image_finder.head_check", side_effect=lambda url: (
+        {'content_type': 'image/jpeg', 'content_length': 90000} if 'search' in url else None
+    ))
+    mock_ddgs = mocker.patch("tools.image_finder.DDGS")
+    mock_ddgs.return_value.images.return_value = [{'image': 'http://search/img.jpg'}]
+    
+    best = find_best_image([{'url': 'http://x/broken.jpg', 'source': 'og'}], search_term="AI")
+    
+    assert best == 'http://search/img.jpg'
+    mock_ddgs.return_value.images.assert_called_once_with("AI", max_results=3)
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+def test_enqueue_and_claim_job(temp_db):
+    """Un job mis en file est réservé une seule fois, avec son payload."""
+    job_id = temp_db.enqueue_job('scrape', {'url': 'http://example.com'}, dedup_key='scrape:http://example.com')
+    assert job_id is not None
+    
+    job = temp_db.claim_job(['scrape'])
+    assert job['id'] == job_id
+    assert job['state'] == 'running'
+    assert job['attempts'] == 1
+    assert job['payload'] == {'url': 'http://example.com'}
+    
+    # Déjà réservé : plus rien à prendre
+    assert temp_db.claim_job(['scrape']) is None
+
+def test_enqueue_dedup(temp_db):
+    """Un second job avec la même dedup_key est ignoré."""
+    assert temp_db.enqueue_job('scrape', {}, dedup_key='k') is not None
+    assert temp_db.enqueue_job('scrape', {}, dedup_key='k') is None
+
+def test_claim_respects_available_at_and_type(temp_db):
+    """Les jobs futurs ou d'un autre type ne sont pas réservés."""
+    temp_db.enqueue_job('scrape', {}, available_at=datetime.now() + timedelta(hours=1))
+    temp_db.enqueue_job('generate', {})
+    
+    assert temp_db.claim_job(['scrape']) is None
+    assert temp_db.claim_job(['generate'])['type'] == 'generate'
+
+def test_ack_job_enqueues_next_step(temp_db):
+    """L'acquittement enchaîne l'étape suivante dans la même transaction."""
+    temp_db.enqueue_job('scrape', {'url': 'u'})
+    job = temp_db.claim_job()
+    
+    temp_db.ack_job(job['id'], next_job={'type': 'generate', 'payload': {'content': 'x'}, 'dedup_key': 'generate:u'})
+    
+    assert temp_db.get_job_counts() == {'done': 1, 'queued': 1}
+    next_job = temp_db.claim_job(['generate'])
+    assert next_job['payload'] == {'content': 'x'}
+
+def test_fail_job_retries_then_fails(temp_db):
+    """Un job en échec est remis en file avec backoff puis abandonné après max_attempts."""
+    temp_db.enqueue_job('scrape', {}, max_attempts=2)
+    
+    job = temp_db.claim_job()
+    assert temp_db.fail_job(job['id'], 'boom', retry_delay_seconds=0) == 'queued'
+    
+    job = temp_db.claim_job()
+    assert job['attempts'] == 2
+    assert temp_db.fail_job(job['id'], 'boom again', retry_delay_seconds=0) == 'failed'
+    assert temp_db.claim_job() is None
+
+def test_failed_job_frees_dedup_key_and_old_jobs_are_purged(temp_db):
+    """Un job abandonné libère sa dedup_key ; les jobs terminés ou abandonnés anciens sont purgés."""
+    temp_db.enqueue_job('scrape', {}, dedup_key='scrape:u', max_attempts=1)
+    job = temp_db.claim_job()
+    assert temp_db.fail_job(job['id'], 'boom') == 'failed'
+    assert temp_db.enqueue_job('scrape', {}, dedup_key='scrape:u') is not None
+    temp_db.ack_job(temp_db.claim_job()['id'])
+    temp_db.enqueue_job('scrape', {})
+    
+    assert temp_db.purge_finished_jobs(1) == 0
+    conn = temp_db.get_db_connection()
+    conn.execute("UPDATE jobs SET updated_at = ?", (datetime.now() - timedelta(days=2),))
+    conn.commit()
+    conn.close()
+    assert temp_db.purge_finished_jobs(1) == 2
+    assert temp_db.get_job_counts() == {'queued': 1}
+
+def test_requeue_stale_jobs(temp_db):
+    """Les jobs 'running' abandonnés par un worker arrêté sont remis en file."""
+    temp_db.enqueue_job('generate', {})
+    temp_db.claim_job()
+    
+    assert temp_db.requeue_stale_jobs(lease_seconds=3600) == 0
+    assert temp_db.requeue_stale_jobs(lease_seconds=-1) == 1
+    assert temp_db.claim_job()['attempts'] == 2
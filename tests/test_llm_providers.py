@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from tools.content_generator import generate_tweet_content
+from tools.generation_service import GenerationService
+from tools.llm_providers import StubProvider, get_provider
+
+def test_stub_is_deterministic():
+    """Même prompt et même modèle : même réponse ; un autre modèle change la réponse."""
+    stub = StubProvider(latency=0)
+    first = stub.generate("prompt", model="rapide")
+    assert first.text == stub.generate("prompt", model="rapide").text
+    assert first.text != stub.generate("prompt", model="précis").text
+    assert first.prompt_tokens > 0
+
+def test_stub_failure_rate_is_seeded():
+    """Les échecs simulés sont reproductibles pour une graine donnée."""
+    def outcomes(seed):
+        stub = StubProvider(latency=0, failure_rate=0.5, seed=seed)
+        results = []
+        for _ in range(20):
+            try:
+                stub.generate("prompt")
+                results.append(True)
+            except RuntimeError:
+                results.append(False)
+        return results
+
+    assert outcomes(1) == outcomes(1)
+    assert False in outcomes(1) and True in outcomes(1)
+
+def test_provider_selected_from_env(monkeypatch):
+    """LLM_PROVIDER=stub fait tourner la génération sans clé Gemini."""
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    monkeypatch.setenv("LLM_PROVIDER", "stub")
+    monkeypatch.setattr(get_provider("stub"), "latency", 0)
+
+    assert generate_tweet_content("AI").startswith("Tweet de test")
+
+def test_unknown_provider():
+    with pytest.raises(ValueError):
+        get_provider("inconnu")
+
+def test_service_batch_and_per_call_model_with_stub():
+    """Le service fonctionne de bout en bout avec le stub, y compris le mode batch par modèle."""
+    stub = StubProvider(latency=0)
+    service = GenerationService(provider=stub)
+    requests = [
+        {'topic': "A", 'model': "rapide"},
+        {'topic': "B", 'model': "rapide"},
+        {'topic': "C", 'model': "précis"},
+    ]
+    results = asyncio.run(service.generate_batch(requests))
+
+    assert [r['mode'] for r in results] == ['batch', 'batch', 'single']
+    assert all(r['tweet'].startswith("Tweet de test") for r in results)
@@ -0,0 +1,63 @@
+import io
+import pytest
+from PIL import Image
+from tools import media
+from tools.twitter import upload_media
+
+def _image_bytes(fmt, size=(40, 30), mode='RGB'):
+    output = io.BytesIO()
+    Image.new(mode, size, 'red').save(output, format=fmt)
+    return output.getvalue()
+
+def _mock_download(mocker, data, headers=None):
+    response = mocker.MagicMock()
+    response.__enter__.return_value = response
+    response.headers = headers or {}
+    response.iter_content.return_value = [data[i:i + 1024] for i in range(0, len(data), 1024)]
+    return mocker.patch("tools.media.requests.get", return_value=response)
+
+def test_sniff_format_uses_content_not_extension():
+    assert media.sniff_format(_image_bytes('JPEG')) == 'jpeg'
+    assert media.sniff_format(_image_bytes('PNG')) == 'png'
+    assert media.sniff_format(_image_bytes('WEBP')) == 'webp'
+    assert media.sniff_format(b"<html>") is None
+
+def test_prepare_image_keeps_compliant_jpeg_and_converts_webp():
+    jpeg = _image_bytes('JPEG')
+    assert media.prepare_image(jpeg) == (jpeg, 'jpeg')
+
+    payload, fmt = media.prepare_image(_image_bytes('WEBP'))
+    assert fmt == 'jpeg'
+    assert media.sniff_format(payload) == 'jpeg'
+
+def test_prepare_image_downscales_oversized_image(monkeypatch):
+    monkeypatch.setattr(media, "MEDIA_MAX_DIMENSION", 100)
+    payload, fmt = media.prepare_image(_image_bytes('PNG', size=(400, 200), mode='RGBA'))
+    assert fmt == 'png'
+    assert Image.open(io.BytesIO(payload)).size == (100, 50)
+
+def test_download_stops_at_size_cap(mocker):
+    _mock_download(mocker, b"x" * 5000)
+    with pytest.raises(ValueError):
+        media.download_image("http://img", max_bytes=2048)
+
+    _mock_download(mocker, b"x", headers={'Content-Length': "999999"})
+    with pytest.raises(ValueError):
+        media.download_image("http://img", max_bytes=2048)
+
+def test_upload_media_reuses_cached_media_id(mocker, mock_env_vars, temp_db):
+    """Un second envoi de la même image ne refait ni le téléchargement ni l'upload."""
+    mock_get = _mock_download(mocker, _image_bytes('WEBP'))
+    mock_api = mocker.patch("tools.twitter.tweepy.API").return_value
+    mock_api.media_upload.return_value = mocker.Mock(media_id=42, expires_after_secs=86400)
+
+    assert upload_media("http://img/a.webp") == ["42"]
+    assert mock_api.media_upload.call_args.kwargs['filename'] == "image.jpeg"
+    assert upload_media("http://img/a.webp") == ["42"]
+
+    assert mock_get.call_count == 1
+    assert mock_api.media_upload.call_count == 1
+
+    # Même contenu sous une autre URL : téléchargé (pour le hash) mais pas ré-uploadé
+    assert upload_media("http://cdn/b.webp") == ["42"]
+    assert mock_api.media_upload.call_count == 1
@@ -1,8 +1,10 @@
 import pytest
-from monitoring_service import run_monitoring_cycle
+from datetime import datetime, timedelta
+from monitoring_service import run_monitoring_cycle, run_pending_jobs
+from tools.twitter import SearchResult
 
-def test_monitoring_cycle_full_flow(mocker):
-    """Test du cycle complet de veille."""
+def test_monitoring_cycle_full_flow(mocker, temp_db):
+    """Test du cycle complet de veille (découverte -> job scrape -> job génération)."""
     # Mocks DB
     mock_get_topics = mocker.patch("monitoring_service.get_active_topics")
     mock_is_processed = mocker.patch("monitoring_service.is_url_processed")
@@ -14,6 +16,7 @@ def test_monitoring_cycle_full_flow(mocker):
     mock_ddgs = mocker.patch("monitoring_service.DDGS")
     mock_generate = mocker.patch("monitoring_service.generate_tweet_content")
     mock_asyncio_run = mocker.patch("monitoring_service.asyncio.run")
+    mock_find_image = mocker.patch("monitoring_service.find_best_image", return_value='http://example.com/img.jpg')
     
     # Configuration
     mock_get_topics.return_value = [
@@ -27,7 +30,7 @@ def test_monitoring_cycle_full_flow(mocker):
     ]
     
     mock_is_processed.return_value = False # URL non traitée
-    mock_asyncio_run.return_value = "Contenu de l'article" # Résultat du scrape
+    mock_asyncio_run.return_value = {'content': "Contenu de l'article " * 20, 'image_url': 'http://example.com/img.jpg'} # Résultat du scrape
     mock_generate.return_value = "Tweet généré sur l'IA"
     
     # Exécution
@@ -38,24 +41,419 @@ def test_monitoring_cycle_full_flow(mocker):
     mock_asyncio_run.assert_called() # Vérifie que scrape a été appelé via asyncio.run
     mock_generate.assert_called()
     mock_add_tweet.assert_called()
+    assert mock_add_tweet.call_args.kwargs['image_url'] == 'http://example.com/img.jpg'
+    mock_find_image.assert_called_once()
     mock_mark_processed.assert_called_with('http://example.com/article', 1)
     mock_update_last_run.assert_called_with(1)
+    assert temp_db.get_job_counts() == {'done': 2}
 
-def test_monitoring_skips_processed_urls(mocker):
+def test_monitoring_skips_processed_urls(mocker, temp_db):
     """Test que les URLs déjà traitées sont ignorées."""
     mock_get_topics = mocker.patch("monitoring_service.get_active_topics")
-    mock_is_processed = mocker.patch("monitoring_service.is_url_processed")
+    mock_processed = mocker.patch("monitoring_service.get_processed_urls")
     mock_ddgs = mocker.patch("monitoring_service.DDGS")
     mock_update_last_run = mocker.patch("monitoring_service.update_topic_last_run")
     mock_scrape = mocker.patch("monitoring_service.scrape_website")
     
     mock_get_topics.return_value = [{'id': 1, 'query': 'AI', 'interval_minutes': 60, 'last_run': None}]
     mock_ddgs.return_value.text.return_value = [{'href': 'http://old.com', 'title': 'Old News'}]
-    mock_is_processed.return_value = True # Déjà traité
+    mock_processed.return_value = {'http://old.com'} # Déjà traité
     
     run_monitoring_cycle()
     
-    # Vérifier qu'on n'a PAS scrapé ni généré
+    # Vérifier qu'on n'a PAS mis en file, scrapé ni généré
+    mock_processed.assert_called_once_with(['http://old.com'])
+    assert temp_db.get_job_counts() == {}
     mock_scrape.assert_not_called()
     # Mais on a quand même mis à jour le last_run car pas de nouvelles URLs
     mock_update_last_run.assert_called_with(1)
+
+def test_generation_failure_keeps_scrape_result(mocker, temp_db):
+    """Un échec de génération remet le job en file sans refaire le scrape."""
+    mocker.patch("monitoring_service.get_active_topics", return_value=[
+        {'id': 1, 'query': 'AI', 'interval_minutes': 60, 'last_run': None}
+    ])
+    mocker.patch("monitoring_service.is_url_processed", return_value=False)
+    mocker.patch("monitoring_service.mark_url_processed")
+    mocker.patch("monitoring_service.update_topic_last_run")
+    mocker.patch("monitoring_service.DDGS").return_value.text.return_value = [
+        {'href': 'http://example.com/a', 'title': 'A'}
+    ]
+    mock_asyncio_run = mocker.patch("monitoring_service.asyncio.run")
+    mock_asyncio_run.return_value = {'content': "x" * 500, 'image_url': 'http://img'}
+    mocker.patch("monitoring_service.generate_tweet_content", return_value="Error generating content: quota")
+    mocker.patch("monitoring_service.find_best_image", return_value=None)
+    
+    run_monitoring_cycle()
+    
+    assert mock_asyncio_run.call_count == 1
+    assert temp_db.get_job_counts() == {'done': 1, 'queued': 1}
+    
+    conn = temp_db.get_db_connection()
+    row = conn.execute("SELECT payload, last_error FROM jobs WHERE type = 'generate'").fetchone()
+    conn.close()
+    assert "x" * 500 in row['payload']
+    assert "quota" in row['last_error']
+
+def test_scrape_timeout_after_deadline_is_carried_over(mocker, temp_db):
+    """Un scrape interrompu par l'échéance du cycle est reporté sans consommer de tentative."""
+    from monitoring_service import run_pending_jobs, StageTimeout
+    
+    temp_db.enqueue_job('scrape', {'topic_id': 1, 'topic_query': 'AI', 'item': {'url': 'http://slow.com', 'title': 'Slow'}, 'slot': 0})
+    mocker.patch("monitoring_service.is_url_processed", return_value=False)
+    def timed_out(stage, coro, deadline=None):
+        coro.close() # Coroutine jamais exécutée : fermée comme le ferait l'annulation
+        raise StageTimeout('scrape', 0, deadline_reached=True)
+    mocker.patch("monitoring_service.run_async_with_timeout", side_effect=timed_out)
+    
+    run_pending_jobs()
+    
+    conn = temp_db.get_db_connection()
+    row = conn.execute("SELECT state, attempts FROM jobs").fetchone()
+    conn.close()
+    assert row['state'] == 'queued'
+    assert row['attempts'] == 0
+
+def test_call_with_timeout_raises_stage_timeout(monkeypatch):
+    """Un appel bloquant trop long lève StageTimeout sans bloquer l'appelant."""
+    import time
+    import monitoring_service
+    
+    monkeypatch.setitem(monitoring_service.STAGE_TIMEOUTS, 'image', 0.1)
+    with pytest.raises(monitoring_service.StageTimeout):
+        monitoring_service.call_with_timeout('image', time.sleep, 2)
+    
+    # Des appels abandonnés (toujours bloqués) ne retardent pas les suivants
+    for _ in range(5):
+        with pytest.raises(monitoring_service.StageTimeout):
+            monitoring_service.call_with_timeout('image', time.sleep, 2)
+    assert monitoring_service.call_with_timeout('image', lambda: "ok") == "ok"
+
+def test_slow_image_is_attached_later(mocker, temp_db):
+    """Une image pas prête après la génération est rattachée au tweet par un job séparé."""
+    import threading
+    from monitoring_service import run_pending_jobs
+    
+    release = threading.Event()
+    find_calls = 0
+    def slow_find(candidates, search_term=None):
+        nonlocal find_calls
+        find_calls += 1
+        release.wait(5)
+        return 'http://example.com/late.jpg'
+    
+    mocker.patch("monitoring_service.IMAGE_WAIT_SECONDS", 0.05)
+    mocker.patch("monitoring_service.find_best_image", side_effect=slow_find)
+    mocker.patch("monitoring_service.generate_tweet_content", return_value="Un tweet")
+    
+    temp_db.enqueue_job('generate', {
+        'topic_id': 1, 'topic_query': 'AI', 'slot': 0,
+        'item': {'url': 'http://example.com/a', 'title': 'A'},
+        'source_content': 'x' * 300, 'image_candidates': []
+    })
+    
+    run_pending_jobs(max_jobs=1)
+    tweet = temp_db.get_tweets_awaiting_approval()[0]
+    assert not tweet['image_url']
+    
+    release.set()
+    run_pending_jobs()
+    tweet = temp_db.get_tweets_awaiting_approval()[0]
+    assert tweet['image_url'] == 'http://example.com/late.jpg'
+    # Le job de rattachement reprend la recherche lancée pendant la génération (pas de seconde recherche)
+    assert find_calls == 1
+
+def test_image_discoveries_are_dropped_when_abandoned(mocker, monkeypatch):
+    """Une recherche d'image n'est plus gardée si son job de rattachement échoue pour de bon, ou au-delà du TTL."""
+    from concurrent.futures import Future
+    import monitoring_service
+
+    monitoring_service._register_image_discovery(1, Future())
+    mocker.patch("monitoring_service.fail_job", return_value='queued')
+    job = {'id': 7, 'type': 'attach_image', 'attempts': 1, 'payload': {'tweet_id': 1}}
+    monitoring_service._handle_job_error(job, RuntimeError("boom"))
+    assert 1 in monitoring_service._image_discoveries # Nouvel essai prévu : recherche gardée
+
+    mocker.patch("monitoring_service.fail_job", return_value='failed')
+    monitoring_service._handle_job_error(job, RuntimeError("boom"))
+    assert 1 not in monitoring_service._image_discoveries
+
+    monkeypatch.setattr(monitoring_service, "IMAGE_DISCOVERY_TTL_SECONDS", -1) # Tout est expiré
+    monitoring_service._register_image_discovery(2, Future())
+    monitoring_service._register_image_discovery(3, Future()) # Purge les entrées expirées
+    assert 2 not in monitoring_service._image_discoveries
+    assert monitoring_service._take_image_discovery(3) is None
+    assert monitoring_service._image_discoveries == {}
+
+def test_generate_jobs_run_concurrently(mocker, temp_db):
+    """Plusieurs jobs de génération disponibles passent ensemble par le service de génération."""
+    from monitoring_service import run_pending_jobs
+    
+    for i in range(3):
+        temp_db.enqueue_job('generate', {
+            'topic_id': 1, 'topic_query': 'AI', 'slot': i,
+            'item': {'url': f'http://example.com/{i}', 'title': f'A{i}', 'is_tweet': True},
+            'source_content': 'Un tweet source'
+        })
+    
+    async def fake_generate_many(requests):
+        for index in reversed(range(len(requests))):
+            yield index, {'tweet': f"Tweet {index}", 'mode': 'single', 'prompt_tokens': 100, 'output_tokens': 20, 'latency_ms': 50}
+    service = mocker.Mock()
+    service.generate_many_with_stats = fake_generate_many
+    mocker.patch("monitoring_service.get_generation_service", return_value=service)
+    mock_single = mocker.patch("monitoring_service.generate_tweet_content")
+    
+    assert run_pending_jobs() == 3
+    
+    mock_single.assert_not_called()
+    contents = sorted(t['content'] for t in temp_db.get_tweets_awaiting_approval())
+    assert contents == ["Tweet 0", "Tweet 1", "Tweet 2"]
+    assert temp_db.get_job_counts() == {'done': 3}
+    assert temp_db.get_generation_metrics_summary()[0]['tweets'] == 3
+
+def test_batch_mode_claims_a_full_batch(mocker, temp_db):
+    """En mode batch, les jobs sont réservés par lots de GENERATION_BATCH_SIZE (et non de la concurrence max)."""
+    mocker.patch("monitoring_service.GENERATION_MODE", 'batch')
+    mocker.patch("monitoring_service.GENERATION_BATCH_SIZE", 5)
+    mocker.patch("monitoring_service.GEMINI_MAX_CONCURRENCY", 2)
+    for i in range(6):
+        temp_db.enqueue_job('generate', {
+            'topic_id': 1, 'topic_query': 'AI', 'slot': i,
+            'item': {'url': f'http://example.com/{i}', 'title': f'A{i}', 'is_tweet': True},
+            'source_content': 'Un tweet source'
+        })
+    batches = []
+    async def fake_generate_batch(requests):
+        batches.append(len(requests))
+        return [{'tweet': f"Tweet {i}", 'mode': 'batch', 'prompt_tokens': 0, 'output_tokens': 0, 'latency_ms': 0}
+                for i in range(len(requests))]
+    service = mocker.Mock()
+    service.generate_batch = fake_generate_batch
+    mocker.patch("monitoring_service.get_generation_service", return_value=service)
+    mocker.patch("monitoring_service.generate_tweet_content", return_value="Tweet seul")
+    
+    assert run_pending_jobs() == 6
+    assert batches == [5]
+
+def test_concurrent_generation_stops_at_deadline(mocker, temp_db):
+    """Un appel LLM bloqué n'allonge pas le cycle : les jobs sont reportés à l'échéance."""
+    import asyncio
+    import time
+    from monitoring_service import process_generate_jobs_concurrently
+    
+    for i in range(2):
+        temp_db.enqueue_job('generate', {
+            'topic_id': 1, 'topic_query': 'AI', 'slot': i,
+            'item': {'url': f'http://example.com/{i}', 'title': f'A{i}', 'is_tweet': True},
+            'source_content': 'Un tweet source'
+        })
+    jobs = [temp_db.claim_job(['generate']) for _ in range(2)]
+    
+    async def stuck_generate_many(requests):
+        # Client synchrone bloqué dans un thread (comme un appel Gemini qui ne répond pas)
+        await asyncio.to_thread(time.sleep, 3)
+        yield 0, {'tweet': "Trop tard", 'mode': 'single', 'prompt_tokens': 0, 'output_tokens': 0, 'latency_ms': 0}
+    service = mocker.Mock()
+    service.generate_many_with_stats = stuck_generate_many
+    mocker.patch("monitoring_service.get_generation_service", return_value=service)
+    
+    started = time.perf_counter()
+    process_generate_jobs_concurrently(jobs, deadline=time.monotonic() + 0.3)
+    
+    assert time.perf_counter() - started < 1
+    conn = temp_db.get_db_connection()
+    rows = conn.execute("SELECT state, attempts FROM jobs").fetchall()
+    conn.close()
+    assert [(row['state'], row['attempts']) for row in rows] == [('queued', 0), ('queued', 0)]
+    assert temp_db.get_tweets_awaiting_approval() == []
+
+def test_finalization_in_progress_is_not_released_at_deadline(mocker, temp_db):
+    """Un job dont la finalisation a commencé la termine ; seuls les jobs jamais finalisés sont reportés."""
+    import asyncio
+    import time
+    import monitoring_service
+
+    for i in range(2):
+        temp_db.enqueue_job('generate', {
+            'topic_id': 1, 'topic_query': 'AI', 'slot': i,
+            'item': {'url': f'http://example.com/{i}', 'title': f'A{i}', 'is_tweet': True},
+            'source_content': 'Un tweet source'
+        })
+    jobs = [temp_db.claim_job(['generate']) for _ in range(2)]
+
+    async def generate_many(requests):
+        yield 0, {'tweet': "Tweet prêt", 'mode': 'single', 'prompt_tokens': 0, 'output_tokens': 0, 'latency_ms': 0}
+        await asyncio.to_thread(time.sleep, 3)
+        yield 1, {'tweet': "Trop tard", 'mode': 'single', 'prompt_tokens': 0, 'output_tokens': 0, 'latency_ms': 0}
+    service = mocker.Mock()
+    service.generate_many_with_stats = generate_many
+    mocker.patch("monitoring_service.get_generation_service", return_value=service)
+    finished = []
+    def slow_finalize(context, tweet_content, deadline=None):
+        time.sleep(0.5) # Toujours en cours quand l'échéance tombe
+        finished.append(context['job']['id'])
+    mocker.patch("monitoring_service._finalize_generation", side_effect=slow_finalize)
+    mock_release = mocker.spy(monitoring_service, "release_job")
+
+    monitoring_service.process_generate_jobs_concurrently(jobs, deadline=time.monotonic() + 0.2)
+    time.sleep(0.6)
+
+    assert finished == [jobs[0]['id']]
+    assert [c.args[0] for c in mock_release.call_args_list] == [jobs[1]['id']]
+    conn = temp_db.get_db_connection()
+    rows = conn.execute("SELECT id, state FROM jobs ORDER BY id").fetchall()
+    conn.close()
+    assert [row['state'] for row in rows] == ['done', 'queued']
+
+def test_failing_draft_is_regenerated_with_feedback(mocker, temp_db):
+    """Seul un brouillon invalide est régénéré, avec les problèmes en consigne et un nombre d'essais borné."""
+    from monitoring_service import run_pending_jobs
+    
+    mocker.patch("monitoring_service.find_best_image", return_value=None)
+    mock_generate = mocker.patch("monitoring_service.generate_tweet_content", side_effect=[
+        "Mistral AI lève des fonds.",        # chiffre clé manquant
+        "Mistral AI lève 600 M€ !",
+    ])
+    
+    temp_db.enqueue_job('generate', {
+        'topic_id': 1, 'topic_query': 'AI', 'slot': 0,
+        'item': {'url': 'http://example.com/a', 'title': 'Mistral AI lève 600 M€'},
+        'source_content': 'x' * 300, 'image_candidates': []
+    })
+    run_pending_jobs()
+    
+    assert mock_generate.call_count == 2
+    assert "600" in mock_generate.call_args.kwargs['feedback']
+    tweet = temp_db.get_tweets_awaiting_approval()[0]
+    assert tweet['content'] == "Mistral AI lève 600 M€ !"
+    assert tweet['error_message'] is None
+
+def test_regeneration_respects_cycle_deadline(mocker, temp_db):
+    """Une régénération ne dépasse pas l'échéance du cycle : le dernier brouillon est planifié, avec sa note."""
+    import time
+    from monitoring_service import process_generate_job
+    
+    def generate(*args, feedback=None, **kwargs):
+        if feedback:
+            time.sleep(3)
+        return "Mistral AI lève des fonds."
+    mocker.patch("monitoring_service.find_best_image", return_value=None)
+    mocker.patch("monitoring_service.generate_tweet_content", side_effect=generate)
+    temp_db.enqueue_job('generate', {
+        'topic_id': 1, 'topic_query': 'AI', 'slot': 0,
+        'item': {'url': 'http://example.com/a', 'title': 'Mistral AI lève 600 M€'},
+        'source_content': 'x' * 300, 'image_candidates': []
+    })
+    
+    started = time.perf_counter()
+    process_generate_job(temp_db.claim_job(['generate']), deadline=time.monotonic() + 0.5)
+    
+    assert time.perf_counter() - started < 1.5
+    tweet = temp_db.get_tweets_awaiting_approval()[0]
+    assert tweet['content'] == "Mistral AI lève des fonds."
+    assert tweet['error_message'].startswith("Validation")
+
+def test_duplicate_draft_is_skipped(mocker, temp_db):
+    """Un brouillon qui reste un doublon d'un tweet récent n'est pas planifié."""
+    from monitoring_service import run_pending_jobs
+    
+    temp_db.add_scheduled_tweet("Nvidia présente Blackwell et ses 208 milliards de transistors.", datetime.now())
+    mocker.patch("monitoring_service.MAX_REGENERATIONS", 1)
+    mocker.patch("monitoring_service.find_best_image", return_value=None)
+    mock_generate = mocker.patch(
+        "monitoring_service.generate_tweet_content",
+        return_value="Nvidia présente Blackwell et ses 208 milliards de transistors !"
+    )
+    
+    temp_db.enqueue_job('generate', {
+        'topic_id': 1, 'topic_query': 'AI', 'slot': 0,
+        'item': {'url': 'http://example.com/b', 'title': 'Nvidia Blackwell'},
+        'source_content': 'x' * 300, 'image_candidates': []
+    })
+    run_pending_jobs()
+    
+    assert mock_generate.call_count == 2
+    assert len(temp_db.get_tweets_awaiting_approval()) == 1
+    assert temp_db.is_url_processed('http://example.com/b')
+
+def test_approved_tweet_media_is_pre_uploaded(mocker, temp_db):
+    """L'approbation met en file le pré-upload ; le media_id est stocké et l'envoi n'uploade plus rien."""
+    from scheduler_service import check_and_send_tweets
+    from tools.twitter import PostResult
+    expires_at = datetime.now() + timedelta(hours=20)
+    mock_prepare = mocker.patch("monitoring_service.prepare_media", return_value={'media_id': "99", 'expires_at': expires_at})
+    tweet_id = temp_db.add_scheduled_tweet("Tweet", datetime.now() - timedelta(minutes=1), image_url="http://img/a.png")
+    temp_db.approve_tweet(tweet_id)
+    
+    assert run_pending_jobs() == 1
+    assert mock_prepare.call_args.args[0] == "http://img/a.png"
+    assert mock_prepare.call_args.args[1]["name"] == "default"
+    assert temp_db.get_tweet(tweet_id)['media_id'] == "99"
+    
+    mocker.patch("scheduler_service.rate_limits.next_allowed_at", return_value=None)
+    mock_post = mocker.patch("scheduler_service.post_tweet", return_value=PostResult('sent', tweet_id="1"))
+    check_and_send_tweets()
+    assert mock_post.call_args.args == ("Tweet",)
+    assert mock_post.call_args.kwargs['media_ids'] == ["99"]
+
+def test_media_prefetch_is_deferred_for_distant_send(mocker, temp_db):
+    """Un envoi lointain : le pré-upload est reporté pour que le media_id n'expire pas avant."""
+    mock_prepare = mocker.patch("monitoring_service.prepare_media")
+    tweet_id = temp_db.add_scheduled_tweet("Tweet", datetime.now() + timedelta(days=2), image_url="http://img/a.png")
+    temp_db.approve_tweet(tweet_id)
+    
+    run_pending_jobs()
+    
+    mock_prepare.assert_not_called()
+    assert temp_db.get_job_counts() == {'done': 1, 'queued': 1}
+
+def test_twitter_topic_polls_only_new_tweets(mocker, temp_db):
+    """Le curseur since_id du sujet avance sur les tweets examinés ; ceux au-delà de la limite restent à traiter."""
+    import monitoring_service
+    topic_id = temp_db.add_monitored_topic("IA", source_type='twitter')
+    mock_search = mocker.patch("monitoring_service.search_tweets", return_value=SearchResult([
+        {'id': str(tweet_id), 'text': f"Tweet {tweet_id}", 'username': "dev"} for tweet_id in range(105, 100, -1)
+    ]))
+    
+    monitoring_service.process_topic(temp_db.get_active_topics()[0])
+    
+    assert mock_search.call_args.kwargs['since_id'] is None
+    topic = temp_db.get_active_topics()[0]
+    # 3 tweets mis en file (les plus anciens d'abord) : le curseur s'arrête au troisième
+    assert topic['since_id'] == "103"
+    assert temp_db.get_job_counts() == {'queued': monitoring_service.MAX_ITEMS_PER_CYCLE}
+    
+    conn = temp_db.get_db_connection()
+    urls = [row['dedup_key'] for row in conn.execute("SELECT dedup_key FROM jobs ORDER BY id")]
+    conn.close()
+    assert urls[0] == "generate:https://twitter.com/dev/status/101"
+    
+    topic['last_run'] = None
+    monitoring_service.process_topic(topic)
+    assert mock_search.call_args.kwargs['since_id'] == "103"
+    
+    # Le curseur ne recule jamais
+    temp_db.update_topic_since_id(topic_id, "99")
+    assert temp_db.get_active_topics()[0]['since_id'] == "105"
+
+def test_truncated_search_still_advances_since_id(mocker, temp_db):
+    """Recherche tronquée à chaque relevé (sujet très actif) : le curseur avance quand même d'un relevé à l'autre."""
+    import monitoring_service
+    temp_db.add_monitored_topic("IA", source_type='twitter')
+    polls = iter([range(130, 100, -1), range(160, 130, -1), range(190, 160, -1)])
+    def fake_search(query, since_id=None, account=None):
+        return SearchResult([
+            {'id': str(tweet_id), 'text': f"Tweet {tweet_id}", 'username': "dev"} for tweet_id in next(polls)
+        ], truncated=True)
+    mock_search = mocker.patch("monitoring_service.search_tweets", side_effect=fake_search)
+    
+    cursors = []
+    for _ in range(3):
+        topic = temp_db.get_active_topics()[0]
+        topic['last_run'] = None
+        monitoring_service.process_topic(topic)
+        cursors.append(temp_db.get_active_topics()[0]['since_id'])
+    
+    assert [c.kwargs['since_id'] for c in mock_search.call_args_list] == [None, "103", "133"]
+    assert cursors == ["103", "133", "163"]
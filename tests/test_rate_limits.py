@@ -0,0 +1,96 @@
+import time
+from datetime import datetime, timedelta
+import tweepy
+from tools import rate_limits
+from tools.twitter import post_tweet
+
+def _too_many_requests(mocker, headers):
+    response = mocker.Mock(status_code=429, reason="Too Many Requests", headers=headers)
+    response.json.return_value = {}
+    return tweepy.errors.TooManyRequests(response)
+
+def test_parse_rate_limit_headers():
+    reset = int(time.time()) + 600
+    info = rate_limits.parse_rate_limit_headers({
+        'x-rate-limit-limit': "50", 'x-rate-limit-remaining': "3", 'x-rate-limit-reset': str(reset)
+    })
+    assert info == {'limit': 50, 'remaining': 3, 'reset_at': datetime.fromtimestamp(reset)}
+    assert rate_limits.parse_rate_limit_headers({}) is None
+
+def test_exhausted_window_blocks_until_reset(temp_db):
+    """Quota restant à 0 : l'endpoint est indisponible jusqu'à la réinitialisation de la fenêtre."""
+    reset_at = datetime.now() + timedelta(minutes=10)
+    rate_limits.record_response(rate_limits.ENDPOINT_TWEETS, info={'limit': 50, 'remaining': 0, 'reset_at': reset_at})
+    assert rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS) == reset_at
+
+    # Une autre fenêtre (compte ou endpoint) n'est pas concernée
+    assert rate_limits.next_allowed_at(rate_limits.ENDPOINT_MEDIA) is None
+    assert rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS, account="autre") is None
+
+    rate_limits.record_response(rate_limits.ENDPOINT_TWEETS, info={'limit': 50, 'remaining': 49, 'reset_at': reset_at})
+    assert rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS) is None
+
+def test_no_account_uses_default_account_row_name(mock_env_vars, temp_db):
+    """Sans compte (bouton de test, MCP), l'état de rate limit est celui du compte par défaut du scheduler."""
+    from tools.twitter import get_account_clients
+    conn = temp_db.get_db_connection()
+    conn.execute("UPDATE accounts SET name = 'principal' WHERE id = ?", (temp_db.DEFAULT_ACCOUNT_ID,))
+    conn.commit()
+    conn.close()
+
+    assert get_account_clients()[0] == "principal"
+    retry_at = rate_limits.record_rate_limited(rate_limits.ENDPOINT_TWEETS)
+    assert rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS, account="principal") == retry_at
+
+def test_post_tweet_records_429_without_sleeping(mocker, mock_env_vars, temp_db):
+    """Un 429 enregistre la date de reprise (x-rate-limit-reset) et rend la main immédiatement."""
+    reset = int(time.time()) + 600
+    mock_client = mocker.patch("tools.twitter.tweepy.Client").return_value
+    mock_client.create_tweet.side_effect = _too_many_requests(mocker, {
+        'x-rate-limit-limit': "50", 'x-rate-limit-remaining': "0", 'x-rate-limit-reset': str(reset)
+    })
+    mock_sleep = mocker.patch("time.sleep")
+
+    result = post_tweet("Hello")
+
+    assert result.status == 'rate_limited'
+    assert result.error_class == 'TooManyRequests'
+    assert result.retry_after == datetime.fromtimestamp(reset)
+    mock_sleep.assert_not_called()
+    assert rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS) == datetime.fromtimestamp(reset)
+
+    # Tant que la fenêtre n'est pas réinitialisée, l'API n'est plus appelée
+    result = post_tweet("Encore")
+    assert result.status == 'rate_limited'
+    assert mock_client.create_tweet.call_count == 1
+
+def test_429_on_link_free_retry_is_deferred(mocker, mock_env_vars, temp_db):
+    """Un 429 sur la reprise sans lien (après un 403) diffère l'envoi au lieu de le marquer en échec."""
+    reset = int(time.time()) + 600
+    forbidden_response = mocker.Mock(status_code=403, reason="Forbidden", headers={})
+    forbidden_response.json.return_value = {}
+    mock_client = mocker.patch("tools.twitter.tweepy.Client").return_value
+    mock_client.create_tweet.side_effect = [
+        tweepy.errors.Forbidden(forbidden_response),
+        _too_many_requests(mocker, {'x-rate-limit-remaining': "0", 'x-rate-limit-reset': str(reset)}),
+    ]
+
+    result = post_tweet("Article https://example.com/a")
+
+    assert mock_client.create_tweet.call_args.kwargs['text'] == "Article"
+    assert result.status == 'rate_limited'
+    assert result.retry_after == datetime.fromtimestamp(reset)
+    assert rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS) == datetime.fromtimestamp(reset)
+
+def test_scheduler_skips_account_while_rate_limited(mocker, temp_db):
+    """Les tweets d'un compte limité restent en attente, sans appel à l'API."""
+    from scheduler_service import check_and_send_tweets
+    tweet_id = temp_db.add_scheduled_tweet("Tweet", datetime.now() - timedelta(minutes=1))
+    temp_db.approve_tweet(tweet_id)
+    mocker.patch("scheduler_service.rate_limits.next_allowed_at", return_value=datetime.now() + timedelta(minutes=5))
+    mock_post = mocker.patch("scheduler_service.post_tweet")
+
+    check_and_send_tweets()
+
+    mock_post.assert_not_called()
+    assert temp_db.get_tweet(tweet_id)['status'] == 'pending'
@@ -1,5 +1,18 @@
 import pytest
 from scheduler_service import check_and_send_tweets
+from tools.twitter import PostResult
+
+DEFAULT_ACCOUNT = {'id': 1, 'name': 'default', 'env_prefix': 'TWITTER_', 'monthly_limit': 500, 'is_active': 1}
+
+@pytest.fixture(autouse=True)
+def reservations_always_granted(request, mocker):
+    """Hors tests sur base réelle, la réservation du quota est toujours accordée."""
+    if 'temp_db' in request.fixturenames:
+        return
+    mocker.patch("scheduler_service.reserve_tweet_send", return_value='reserved')
+    mocker.patch("scheduler_service.requeue_stale_sends", return_value=0)
+    mocker.patch("scheduler_service.record_send_metric")
+    mocker.patch("scheduler_service.get_accounts", return_value=[DEFAULT_ACCOUNT])
 
 def test_scheduler_sends_tweet_when_quota_ok(mocker):
     """Test que le scheduler envoie le tweet si le quota est OK."""
@@ -12,13 +25,13 @@ def test_scheduler_sends_tweet_when_quota_ok(mocker):
     # Configuration
     mock_get_pending.return_value = [{'id': 1, 'content': 'Test Tweet'}]
     mock_get_count.return_value = 100 # Quota OK (< 500)
-    mock_post.return_value = "Tweet posted successfully! ID: 12345"
+    mock_post.return_value = PostResult('sent', tweet_id="12345")
     
     # Exécution
     check_and_send_tweets()
     
     # Vérifications
-    mock_post.assert_called_once_with('Test Tweet')
+    mock_post.assert_called_once_with('Test Tweet', image_url=None, account=DEFAULT_ACCOUNT)
     mock_update.assert_called_once_with(1, 'sent', twitter_id='12345')
 
 def test_scheduler_skips_tweet_when_quota_exceeded(mocker):
@@ -55,7 +68,7 @@ def test_scheduler_handles_post_error(mocker):
     # Configuration
     mock_get_pending.return_value = [{'id': 1, 'content': 'Test Tweet'}]
     mock_get_count.return_value = 100
-    mock_post.return_value = "Error: API Timeout"
+    mock_post.return_value = PostResult('failed', error="API Timeout", error_class='ReadTimeout')
     
     # Exécution
     check_and_send_tweets()
@@ -66,3 +79,196 @@ def test_scheduler_handles_post_error(mocker):
     args, kwargs = mock_update.call_args
     assert args[1] == 'failed'
     assert "API Timeout" in kwargs['error']
+
+def test_scheduler_posts_stored_thread_and_resumes(mocker):
+    """Un tweet avec thread_content est publié en thread, en reprenant après les parties déjà publiées."""
+    mocker.patch("scheduler_service.get_setting", return_value="False")
+    mocker.patch("scheduler_service.get_pending_tweets", return_value=[{
+        'id': 7, 'content': 'Long', 'image_url': None,
+        'thread_content': '["A 1/2", "B 2/2"]', 'thread_posted_ids': '["111"]'
+    }])
+    mocker.patch("scheduler_service.get_monthly_count", return_value=100)
+    mock_post = mocker.patch("scheduler_service.post_tweet")
+    mock_thread = mocker.patch("scheduler_service.post_thread", return_value=PostResult('sent', tweet_id="111", posted_ids=["111", "222"]))
+    mock_update = mocker.patch("scheduler_service.update_tweet_status")
+    
+    check_and_send_tweets()
+    
+    mock_post.assert_not_called()
+    kwargs = mock_thread.call_args.kwargs
+    assert kwargs['parts'] == ["A 1/2", "B 2/2"]
+    assert kwargs['posted_ids'] == ["111"]
+    mock_update.assert_called_once_with(7, 'sent', twitter_id='111')
+
+def test_parallel_sends_never_exceed_monthly_quota(mocker, temp_db):
+    """Envois parallèles : la réservation atomique empêche de dépasser MONTHLY_LIMIT."""
+    import threading
+    import time
+    from datetime import datetime, timedelta
+    temp_db.update_account(temp_db.DEFAULT_ACCOUNT_ID, monthly_limit=3)
+    mocker.patch("scheduler_service.SEND_CONCURRENCY", 4)
+    for i in range(6):
+        temp_db.add_scheduled_tweet(f"Tweet {i}", datetime.now() - timedelta(minutes=1))
+    conn = temp_db.get_db_connection()
+    conn.execute("UPDATE tweets SET status = 'pending'")
+    conn.commit()
+    conn.close()
+    
+    in_flight, peak, lock = [0], [0], threading.Lock()
+    def fake_post(content, **kwargs):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return PostResult('sent', tweet_id=content)
+    mocker.patch("scheduler_service.post_tweet", side_effect=fake_post)
+    
+    check_and_send_tweets()
+    
+    assert temp_db.get_monthly_count() == 3
+    conn = temp_db.get_db_connection()
+    statuses = sorted(row['status'] for row in conn.execute("SELECT status FROM tweets"))
+    conn.close()
+    assert statuses == ['sent'] * 3 + ['skipped'] * 3
+    assert peak[0] > 1
+
+def test_rate_limit_stops_other_workers(mocker):
+    """Après un 429, les tweets restants ne sont pas envoyés (pas d'appel API inutile)."""
+    from datetime import datetime, timedelta
+    mocker.patch("scheduler_service.get_setting", return_value="False")
+    mocker.patch("scheduler_service.SEND_CONCURRENCY", 1)
+    mocker.patch("scheduler_service.get_pending_tweets", return_value=[{'id': i, 'content': f"T{i}"} for i in (1, 2, 3)])
+    mocker.patch("scheduler_service.get_monthly_count", return_value=0)
+    retry_at = datetime.now() + timedelta(minutes=15)
+    mock_post = mocker.patch("scheduler_service.post_tweet", return_value=PostResult('rate_limited', retry_after=retry_at))
+    mock_update = mocker.patch("scheduler_service.update_tweet_status")
+    
+    check_and_send_tweets()
+    
+    mock_post.assert_called_once()
+    mock_update.assert_called_once()
+    assert mock_update.call_args.args[1] == 'pending'
+
+def test_accounts_have_isolated_quota_and_rate_limits(mocker, temp_db):
+    """Un compte limité (429) ou au quota atteint n'empêche pas les autres comptes de publier."""
+    from datetime import datetime, timedelta
+    from tools import rate_limits
+    gaming = temp_db.add_account("gaming", "TWITTER_GAMING_", monthly_limit=1)
+    news = temp_db.add_account("news", "TWITTER_NEWS_")
+    due = datetime.now() - timedelta(minutes=1)
+    ids = {
+        name: [temp_db.add_scheduled_tweet(f"{name} {i}", due, account_id=account_id) for i in range(2)]
+        for name, account_id in (("default", temp_db.DEFAULT_ACCOUNT_ID), ("gaming", gaming), ("news", news))
+    }
+    for tweet_ids in ids.values():
+        for tweet_id in tweet_ids:
+            temp_db.approve_tweet(tweet_id)
+    rate_limits.record_rate_limited(rate_limits.ENDPOINT_TWEETS, "news")
+    mock_post = mocker.patch(
+        "scheduler_service.post_tweet",
+        side_effect=lambda content, **kwargs: PostResult('sent', tweet_id=content)
+    )
+    
+    check_and_send_tweets()
+    
+    accounts_used = sorted(call.kwargs['account']['name'] for call in mock_post.call_args_list)
+    assert accounts_used == ['default', 'default', 'gaming']
+    assert temp_db.get_monthly_count(gaming) == 1
+    status = {t: temp_db.get_tweet(t)['status'] for t in ids['gaming'] + ids['news']}
+    assert sorted(status.values()) == ['pending', 'pending', 'sent', 'skipped']
+
+def test_usage_counters_follow_status_changes_and_reconcile(temp_db):
+    """Les compteurs suivent chaque changement de statut ; la réconciliation corrige une dérive."""
+    from datetime import datetime
+    now = datetime.now()
+    today, month = now.strftime('%Y-%m-%d'), now.strftime('%Y-%m')
+    ids = [temp_db.add_scheduled_tweet(f"Tweet {i}", now) for i in range(3)]
+    
+    temp_db.update_tweet_status(ids[0], 'sent', twitter_id="1")
+    temp_db.update_tweet_status(ids[0], 'sent', twitter_id="1") # Même statut : pas recompté
+    temp_db.update_tweet_status(ids[1], 'failed', error="boom")
+    temp_db.update_tweet_status(ids[2], 'pending', error="429") # Non compté
+    
+    assert temp_db.get_monthly_count() == 1
+    assert temp_db.get_usage_counts(temp_db.DEFAULT_ACCOUNT_ID, today) == {'sent': 1, 'failed': 1}
+    assert temp_db.reconcile_usage_counters(since=now) == 0
+    
+    # Dérive (tweet envoyé par un autre outil, écriture directe) : corrigée par la réconciliation
+    conn = temp_db.get_db_connection()
+    conn.execute("UPDATE tweets SET status = 'sent', status_updated_at = ? WHERE id = ?", (now, ids[2]))
+    conn.commit()
+    conn.close()
+    assert temp_db.get_monthly_count() == 1
+    
+    assert temp_db.reconcile_usage_counters(since=now) == 2 # Mois et jour
+    assert temp_db.get_usage_counts(period=month) == {'sent': 2, 'failed': 1}
+
+def test_failed_then_sent_tweet_reconciles_without_drift(temp_db):
+    """Un tweet en échec puis renvoyé compte l'échec et l'envoi : la réconciliation ne signale aucune dérive."""
+    from datetime import datetime
+    now = datetime.now()
+    tweet_id = temp_db.add_scheduled_tweet("Retry", now)
+
+    temp_db.update_tweet_status(tweet_id, 'failed', error="boom")
+    temp_db.update_tweet_status(tweet_id, 'pending')
+    temp_db.update_tweet_status(tweet_id, 'sent', twitter_id="1")
+
+    assert temp_db.reconcile_usage_counters(since=now) == 0
+    assert temp_db.get_usage_counts(period=now.strftime('%Y-%m')) == {'sent': 1, 'failed': 1}
+
+def test_thread_reserves_one_quota_slot_per_part(mocker, temp_db):
+    """Un thread de N parties réserve et compte N posts : le quota mensuel n'est jamais dépassé."""
+    import json
+    from datetime import datetime, timedelta
+    account_id = temp_db.add_account("threads", "TWITTER_THREADS_", monthly_limit=4)
+    due = datetime.now() - timedelta(minutes=1)
+    thread = temp_db.add_scheduled_tweet("Long", due, thread_content=json.dumps(["1/3", "2/3", "3/3"]), account_id=account_id)
+    too_long = temp_db.add_scheduled_tweet("Trop", due + timedelta(seconds=1), thread_content=json.dumps(["1/2", "2/2"]), account_id=account_id)
+    for tweet_id in (thread, too_long):
+        temp_db.approve_tweet(tweet_id)
+    mocker.patch("scheduler_service.SEND_CONCURRENCY", 1)
+    mock_thread = mocker.patch("scheduler_service.post_thread", return_value=PostResult('sent', tweet_id="1", posted_ids=["1", "2", "3"]))
+    
+    check_and_send_tweets()
+    
+    mock_thread.assert_called_once()
+    assert temp_db.get_monthly_count(account_id) == 3
+    assert temp_db.get_tweet(too_long)['status'] == 'skipped' # 3 + 2 > 4
+    assert temp_db.reconcile_usage_counters(since=datetime.now()) == 0
+
+def test_partially_posted_thread_is_counted_and_resumed(mocker, temp_db):
+    """Parties publiées avant un échec comptées dans le quota ; la reprise ne réserve que les parties restantes."""
+    import json
+    import scheduler_service
+    from datetime import datetime, timedelta
+    account_id = temp_db.add_account("threads", "TWITTER_THREADS_", monthly_limit=10)
+    tweet_id = temp_db.add_scheduled_tweet(
+        "Long", datetime.now() - timedelta(minutes=1), thread_content=json.dumps(["1/3", "2/3", "3/3"]), account_id=account_id
+    )
+    temp_db.approve_tweet(tweet_id)
+    reserve = mocker.spy(scheduler_service, "reserve_tweet_send")
+    
+    def failing_thread(content, posted_ids, on_part_posted, **kwargs):
+        on_part_posted(["1"])
+        return PostResult('failed', error="boom", posted_ids=["1"])
+    mocker.patch("scheduler_service.post_thread", side_effect=failing_thread)
+    check_and_send_tweets()
+    
+    assert temp_db.get_tweet(tweet_id)['status'] == 'failed'
+    assert temp_db.get_monthly_count(account_id) == 1
+    assert temp_db.reconcile_usage_counters(since=datetime.now()) == 0
+    
+    def resumed_thread(content, posted_ids, on_part_posted, **kwargs):
+        assert posted_ids == ["1"]
+        on_part_posted(["1", "2", "3"])
+        return PostResult('sent', tweet_id="1", posted_ids=["1", "2", "3"])
+    mocker.patch("scheduler_service.post_thread", side_effect=resumed_thread)
+    temp_db.update_tweet_status(tweet_id, 'pending')
+    check_and_send_tweets()
+    
+    assert [c.kwargs['posts'] for c in reserve.call_args_list] == [3, 2]
+    assert temp_db.get_tweet(tweet_id)['status'] == 'sent'
+    assert temp_db.get_monthly_count(account_id) == 3
+    assert temp_db.reconcile_usage_counters(since=datetime.now()) == 0
@@ -52,3 +52,41 @@ async def test_scrape_website_error(mocker):
     
     assert "Error scraping https://example.com" in result
     assert "Playwright Error" in result
+
+def test_browser_pids_are_direct_children_of_the_driver():
+    """Seuls les processus Chromium lancés par ce driver sont retenus (pas ceux des autres scrapes)."""
+    import os
+    import subprocess
+    import sys
+    from tools.scraper import _browser_pids
+    
+    fake_browser = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)", "--chromium-fake"])
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    try:
+        pids = _browser_pids(os.getpid())
+        assert fake_browser.pid in pids
+        assert other.pid not in pids
+        assert _browser_pids(None) == set()
+    finally:
+        fake_browser.kill()
+        other.kill()
+
+@pytest.mark.asyncio
+async def test_watchdog_kills_browser_on_stage_timeout(mocker):
+    """Le watchdog armé sur le timeout de l'étape tue le navigateur bloqué ; la fermeture le désarme."""
+    import asyncio
+    from tools import scraper
+    
+    mocker.patch("tools.scraper._browser_pids", return_value={4242})
+    mock_kill = mocker.patch("tools.scraper._kill_pids", return_value={4242})
+    p = AsyncMock()
+    
+    browser, pids, watchdog = await scraper._launch_browser(p, watchdog_seconds=0.05)
+    await asyncio.sleep(0.2)
+    mock_kill.assert_called_once_with({4242})
+    
+    mock_kill.reset_mock()
+    browser, pids, watchdog = await scraper._launch_browser(p, watchdog_seconds=0.2)
+    await scraper._close_browser(browser, pids, watchdog)
+    await asyncio.sleep(0.3)
+    mock_kill.assert_not_called()
@@ -0,0 +1,60 @@
+from tools.summarizer import summarize_source
+from tools.content_generator import build_tweet_prompt
+
+ARTICLE = """Title: Nvidia dévoile Blackwell
+Published: 2025-06-01
+
+Content:
+Nous utilisons des cookies pour améliorer votre expérience sur notre site.
+Accueil | Tech | IA | Crypto
+Nvidia présente l'architecture Blackwell avec 208 milliards de transistors.
+Le GPU B200 promet des performances d'inférence 30 fois supérieures au H100.
+La météo de la semaine s'annonce plutôt clémente dans la plupart des régions.
+Les premières livraisons de Blackwell aux hébergeurs cloud sont prévues cette année.
+Lire aussi : les meilleures cartes graphiques du moment
+Abonnez-vous à notre newsletter pour ne rien rater.
+"""
+
+def test_short_source_is_unchanged():
+    """Un texte qui tient dans le budget est envoyé tel quel."""
+    assert summarize_source("Title: Court\n\nContent:\nTexte bref.", "Court", max_chars=500) == "Title: Court\n\nContent:\nTexte bref."
+
+def test_summary_drops_boilerplate_and_fits_budget():
+    """Le résumé garde l'en-tête et les phrases pertinentes, sans bannières ni liens, dans le budget."""
+    summary = summarize_source(ARTICLE, "Nvidia Blackwell", max_chars=300)
+
+    assert len(summary) <= 300
+    assert summary.startswith("Title: Nvidia dévoile Blackwell\nPublished: 2025-06-01")
+    assert "208 milliards" in summary
+    for noise in ("cookies", "Accueil |", "Lire aussi", "newsletter", "météo"):
+        assert noise not in summary
+
+def test_summary_keeps_original_order():
+    """Les phrases retenues restent dans l'ordre de l'article."""
+    summary = summarize_source(ARTICLE, "Nvidia Blackwell", max_chars=400)
+    assert summary.index("208 milliards") < summary.index("B200") < summary.index("livraisons")
+
+def test_prompt_uses_summary():
+    """Le prompt ne contient plus le texte brut complet."""
+    prompt = build_tweet_prompt("Nvidia Blackwell", ARTICLE + "Paragraphe. " * 200)
+    assert "cookies" not in prompt
+    assert "208 milliards" in prompt
+
+def test_tech_sentences_are_not_mistaken_for_boilerplate():
+    """Seules les phrases de bannière sont écartées, pas les mots isolés (JavaScript, partager, confidentialité...)."""
+    from tools.summarizer import _is_boilerplate
+    for sentence in (
+        "Node.js 22 améliore les performances JavaScript de 30 %.",
+        "Les participants peuvent désormais partager leur écran dans Teams.",
+        "La CNIL sanctionne la politique de confidentialité de TikTok.",
+        "This unrelated change cuts inference latency on older GPUs.",
+    ):
+        assert not _is_boilerplate(sentence)
+    assert _is_boilerplate("Related: the best graphics cards of the year")
+
+def test_long_header_leaves_room_for_body():
+    """Un en-tête plus long que le budget est tronqué : le corps garde sa place."""
+    source = "Title: Nvidia\nSnippet: " + "détails " * 100 + "\nContent:\n" + "Nvidia présente Blackwell et ses 208 milliards de transistors. " * 3 + "Fin. " * 100
+    summary = summarize_source(source, "Nvidia", max_chars=300)
+    assert len(summary) <= 300
+    assert "208 milliards" in summary
@@ -0,0 +1,27 @@
+from tools.thread_composer import split_into_thread, compose_thread_content, parse_thread_content
+from tools.tweet_validator import weighted_length
+
+LONG_TEXT = " ".join(
+    f"Phrase numéro {i} avec quelques détails techniques sur le nouveau modèle 🤯." for i in range(12)
+) + " Source : https://example.com/" + "a" * 100
+
+def test_short_text_is_a_single_tweet():
+    assert split_into_thread("Un tweet court.") == ["Un tweet court."]
+    assert compose_thread_content("Un tweet court.") is None
+
+def test_long_text_is_numbered_and_fits():
+    """Chaque partie tient dans la limite pondérée, est numérotée et l'URL n'est jamais coupée."""
+    parts = split_into_thread(LONG_TEXT)
+
+    assert len(parts) > 1
+    for index, part in enumerate(parts, 1):
+        assert weighted_length(part) <= 280
+        assert part.endswith(f" {index}/{len(parts)}")
+    assert any("https://example.com/" + "a" * 100 in part for part in parts)
+    # Les coupures se font entre phrases
+    assert all(part.rsplit(" ", 1)[0].endswith((".", "a")) for part in parts)
+
+def test_thread_content_roundtrip():
+    stored = compose_thread_content(LONG_TEXT)
+    assert parse_thread_content(stored) == split_into_thread(LONG_TEXT)
+    assert parse_thread_content(None) is None
@@ -0,0 +1,46 @@
+from tools.tweet_validator import (
+    weighted_length, extract_key_facts, validate_tweet, RecentTweetsIndex, get_recent_index
+)
+
+def test_weighted_length_counts_urls_and_emoji():
+    """Une URL compte 23, un emoji (même composé) ou un idéogramme compte 2."""
+    assert weighted_length("Bonjour") == 7
+    assert weighted_length("Lien https://example.com/" + "a" * 80) == 5 + 23
+    assert weighted_length("🤯") == 2
+    assert weighted_length("👨‍👩‍👧") == 2
+    assert weighted_length("🇫🇷") == 2
+    assert weighted_length("日本") == 4
+
+def test_too_long_and_missing_facts():
+    """Les brouillons trop longs ou sans les chiffres du titre sont rejetés."""
+    facts = extract_key_facts("Mistral AI lève 600 M€ à une valorisation de 6 milliards")
+    assert facts == ['600', '6']
+
+    result = validate_tweet("Mistral AI lève des fonds. " + "🚀" * 140, facts)
+    assert not result['ok']
+    assert result['missing_facts'] == ['600', '6']
+    assert result['weighted_length'] > 280
+
+    assert validate_tweet("Mistral lève 600 M€, valorisée 6 milliards.", facts)['ok']
+
+def test_near_duplicate_detected():
+    """Un brouillon presque identique à un tweet récent est signalé comme doublon."""
+    index = RecentTweetsIndex()
+    index.add(1, "Nvidia présente Blackwell : 208 milliards de transistors. La course à l'IA s'accélère.")
+    index.add(2, "Les ETF Bitcoin dépassent 50 milliards de dollars d'encours.")
+
+    duplicate = validate_tweet("Nvidia présente Blackwell, 208 milliards de transistors : la course à l'IA s'accélère !", index=index)
+    assert duplicate['duplicate'] and duplicate['similar_to'] == 1
+
+    assert validate_tweet("Twitch laisse 70 % des abonnements aux streamers.", index=index)['ok']
+
+def test_recent_index_loads_sent_and_queued(temp_db):
+    """L'index est chargé depuis les tweets envoyés et en file (pas les rejetés)."""
+    from datetime import datetime
+    kept = temp_db.add_scheduled_tweet("Tweet en attente de validation", datetime.now())
+    rejected = temp_db.add_scheduled_tweet("Tweet rejeté", datetime.now())
+    temp_db.update_tweet_status(rejected, 'rejected')
+
+    index = get_recent_index(refresh=True)
+    assert len(index) == 1
+    assert index.most_similar("Tweet en attente de validation")[0] == kept
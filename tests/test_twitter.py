@@ -17,8 +17,9 @@ def test_post_tweet_success(mocker, mock_env_vars):
     result = post_tweet(content)
     
     # Vérifications
-    assert "Tweet posted successfully" in result
-    assert "123456789" in result
+    assert result.ok
+    assert result.tweet_id == "123456789"
+    assert "Tweet posted successfully" in str(result)
     
     # Vérifier que create_tweet a été appelé avec le bon contenu
     mock_client_instance.create_tweet.assert_called_once_with(text=content)
@@ -29,7 +30,9 @@ def test_post_tweet_no_credentials(monkeypatch):
     monkeypatch.delenv("TWITTER_API_KEY", raising=False)
     
     result = post_tweet("test")
-    assert "Error: Twitter credentials not found" in result
+    assert result.status == 'failed'
+    assert result.error_class == 'MissingCredentials'
+    assert "Twitter credentials not found" in str(result)
 
 def test_post_tweet_api_error(mocker, mock_env_vars):
     """Test de la gestion des erreurs de l'API Twitter."""
@@ -39,5 +42,126 @@ def test_post_tweet_api_error(mocker, mock_env_vars):
     mock_client_instance.create_tweet.side_effect = Exception("Twitter API Error")
     
     result = post_tweet("test")
-    assert "Error posting tweet" in result
-    assert "Twitter API Error" in result
+    assert result.status == 'failed'
+    assert result.error_class == 'Exception'
+    assert "Error posting tweet" in str(result)
+    assert "Twitter API Error" in result.error
+
+def test_post_thread_replies_to_previous_part(mocker, mock_env_vars):
+    """Chaque partie répond à la précédente ; l'image n'est jointe qu'au premier tweet."""
+    from tools.twitter import post_thread
+    mock_client = mocker.patch("tools.twitter.tweepy.Client").return_value
+    mock_client.create_tweet.side_effect = [mocker.Mock(data={'id': tid}) for tid in ("1", "2", "3")]
+    mock_upload = mocker.patch("tools.twitter.prepare_media", return_value={'media_id': 42, 'download_ms': 5, 'upload_ms': 7})
+    progress = []
+    
+    result = post_thread("", image_url="http://img", parts=["A 1/3", "B 2/3", "C 3/3"], on_part_posted=progress.append)
+    
+    assert str(result) == "Thread posted successfully (3 tweets)! ID: 1"
+    assert (result.tweet_id, result.posted_ids) == ("1", ["1", "2", "3"])
+    assert (result.download_ms, result.upload_ms) == (5, 7)
+    mock_upload.assert_called_once_with("http://img", None)
+    calls = [c.kwargs for c in mock_client.create_tweet.call_args_list]
+    assert calls == [
+        {'text': "A 1/3", 'media_ids': [42]},
+        {'text': "B 2/3", 'in_reply_to_tweet_id': "1"},
+        {'text': "C 3/3", 'in_reply_to_tweet_id': "2"},
+    ]
+    assert progress[-1] == ["1", "2", "3"]
+
+def test_post_thread_resumes_after_last_posted_part(mocker, mock_env_vars):
+    """Un thread partiellement publié reprend à la partie suivante, sans réuploader l'image."""
+    from tools.twitter import post_thread
+    mock_client = mocker.patch("tools.twitter.tweepy.Client").return_value
+    mock_client.create_tweet.return_value = mocker.Mock(data={'id': "3"})
+    mock_upload = mocker.patch("tools.twitter.prepare_media")
+    
+    result = post_thread("", image_url="http://img", parts=["A 1/3", "B 2/3", "C 3/3"], posted_ids=["1", "2"])
+    
+    assert result.ok and result.tweet_id == "1"
+    mock_upload.assert_not_called()
+    mock_client.create_tweet.assert_called_once_with(text="C 3/3", in_reply_to_tweet_id="2")
+
+def test_post_thread_reports_partial_failure(mocker, mock_env_vars):
+    from tools.twitter import post_thread
+    mock_client = mocker.patch("tools.twitter.tweepy.Client").return_value
+    mock_client.create_tweet.side_effect = [mocker.Mock(data={'id': "1"}), Exception("Twitter API Error")]
+    progress = []
+    
+    result = post_thread("", parts=["A 1/2", "B 2/2"], on_part_posted=lambda ids: progress.append(list(ids)))
+    
+    assert result.status == 'failed'
+    assert result.error.startswith("thread part 2/2 (1 already posted)")
+    assert result.posted_ids == ["1"]
+    assert progress == [["1"]]
+
+def test_clients_are_reused_until_credentials_rotate(mocker, mock_env_vars, monkeypatch):
+    """Un seul couple de clients v2/v1.1 par jeu d'identifiants ; une rotation en crée un nouveau."""
+    from tools.twitter import get_clients
+    mock_client = mocker.patch("tools.twitter.tweepy.Client")
+    mock_api = mocker.patch("tools.twitter.tweepy.API")
+    mock_client.return_value.create_tweet.return_value = mocker.Mock(data={'id': "1"})
+    
+    post_tweet("Premier")
+    post_tweet("Second")
+    assert mock_client.call_count == 1
+    assert mock_api.call_count == 1
+    assert get_clients() is get_clients()
+    
+    monkeypatch.setenv("TWITTER_ACCESS_TOKEN", "rotated_token")
+    post_tweet("Après rotation")
+    assert mock_client.call_count == 2
+    assert mock_client.call_args.kwargs['access_token'] == "rotated_token"
+
+def test_clients_use_pooled_keep_alive_sessions(mock_env_vars):
+    """Les sessions HTTP des clients montent un pool de connexions réutilisables."""
+    from tools.twitter import get_clients, TWITTER_POOL_SIZE
+    clients = get_clients()
+    for client in (clients.v2, clients.v1):
+        assert client.session.get_adapter("https://api.twitter.com")._pool_maxsize == TWITTER_POOL_SIZE
+
+def test_search_tweets_paginates_from_since_id(mocker, mock_env_vars, temp_db):
+    """Pages suivies via next_token jusqu'au budget ; auteurs obtenus par expansion dans la même requête."""
+    from tools.twitter import search_tweets
+    mock_client = mocker.patch("tools.twitter.tweepy.Client").return_value
+    def page(ids, next_token=None):
+        return mocker.Mock(
+            data=[mocker.Mock(id=tid, text=f"t{tid}", author_id=7) for tid in ids],
+            includes={'users': [mocker.Mock(id=7, username="dev")]},
+            meta={'next_token': next_token} if next_token else {}
+        )
+    mock_client.search_recent_tweets.side_effect = [page([30, 29], "p2"), page([28], "p3"), page([27])]
+    
+    search = search_tweets("IA", since_id="20", max_pages=2)
+    
+    # Tweet 27 non lu (limite de pages) : la recherche est signalée tronquée
+    assert [t['id'] for t in search.tweets] == ["30", "29", "28"]
+    assert search.truncated
+    assert search.tweets[0]['username'] == "dev"
+    calls = mock_client.search_recent_tweets.call_args_list
+    assert len(calls) == 2
+    assert calls[0].kwargs['since_id'] == "20"
+    assert calls[0].kwargs['max_results'] == 100 # Pages pleines : moins de recherches tronquées
+    assert calls[0].kwargs['expansions'] == ['author_id']
+    assert (calls[0].kwargs['next_token'], calls[1].kwargs['next_token']) == (None, "p2")
+    
+    # Dernière page atteinte : recherche complète
+    mock_client.search_recent_tweets.side_effect = [page([30, 29], "p2"), page([28])]
+    assert not search_tweets("IA", since_id="20", max_pages=2).truncated
+
+def test_search_tweets_rate_limited_is_truncated(mocker, mock_env_vars, temp_db):
+    """Un rate limit en cours de pagination retourne les pages lues, signalées tronquées."""
+    import tweepy
+    from tools.twitter import search_tweets
+    mock_client = mocker.patch("tools.twitter.tweepy.Client").return_value
+    first_page = mocker.Mock(
+        data=[mocker.Mock(id=30, text="t30", author_id=7)], includes={}, meta={'next_token': "p2"}
+    )
+    mock_client.search_recent_tweets.side_effect = [
+        first_page, tweepy.errors.TooManyRequests(mocker.Mock(status_code=429, headers={}, json=lambda: {}))
+    ]
+    
+    search = search_tweets("IA", since_id="20")
+    
+    assert [t['id'] for t in search.tweets] == ["30"]
+    assert search.truncated
@@ -0,0 +1,246 @@
+import asyncio
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from tools import nitter_pool, trending, twitter_scraper
+from tools.nitter_parser import parse_timeline_html, parse_nitter_date
+
+def _mock_browser(mocker):
+    """async_playwright() -> p -> browser -> context ; retourne le contexte."""
+    mock_playwright = mocker.patch("tools.twitter_scraper.async_playwright")
+    mock_p = AsyncMock()
+    mock_playwright.return_value.__aenter__.return_value = mock_p
+    mock_browser = AsyncMock()
+    mock_p.chromium.launch.return_value = mock_browser
+    mock_context = AsyncMock()
+    mock_browser.new_context.return_value = mock_context
+    return mock_context
+
+@pytest.mark.asyncio
+async def test_topics_run_concurrently_and_budget_returns_partial_results(mocker, temp_db):
+    """Les sujets sont cherchés en parallèle ; un sujet bloqué n'empêche pas de retourner les autres."""
+    _mock_browser(mocker)
+    # Accès HTTP bloqué partout : tous les sujets passent par le navigateur
+    mocker.patch("tools.twitter_scraper._fetch_topic_http", return_value=False)
+
+    async def fake_scrape_topic(context, topic, deadline, all_tweets, instance=None):
+        if topic == "Crypto":
+            await asyncio.sleep(30) # Instance bloquée
+        await asyncio.sleep(0.2)
+        all_tweets.append({'id': topic, 'views': 20000, 'score': {"IA": 30, "Twitch": 20, "gaming": 10}.get(topic, 0)})
+    mocker.patch("tools.twitter_scraper._scrape_topic", side_effect=fake_scrape_topic)
+
+    started = time.perf_counter()
+    tweets = await twitter_scraper.scrape_top_french_tech_tweets(budget_seconds=0.5)
+
+    # 3 sujets de 0,2 s en parallèle, le 4e abandonné au bout du budget
+    assert time.perf_counter() - started < 1.5
+    assert [t['id'] for t in tweets] == ["IA", "Twitch", "gaming"]
+
+@pytest.mark.asyncio
+async def test_scrape_topic_waits_for_timeline_instead_of_sleeping(mocker, temp_db):
+    """La page est lue dès que la timeline apparaît, sans attente fixe."""
+    page = AsyncMock()
+    page.content.return_value = "<div class='timeline-item'></div>"
+    page.eval_on_selector_all.return_value = [{'href': "/a/status/1"}]
+    context = AsyncMock()
+    context.new_page.return_value = page
+    mocker.patch("tools.twitter_scraper._parse_timeline_entry", return_value={'id': "1", 'score': 10})
+    mock_sleep = mocker.patch("tools.twitter_scraper.asyncio.sleep")
+
+    all_tweets = []
+    deadline = asyncio.get_running_loop().time() + 10
+    await twitter_scraper._scrape_topic(context, "IA", deadline, all_tweets)
+
+    assert all_tweets == [{'id': "1", 'score': 10}]
+    assert page.wait_for_selector.call_args.args[0] == twitter_scraper.TIMELINE_READY_SELECTOR
+    mock_sleep.assert_not_called()
+    page.close.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_timeline_is_extracted_in_one_round_trip(mocker, temp_db):
+    """Une seule évaluation côté page pour toute la timeline ; le parsing des nombres se fait en Python."""
+    date_title = datetime.now().strftime("%b %d, %Y") + " · 3:45 PM UTC"
+    page = AsyncMock()
+    page.content.return_value = "<div class='timeline-item'></div>"
+    page.eval_on_selector_all.return_value = [
+        {'text': "Nouveau modèle d'IA open source", 'href': "/dev/status/42#m", 'date_title': date_title,
+         'stats_text': "1,2k retweets 3k likes 45k views"},
+        {'text': "court", 'href': "/dev/status/43", 'date_title': date_title, 'stats_text': None},
+    ]
+    context = AsyncMock()
+    context.new_page.return_value = page
+
+    all_tweets = []
+    await twitter_scraper._scrape_topic(context, "IA", asyncio.get_running_loop().time() + 10, all_tweets)
+
+    assert page.eval_on_selector_all.await_count == 1
+    selector, script, max_items = page.eval_on_selector_all.call_args.args
+    assert (selector, max_items) == ('.timeline-item', twitter_scraper.TIMELINE_MAX_ITEMS)
+    assert page.query_selector_all.await_count == 0
+    assert len(all_tweets) == 1
+    tweet = all_tweets[0]
+    assert (tweet['id'], tweet['url']) == ("42", "https://twitter.com/dev/status/42")
+    assert (tweet['retweets'], tweet['likes'], tweet['views'], tweet['score']) == (1200, 3000, 45000, 5400)
+
+def test_rate_limited_instance_cools_down_and_loses_rank(monkeypatch, temp_db):
+    """Un rate limit met l'instance en pause ; le classement (persisté) passe à l'instance saine suivante."""
+    monkeypatch.setattr(nitter_pool, "NITTER_INSTANCES", ["https://a", "https://b", "https://c"])
+    nitter_pool.record_result("https://a", nitter_pool.OUTCOME_OK, 300)
+    nitter_pool.record_result("https://b", nitter_pool.OUTCOME_OK, 2000)
+    nitter_pool.record_result("https://c", nitter_pool.OUTCOME_OK, 900)
+    assert nitter_pool.ranked_instances() == ["https://a", "https://c", "https://b"]
+    
+    state = nitter_pool.record_result("https://a", nitter_pool.OUTCOME_RATE_LIMITED)
+    assert state['cooldown_until'] > datetime.now()
+    assert nitter_pool.ranked_instances() == ["https://c", "https://b"]
+    assert temp_db.get_nitter_health()["https://a"]['consecutive_failures'] == 1
+    
+    # Sujets répartis sur les instances disponibles
+    assert nitter_pool.assign_instances(["IA", "Twitch", "Crypto"]) == {
+        "IA": "https://c", "Twitch": "https://b", "Crypto": "https://c"
+    }
+
+def test_next_instance_never_breaks_a_cooldown(monkeypatch, temp_db):
+    """Seule instance non essayée en pause : on reprend une instance disponible déjà essayée, sinon on s'arrête."""
+    monkeypatch.setattr(nitter_pool, "NITTER_INSTANCES", ["https://a", "https://b"])
+    nitter_pool.record_result("https://b", nitter_pool.OUTCOME_RATE_LIMITED)
+
+    assert twitter_scraper._next_instance(["https://a"]) == "https://a"
+
+    nitter_pool.record_result("https://a", nitter_pool.OUTCOME_RATE_LIMITED)
+    assert twitter_scraper._next_instance(["https://a"]) is None
+    assert nitter_pool.ranked_instances() == ["https://b", "https://a"] # Dernier recours explicite
+
+@pytest.mark.asyncio
+async def test_scrape_topic_fails_over_to_next_instance(mocker, monkeypatch, temp_db):
+    """Instance limitée : le sujet bascule immédiatement sur une autre instance, sans pause."""
+    monkeypatch.setattr(nitter_pool, "NITTER_INSTANCES", ["https://a", "https://b"])
+    page = AsyncMock()
+    page.content.side_effect = ["Instance has been rate limited", "<div class='timeline-item'></div>"]
+    page.eval_on_selector_all.return_value = [{'href': "/a/status/1"}]
+    context = AsyncMock()
+    context.new_page.return_value = page
+    mocker.patch("tools.twitter_scraper._parse_timeline_entry", return_value={'id': "1", 'score': 10})
+    mock_sleep = mocker.patch("tools.twitter_scraper.asyncio.sleep")
+    
+    all_tweets = []
+    await twitter_scraper._scrape_topic(context, "IA", asyncio.get_running_loop().time() + 10, all_tweets, "https://a")
+    
+    urls = [c.args[0] for c in page.goto.call_args_list]
+    assert [url.split('/search')[0] for url in urls] == ["https://a", "https://b"]
+    assert all_tweets == [{'id': "1", 'score': 10}]
+    mock_sleep.assert_not_called()
+    health = temp_db.get_nitter_health()
+    assert health["https://a"]['rate_limit_rate'] == 1.0
+    assert health["https://b"]['consecutive_failures'] == 0
+
+def _timeline_html(date_title):
+    return f"""
+    <div class="timeline"><div class="timeline-item">
+      <a class="tweet-link" href="/dev/status/42#m"></a>
+      <span class="tweet-date"><a href="/dev/status/42#m" title="{date_title}">2h</a></span>
+      <div class="tweet-content media-body">Nouveau modèle <a href="/search?q=%23IA">#IA</a> open source<br>ligne 2 &amp; co</div>
+      <div class="tweet-stats">
+        <span class="tweet-stat"><div class="icon-container"><span class="icon-comment"></span> 5</div></span>
+        <span class="tweet-stat"><div class="icon-container"><span class="icon-retweet"></span> 1,200</div></span>
+        <span class="tweet-stat"><div class="icon-container"><span class="icon-quote"></span> 7</div></span>
+        <span class="tweet-stat"><div class="icon-container"><span class="icon-heart"></span> 3K</div></span>
+        <span class="tweet-stat"><div class="icon-container"><span class="icon-views"></span> 45K</div></span>
+      </div>
+    </div></div>
+    """
+
+def test_parse_timeline_html_and_exact_date():
+    """Parsing HTML sans navigateur ; la date garde l'heure exacte (UTC convertie en heure locale)."""
+    entries = parse_timeline_html(_timeline_html("Oct 19, 2026 · 3:45 PM UTC"))
+    
+    assert entries == [{
+        'text': "Nouveau modèle #IA open source\nligne 2 & co",
+        'href': "/dev/status/42#m",
+        'date_title': "Oct 19, 2026 · 3:45 PM UTC",
+        'stats_text': "1200 retweets, 3K likes, 7 quotes, 5 replies, 45K views",
+    }]
+    created_at = parse_nitter_date("Oct 19, 2026 · 3:45 PM UTC")
+    expected = datetime(2026, 10, 19, 15, 45, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert created_at == expected
+    assert parse_nitter_date("hier") is None
+
+@pytest.mark.asyncio
+async def test_http_path_returns_top_tweets_without_browser(mocker, monkeypatch, temp_db):
+    """Pages servies en HTTP : aucun navigateur lancé ; un sujet bloqué seul passe par Playwright."""
+    monkeypatch.setattr(nitter_pool, "NITTER_INSTANCES", ["https://a"])
+    monkeypatch.setattr(twitter_scraper, "TOPICS", ["IA", "Crypto"])
+    date_title = (datetime.now(timezone.utc) - timedelta(hours=1)).strftime("%b %d, %Y · %I:%M %p UTC")
+    html = _timeline_html(date_title)
+    
+    def fake_get(url, headers=None, timeout=None):
+        if "Crypto" in url:
+            return MagicMock(status_code=403, text="<html>Verifying your browser</html>")
+        return MagicMock(status_code=200, text=html)
+    mocker.patch("tools.twitter_scraper.requests.get", side_effect=fake_get)
+    mock_playwright = mocker.patch("tools.twitter_scraper.async_playwright")
+    
+    tweets = await twitter_scraper.scrape_top_french_tech_tweets(budget_seconds=5, use_browser=False)
+    
+    assert [(t['id'], t['retweets'], t['likes'], t['views']) for t in tweets] == [("42", 1200, 3000, 45000)]
+    mock_playwright.assert_not_called()
+    
+    # Avec le navigateur autorisé, seul le sujet bloqué est repris par Playwright
+    _mock_browser(mocker)
+    mock_scrape_topic = mocker.patch("tools.twitter_scraper._scrape_topic")
+    await twitter_scraper.scrape_top_french_tech_tweets(budget_seconds=5)
+    assert [c.args[1] for c in mock_scrape_topic.call_args_list] == ["Crypto"]
+
+def _tweet(tweet_id, likes, retweets, created_at):
+    return {
+        'id': tweet_id, 'text': f"Tweet {tweet_id} sur l'IA", 'url': f"https://twitter.com/dev/status/{tweet_id}",
+        'likes': likes, 'retweets': retweets, 'views': 50000, 'created_at': created_at, 'topic': "IA"
+    }
+
+def test_trending_ranks_by_engagement_velocity(temp_db):
+    """Un tweet récent qui monte vite passe devant un gros tweet ancien qui stagne."""
+    now = datetime.now().replace(microsecond=0)
+    old, fresh = now - timedelta(hours=20), now - timedelta(hours=1)
+    
+    temp_db.record_metric_snapshots([_tweet("1", 9000, 1000, old), _tweet("2", 100, 10, fresh)], now - timedelta(hours=1))
+    # Même tweet sous deux sujets : un seul relevé
+    temp_db.record_metric_snapshots(
+        [_tweet("1", 9050, 1000, old), _tweet("2", 700, 110, fresh), _tweet("2", 700, 110, fresh)], now - timedelta(minutes=30)
+    )
+    # Relevé hors fenêtre : ignoré
+    temp_db.record_metric_snapshots([_tweet("3", 50000, 9000, now - timedelta(hours=40))], now - timedelta(hours=30))
+    
+    rows = {row['id']: row for row in temp_db.get_engagement_velocity(24, now)}
+    assert set(rows) == {"1", "2"}
+    assert rows["1"]['velocity'] == 100.0 # +50 en 30 min
+    assert rows["2"]['velocity'] == 1600.0 # +800 en 30 min
+    assert rows["2"]['captured_at'] == now - timedelta(minutes=30)
+    
+    # Tweet relevé une seule fois : vélocité moyenne depuis sa publication
+    temp_db.record_metric_snapshots([_tweet("4", 400, 0, now - timedelta(hours=2))], now)
+    ranking = trending.get_trending_tweets(limit=3, now=now)
+    assert [t['id'] for t in ranking] == ["2", "4", "1"]
+    assert ranking[1]['velocity'] is None
+    
+    # Purge : relevés au-delà de la rétention
+    assert temp_db.purge_old_metric_snapshots(1) == 1
+
+def test_snapshot_refreshes_tracked_tweets_for_velocity(mocker, monkeypatch, temp_db):
+    """Un tweet suivi absent de la recherche est relevé sur sa page de statut : sa vélocité se calcule sur deux relevés."""
+    monkeypatch.setattr(nitter_pool, "NITTER_INSTANCES", ["https://a"])
+    date_title = (datetime.now(timezone.utc) - timedelta(hours=2)).strftime("%b %d, %Y · %I:%M %p UTC")
+    created_at = parse_nitter_date(date_title)
+    temp_db.record_metric_snapshots([_tweet("42", 2000, 1200, created_at)], datetime.now() - timedelta(hours=1))
+    mocker.patch("tools.trending.collect_french_tech_tweets", AsyncMock(return_value=[]))
+    mock_get = mocker.patch(
+        "tools.twitter_scraper.requests.get", return_value=MagicMock(status_code=200, text=_timeline_html(date_title))
+    )
+    
+    assert trending.record_snapshot() == 1
+    
+    assert mock_get.call_args.args[0] == "https://a/dev/status/42"
+    [row] = temp_db.get_engagement_velocity(24)
+    assert (row['id'], row['likes'], row['retweets']) == ("42", 3000, 1200)
+    assert row['velocity'] == pytest.approx(1000, rel=0.01) # +1000 en 1 h
@@ -1,37 +1,58 @@
-import google.generativeai as genai
+import json
 import os
+import threading
+import time
+from collections import deque
+from typing import Iterator
 from dotenv import load_dotenv
+from tools import generation_cache
+from tools.summarizer import summarize_source
+from tools.llm_providers import LLMProvider, get_provider
 
 load_dotenv()
 
-def generate_tweet_content(topic: str, source_content: str = None, tone: str = "professional") -> str:
+# Requêtes par minute autorisées par notre tier Gemini
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "10"))
+
+class RateLimiter:
     """
-    Génère un tweet sur un sujet donné en utilisant l'API Gemini.
-    
-    Args:
-        topic: Le sujet du tweet.
-        source_content: Contenu optionnel pour donner du contexte (ex: article scrapé).
-        tone: Le ton du tweet (ex: professionnel, humoristique, enthousiaste).
-        
-    Returns:
-        Le contenu du tweet généré ou un message d'erreur.
+    Limiteur de débit (requêtes par minute) à fenêtre glissante.
+    Thread-safe et indépendant de la boucle asyncio : il calcule le délai d'attente,
+    l'appelant dort (time.sleep ou asyncio.sleep).
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return "Error: GEMINI_API_KEY not found in .env file."
+    def __init__(self, requests_per_minute: int, period: float = 60.0):
+        self.requests_per_minute = requests_per_minute
+        self.period = period
+        self._slots = deque()
+        self._lock = threading.Lock()
 
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
+    def reserve(self) -> float:
+        """Réserve un créneau et retourne le délai (secondes) avant de pouvoir l'utiliser."""
+        if self.requests_per_minute <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            while self._slots and self._slots[0] <= now - self.period:
+                self._slots.popleft()
+            if len(self._slots) < self.requests_per_minute:
+                slot = now
+            else:
+                slot = self._slots.popleft() + self.period
+            self._slots.append(slot)
+            return max(slot - now, 0.0)
 
-        # Framework de tweet tech viral 2025
-        prompt = f"""
-🔥 RÔLE : Tu es un expert Tech/IA influent sur Twitter France. Ton but est d'informer et d'engager ta communauté avec des analyses pertinentes et percutantes.
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
 
-📰 CONTEXTE (ARTICLE SOURCE) :
-{source_content[:3000] if source_content else topic}
+# Limiteur partagé par tous les appels LLM du processus (sync et async)
+rate_limiter = RateLimiter(GEMINI_RPM)
+
+# Blocs d'instructions partagés par le prompt unitaire et le prompt batch
+ROLE_BLOCK = """🔥 RÔLE : Tu es un expert Tech/IA influent sur Twitter France. Ton but est d'informer et d'engager ta communauté avec des analyses pertinentes et percutantes."""
 
-🎯 OBJECTIF :
+RULES_BLOCK = """🎯 OBJECTIF :
 Rédige un tweet captivant sur ce sujet. Il doit être informatif, précis, et donner envie de réagir, sans tomber dans le clickbait bas de gamme.
 
 ⚡ RÈGLES D'OR :
@@ -39,11 +60,9 @@ Rédige un tweet captivant sur ce sujet. Il doit être informatif, précis, et d
 2. **Sois précis** : Utilise les chiffres, noms et détails techniques présents dans le texte source. Pas de généralités.
 3. **Ton naturel et engageant** : Écris comme un humain passionné, pas comme un robot marketing. Utilise l'humour ou l'ironie avec parcimonie mais efficacité.
 4. **Pas de répétitions** : Évite les formules toutes faites comme "Pendant ce temps l'Europe..." ou "Révolution ou arnaque ?" à chaque fois.
-5. **Longueur** : Utilise l'espace nécessaire pour donner de la valeur (max 280 caractères).
+5. **Longueur** : Utilise l'espace nécessaire pour donner de la valeur (max 280 caractères)."""
 
-🎨 TON : {tone}
-
-STRUCTURES POSSIBLES (à varier) :
+STYLE_BLOCK = """STRUCTURES POSSIBLES (à varier) :
 - **L'analyse** : Fait + Conséquence + Question ouverte.
 - **Le comparatif** : Avant vs Maintenant (ou US vs FR, mais subtil).
 - **Le "Saviez-vous"** : Un détail technique méconnu et fascinant.
@@ -52,22 +71,173 @@ STRUCTURES POSSIBLES (à varier) :
 Exemple de bon tweet (structure variable) :
 "355 milliards de paramètres pour le nouveau GLM-4.5 de Zhipu AI. 🤯
 Il surpasse GPT-4 sur plusieurs benchmarks clés. La Chine ne rattrape pas son retard, elle est en train de passer devant sur l'open source.
-On teste ça quand ?"
+On teste ça quand ?\""""
 
+def build_tweet_prompt(topic: str, source_content: str = None, tone: str = "professional", feedback: str = None) -> str:
+    """Construit le prompt de génération d'un tweet (feedback : corrections d'un brouillon rejeté)."""
+    corrections = f"\n⚠️ CORRECTIONS (ton brouillon précédent a été rejeté) :\n{feedback}\n" if feedback else ""
+    # Framework de tweet tech viral 2025
+    return f"""
+{ROLE_BLOCK}
+
+📰 CONTEXTE (ARTICLE SOURCE) :
+{summarize_source(source_content, topic) if source_content else topic}
+
+{RULES_BLOCK}
+
+🎨 TON : {tone}
+
+{STYLE_BLOCK}
+{corrections}
 TA MISSION :
 Génère UN seul tweet sur "{topic}".
 """
 
-        response = model.generate_content(prompt)
-        tweet = response.text.strip()
+def build_batch_prompt(requests: list[dict], tone: str = "professional") -> str:
+    """
+    Construit un prompt unique pour plusieurs articles : les instructions ne sont envoyées
+    qu'une fois, le modèle doit répondre par un tableau JSON [{"id": n, "tweet": "..."}].
+    """
+    articles = []
+    for i, request in enumerate(requests, 1):
+        context = request.get('source_content')
+        articles.append(
+            f"### ARTICLE {i}\nSujet : {request['topic']}\n{summarize_source(context, request['topic']) if context else request['topic']}"
+        )
+    articles_block = "\n\n".join(articles)
+    
+    return f"""
+{ROLE_BLOCK}
+
+{RULES_BLOCK}
+
+🎨 TON : {tone}
+
+{STYLE_BLOCK}
+
+📰 ARTICLES SOURCES ({len(requests)}) :
+
+{articles_block}
+
+TA MISSION :
+Génère UN tweet indépendant pour CHAQUE article ci-dessus, en appliquant les règles à chacun.
+Réponds UNIQUEMENT avec un tableau JSON, sans texte autour, de la forme :
+[{{"id": 1, "tweet": "..."}}, {{"id": 2, "tweet": "..."}}]
+où "id" est le numéro de l'article.
+"""
+
+def parse_batch_response(text: str, expected_count: int) -> dict[int, str]:
+    """
+    Parse la réponse JSON d'un prompt batch.
+    Retourne {id: tweet} pour les entrées valides ; lève ValueError si la réponse est inexploitable.
+    """
+    cleaned = text.strip()
+    # Enlever un éventuel bloc de code markdown
+    if cleaned.startswith("```"):
+        cleaned = cleaned.split("\n", 1)[1] if "\n" in cleaned else ""
+        cleaned = cleaned.rsplit("```", 1)[0]
+    start, end = cleaned.find("["), cleaned.rfind("]")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON array in batch response")
+    
+    data = json.loads(cleaned[start:end + 1])
+    if not isinstance(data, list):
+        raise ValueError("Batch response is not a JSON array")
+    
+    tweets = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            entry_id = int(entry.get('id'))
+        except (TypeError, ValueError):
+            continue
+        tweet = entry.get('tweet')
+        if 1 <= entry_id <= expected_count and isinstance(tweet, str) and tweet.strip():
+            tweets[entry_id] = clean_tweet(tweet)
+    
+    if not tweets:
+        raise ValueError("No valid tweet in batch response")
+    return tweets
+
+def clean_tweet(text: str) -> str:
+    """Nettoie le tweet (enlève les guillemets si l'IA en a mis)."""
+    return text.strip().strip('"').strip("'").strip()
+
+def generate_tweet_content(topic: str, source_content: str = None, tone: str = "professional", model: str = None,
+                           feedback: str = None) -> str:
+    """
+    Génère un tweet sur un sujet donné via le fournisseur LLM configuré (LLM_PROVIDER).
+    
+    Args:
+        topic: Le sujet du tweet.
+        source_content: Contenu optionnel pour donner du contexte (ex: article scrapé).
+        tone: Le ton du tweet (ex: professionnel, humoristique, enthousiaste).
+        model: Modèle à utiliser pour cet appel (défaut : modèle du fournisseur).
+        feedback: Corrections à appliquer (régénération d'un brouillon rejeté par la validation).
         
-        # Nettoyer le tweet (enlever les guillemets si l'IA en a mis)
-        tweet = tweet.strip('"').strip("'").strip()
+    Returns:
+        Le contenu du tweet généré ou un message d'erreur.
+    """
+    provider = get_provider()
+    if not provider.is_configured():
+        return provider.missing_config_error()
+
+    model = model or provider.default_model
+    model_key = f"{provider.name}:{model}"
+    cache_key = generation_cache.make_cache_key(topic, source_content, tone, model_key, feedback)
+    cached = generation_cache.get_cached_tweet(cache_key)
+    if cached:
+        return cached
+
+    try:
+        prompt = build_tweet_prompt(topic, source_content, tone, feedback)
+        
+        if provider.rate_limited:
+            rate_limiter.wait()
+        response = provider.generate(prompt, model=model)
         
+        tweet = clean_tweet(response.text)
+        generation_cache.store_tweet(cache_key, tweet, model_key)
         return tweet
     except Exception as e:
         return f"Error generating content: {str(e)}"
 
+def stream_tweet_content(topic: str, source_content: str = None, tone: str = "professional",
+                         model: str = None, provider: LLMProvider = None) -> Iterator[str]:
+    """
+    Version streaming de generate_tweet_content : produit le tweet par fragments,
+    au fil de la réponse du LLM. Le tweet complet (nettoyé) est mis en cache à la fin.
+    En cas d'échec, le dernier fragment est le message d'erreur.
+    """
+    provider = provider or get_provider()
+    if not provider.is_configured():
+        yield provider.missing_config_error()
+        return
+
+    model = model or provider.default_model
+    model_key = f"{provider.name}:{model}"
+    cache_key = generation_cache.make_cache_key(topic, source_content, tone, model_key)
+    cached = generation_cache.get_cached_tweet(cache_key)
+    if cached:
+        yield cached
+        return
+
+    chunks = []
+    try:
+        prompt = build_tweet_prompt(topic, source_content, tone)
+        
+        if provider.rate_limited:
+            rate_limiter.wait()
+        for chunk in provider.stream(prompt, model=model):
+            chunks.append(chunk)
+            yield chunk
+    except Exception as e:
+        yield f"Error generating content: {str(e)}"
+        return
+    
+    generation_cache.store_tweet(cache_key, clean_tweet("".join(chunks)), model_key)
+
 if __name__ == "__main__":
     # Test rapide (nécessite une clé API valide)
     print(generate_tweet_content("Zhipu AI défie GPT-4 avec GLM-4.5", tone="enthousiaste"))
@@ -0,0 +1,62 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+from functools import lru_cache
+import database
+from tools import summarizer
+
+logger = logging.getLogger(__name__)
+
+# Durée de validité d'une génération en cache et taille max du cache
+CACHE_TTL_HOURS = float(os.getenv("GENERATION_CACHE_TTL_HOURS", "72"))
+CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "2000"))
+
+def is_cache_enabled() -> bool:
+    return os.getenv("GENERATION_CACHE_ENABLED", "1") not in ("0", "false", "False")
+
+@lru_cache(maxsize=1)
+def prompt_version() -> str:
+    """
+    Empreinte des templates de prompt et des réglages du résumé : toute modification
+    change la version, et donc les clés de cache (invalidation automatique).
+    """
+    from tools.content_generator import build_tweet_prompt, build_batch_prompt
+    templates = build_tweet_prompt("{topic}", "{source}", "{tone}") + build_batch_prompt(
+        [{'topic': "{topic}", 'source_content': "{source}"}], "{tone}"
+    )
+    templates += f"|summarizer:{summarizer.SUMMARIZER_VERSION}:{summarizer.PROMPT_CONTEXT_CHARS}"
+    return hashlib.sha256(templates.encode()).hexdigest()[:12]
+
+def normalize_source(text: str | None) -> str:
+    """Normalise le contenu source (espaces, casse) pour que des variations de mise en page partagent la clé."""
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+def make_cache_key(topic: str, source_content: str | None, tone: str, model: str, feedback: str | None = None) -> str:
+    """Clé = hash (contenu source normalisé, sujet, ton, modèle, version du prompt, corrections demandées)."""
+    parts = [normalize_source(source_content), topic.strip(), tone.strip(), model, prompt_version()]
+    if feedback:
+        parts.append(feedback.strip())
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+def get_cached_tweet(key: str) -> str | None:
+    """Retourne le tweet en cache (et comptabilise le hit ou le miss), ou None."""
+    if not is_cache_enabled():
+        return None
+    try:
+        tweet = database.get_generation_cache_entry(key, CACHE_TTL_HOURS)
+        database.increment_generation_cache_stat('hit' if tweet else 'miss')
+        return tweet
+    except sqlite3.Error as e:
+        logger.warning(f"Generation cache unavailable: {e}")
+        return None
+
+def store_tweet(key: str, tweet: str, model: str):
+    """Met en cache une génération réussie (les messages d'erreur ne sont jamais mis en cache)."""
+    if not is_cache_enabled() or not tweet or tweet.startswith("Error"):
+        return
+    try:
+        database.put_generation_cache_entry(key, tweet, model, prompt_version(), CACHE_MAX_ENTRIES)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not store generation in cache: {e}")
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import os
+import time
+import weakref
+from typing import AsyncIterator
+from tools import generation_cache
+from tools.content_generator import (
+    rate_limiter, build_tweet_prompt, clean_tweet, build_batch_prompt, parse_batch_response,
+    stream_tweet_content
+)
+from tools.llm_providers import LLMProvider, get_provider
+
+logger = logging.getLogger(__name__)
+
+# Nombre max d'appels Gemini simultanés
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+# Nombre d'articles regroupés dans un seul appel en mode batch
+GENERATION_BATCH_SIZE = int(os.getenv("GENERATION_BATCH_SIZE", "5"))
+
+def _stats(tweet: str, mode: str, prompt_tokens: float = 0, output_tokens: float = 0, latency_ms: float = 0) -> dict:
+    return {
+        'tweet': tweet,
+        'mode': mode,
+        'prompt_tokens': round(prompt_tokens),
+        'output_tokens': round(output_tokens),
+        'latency_ms': round(latency_ms)
+    }
+
+class GenerationService:
+    """
+    Service de génération de tweets asynchrone.
+
+    - Les appels passent par un fournisseur LLM (Gemini, stub local...) : par défaut
+      celui de LLM_PROVIDER, résolu à chaque appel.
+    - Le modèle peut être choisi par appel (ex: un modèle rapide pour les brouillons).
+    - Le nombre d'appels simultanés est borné (sémaphore) et le débit respecte
+      le limiteur requêtes/minute partagé avec les appels synchrones.
+    - generate_many() permet de soumettre beaucoup de requêtes et de récupérer
+      les résultats au fil de l'eau, pour recouvrir la latence du LLM.
+    """
+    def __init__(self, max_concurrency: int = GEMINI_MAX_CONCURRENCY, model_name: str | None = None,
+                 limiter=rate_limiter, provider: LLMProvider | None = None):
+        self.max_concurrency = max_concurrency
+        self.model_name = model_name
+        self.rate_limiter = limiter
+        self._provider = provider
+        # Un sémaphore asyncio est lié à sa boucle : un par boucle (asyncio.run crée une boucle par appel)
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    @property
+    def provider(self) -> LLMProvider:
+        return self._provider or get_provider()
+
+    def _model_key(self, model: str | None) -> tuple[str, str]:
+        """Retourne (modèle effectif, identifiant fournisseur:modèle utilisé par le cache)."""
+        provider = self.provider
+        model = model or self.model_name or provider.default_model
+        return model, f"{provider.name}:{model}"
+
+    async def _call_model(self, prompt: str, model: str | None = None, json_mode: bool = False):
+        """Appelle le fournisseur (limite de débit incluse) et retourne (réponse, latence en ms)."""
+        provider = self.provider
+        if provider.rate_limited:
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        started = time.perf_counter()
+        # Client synchrone exécuté dans un thread : réutilisable d'une boucle à l'autre
+        response = await asyncio.to_thread(provider.generate, prompt, model=model, json_mode=json_mode)
+        return response, (time.perf_counter() - started) * 1000
+
+    async def generate_with_stats(self, topic: str, source_content: str = None, tone: str = "professional", model: str = None) -> dict:
+        """
+        Génère un tweet et retourne {'tweet', 'mode', 'prompt_tokens', 'output_tokens', 'latency_ms'}.
+        En cas d'échec, 'tweet' contient le message d'erreur.
+        """
+        if not self.provider.is_configured():
+            return _stats(self.provider.missing_config_error(), 'single')
+
+        model, model_key = self._model_key(model)
+        cache_key = generation_cache.make_cache_key(topic, source_content, tone, model_key)
+        cached = await asyncio.to_thread(generation_cache.get_cached_tweet, cache_key)
+        if cached:
+            return _stats(cached, 'cache')
+
+        async with self._semaphore():
+            try:
+                response, latency_ms = await self._call_model(build_tweet_prompt(topic, source_content, tone), model)
+                tweet = clean_tweet(response.text)
+                await asyncio.to_thread(generation_cache.store_tweet, cache_key, tweet, model_key)
+                return _stats(tweet, 'single', response.prompt_tokens, response.output_tokens, latency_ms)
+            except Exception as e:
+                return _stats(f"Error generating content: {str(e)}", 'single')
+
+    async def generate(self, topic: str, source_content: str = None, tone: str = "professional", model: str = None) -> str:
+        """
+        Génère un tweet (version asynchrone de generate_tweet_content).
+
+        Returns:
+            Le contenu du tweet généré ou un message d'erreur.
+        """
+        return (await self.generate_with_stats(topic, source_content, tone, model))['tweet']
+
+    async def stream(self, topic: str, source_content: str = None, tone: str = "professional", model: str = None) -> AsyncIterator[str]:
+        """
+        Génère un tweet en streaming : produit les fragments de texte au fil de la réponse
+        du LLM (le dernier fragment est le message d'erreur en cas d'échec).
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+
+        def produce():
+            # Itérateur synchrone du fournisseur consommé dans un thread, relayé à la boucle
+            try:
+                chunks = stream_tweet_content(
+                    topic, source_content, tone, model or self.model_name, provider=self.provider
+                )
+                for chunk in chunks:
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        async with self._semaphore():
+            producer = loop.run_in_executor(None, produce)
+            while (chunk := await queue.get()) is not done:
+                yield chunk
+            await producer
+
+    async def _generate_chunk(self, requests: list[dict], tone: str, model: str | None = None) -> list[dict]:
+        """Génère les tweets d'un groupe d'articles en un seul appel, avec repli unitaire."""
+        if len(requests) == 1:
+            return [await self.generate_with_stats(requests[0]['topic'], requests[0].get('source_content'), tone, model)]
+
+        parsed = {}
+        prompt_tokens = output_tokens = latency_ms = 0
+        async with self._semaphore():
+            try:
+                response, latency_ms = await self._call_model(build_batch_prompt(requests, tone), model, json_mode=True)
+                prompt_tokens, output_tokens = response.prompt_tokens, response.output_tokens
+                parsed = parse_batch_response(response.text, len(requests))
+            except Exception as e:
+                logger.warning(f"Batch generation of {len(requests)} articles failed, falling back to single calls: {e}")
+
+        # Coûts de l'appel groupé répartis sur chaque tweet
+        size = len(requests)
+        results = [
+            _stats(parsed[i], 'batch', prompt_tokens / size, output_tokens / size, latency_ms / size) if i in parsed else None
+            for i in range(1, size + 1)
+        ]
+
+        # Sortie malformée ou incomplète : appels unitaires pour les manquants uniquement
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fallbacks = await asyncio.gather(*(
+                self.generate_with_stats(requests[i]['topic'], requests[i].get('source_content'), tone, model) for i in missing
+            ))
+            for i, result in zip(missing, fallbacks):
+                results[i] = result
+        return results
+
+    async def generate_batch(self, requests: list[dict], batch_size: int = GENERATION_BATCH_SIZE) -> list[dict]:
+        """
+        Mode batch : regroupe jusqu'à batch_size articles (de même ton et même modèle) par appel LLM.
+        Retourne, dans l'ordre des requêtes, les statistiques par tweet
+        ({'tweet', 'mode', 'prompt_tokens', 'output_tokens', 'latency_ms'}).
+        """
+        if not self.provider.is_configured():
+            return [_stats(self.provider.missing_config_error(), 'batch') for _ in requests]
+
+        results = [None] * len(requests)
+        models = [self._model_key(r.get('model')) for r in requests]
+        cache_keys = [
+            generation_cache.make_cache_key(r['topic'], r.get('source_content'), r.get('tone', 'professional'), model_key)
+            for r, (_, model_key) in zip(requests, models)
+        ]
+        for index, key in enumerate(cache_keys):
+            cached = await asyncio.to_thread(generation_cache.get_cached_tweet, key)
+            if cached:
+                results[index] = _stats(cached, 'cache')
+
+        # Seuls les articles absents du cache partent dans les appels groupés
+        groups = {}
+        for index, request in enumerate(requests):
+            if results[index] is None:
+                groups.setdefault((request.get('tone', 'professional'), models[index][0]), []).append(index)
+
+        chunks = []
+        for group, indices in groups.items():
+            for start in range(0, len(indices), max(batch_size, 1)):
+                chunks.append((group, indices[start:start + batch_size]))
+
+        chunk_results = await asyncio.gather(*(
+            self._generate_chunk([requests[i] for i in indices], tone, model) for (tone, model), indices in chunks
+        ))
+
+        for (group, indices), stats in zip(chunks, chunk_results):
+            for index, result in zip(indices, stats):
+                results[index] = result
+                if result['mode'] == 'batch':
+                    await asyncio.to_thread(generation_cache.store_tweet, cache_keys[index], result['tweet'], models[index][1])
+        return results
+
+    async def _indexed(self, index: int, request: dict) -> tuple[int, dict]:
+        return index, await self.generate_with_stats(
+            request['topic'],
+            source_content=request.get('source_content'),
+            tone=request.get('tone', 'professional'),
+            model=request.get('model')
+        )
+
+    async def generate_many_with_stats(self, requests: list[dict]) -> AsyncIterator[tuple[int, dict]]:
+        """
+        Soumet plusieurs requêtes ({'topic', 'source_content', 'tone', 'model'}) et produit
+        les couples (index, statistiques) dans l'ordre de complétion.
+        """
+        tasks = [asyncio.create_task(self._indexed(i, request)) for i, request in enumerate(requests)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consommateur interrompu (timeout, break) : on annule ce qui reste
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def generate_many(self, requests: list[dict]) -> AsyncIterator[tuple[int, str]]:
+        """
+        Soumet plusieurs requêtes ({'topic', 'source_content', 'tone'}) et produit
+        les couples (index, tweet) dans l'ordre de complétion.
+        """
+        async for index, stats in self.generate_many_with_stats(requests):
+            yield index, stats['tweet']
+
+    def generate_many_sync(self, requests: list[dict]) -> list[str]:
+        """Version bloquante de generate_many : retourne les tweets dans l'ordre des requêtes."""
+        async def collect():
+            results = [None] * len(requests)
+            async for index, tweet in self.generate_many(requests):
+                results[index] = tweet
+            return results
+        return asyncio.run(collect())
+
+_service = None
+
+def get_generation_service() -> GenerationService:
+    """Retourne le service de génération partagé par le processus."""
+    global _service
+    if _service is None:
+        _service = GenerationService()
+    return _service
@@ -0,0 +1,121 @@
+import logging
+import os
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from duckduckgo_search import DDGS
+
+logger = logging.getLogger(__name__)
+
+# Contraintes Twitter pour les images (hors GIF animés)
+ALLOWED_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'image/gif'}
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+MIN_IMAGE_BYTES = 10 * 1024 # En dessous : icône, pixel de tracking...
+MIN_IMAGE_WIDTH = 300
+
+HEAD_TIMEOUT = float(os.getenv("IMAGE_HEAD_TIMEOUT", "3"))
+
+# Priorité par provenance : l'image choisie par l'éditeur est la plus fiable
+SOURCE_SCORES = {'og': 40, 'article': 20, 'search': 10}
+
+def head_check(url: str, timeout: float = HEAD_TIMEOUT) -> dict | None:
+    """
+    Vérifie une image candidate avec une simple requête HEAD (type et taille, sans télécharger).
+    Retourne {'content_type', 'content_length'} ou None si l'URL est inaccessible.
+    """
+    try:
+        response = requests.head(url, timeout=timeout, allow_redirects=True, headers={
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        })
+        if response.status_code >= 400:
+            return None
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        content_length = int(response.headers.get('Content-Length') or 0)
+        return {'content_type': content_type, 'content_length': content_length}
+    except Exception as e:
+        logger.debug(f"HEAD check failed for {url}: {e}")
+        return None
+
+def score_candidate(candidate: dict, head: dict | None) -> int | None:
+    """
+    Note une image candidate. Retourne None si elle est inutilisable pour Twitter.
+    """
+    if not head:
+        return None
+    
+    content_type = head['content_type']
+    size = head['content_length']
+    
+    # Certains CDN ne renvoient pas de Content-Type fiable sur HEAD : on tolère l'absence
+    if content_type and content_type not in ALLOWED_CONTENT_TYPES:
+        return None
+    if size and (size < MIN_IMAGE_BYTES or size > MAX_IMAGE_BYTES):
+        return None
+    
+    score = SOURCE_SCORES.get(candidate.get('source'), 0)
+    
+    # Bonus si les dimensions connues sont suffisantes, malus si l'image est minuscule
+    width = candidate.get('width') or 0
+    if width >= MIN_IMAGE_WIDTH:
+        score += 10
+    elif width:
+        score -= 15
+    
+    if content_type in ('image/jpeg', 'image/png'):
+        score += 5
+    if size:
+        score += 5 # Taille connue et dans les limites
+    
+    return score
+
+def _search_candidates(search_term: str, max_results: int = 3) -> list[dict]:
+    try:
+        images = DDGS().images(search_term, max_results=max_results)
+        return [
+            {'url': img['image'], 'source': 'search', 'width': img.get('width', 0), 'height': img.get('height', 0)}
+            for img in images or []
+        ]
+    except Exception as e:
+        logger.warning(f"Fallback image search failed: {e}")
+        return []
+
+def _best_of(candidates: list[dict], max_workers: int) -> str | None:
+    if not candidates:
+        return None
+    
+    # Les HEAD checks sont indépendants : on les lance en parallèle
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        heads = list(executor.map(lambda c: head_check(c['url']), candidates))
+    
+    scored = []
+    for candidate, head in zip(candidates, heads):
+        score = score_candidate(candidate, head)
+        if score is not None:
+            scored.append((score, candidate['url']))
+    
+    if not scored:
+        return None
+    # Tri stable : à score égal, l'ordre d'origine (page) est conservé
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored[0][1]
+
+def find_best_image(candidates: list[dict], search_term: str = None, max_workers: int = 4) -> str | None:
+    """
+    Choisit la meilleure image pour un article parmi les candidates de la page
+    (og:image, images de l'article), avec une recherche d'images en dernier recours.
+    
+    Args:
+        candidates: Liste de {'url', 'source', 'width', 'height'} (voir tools.scraper).
+        search_term: Terme de recherche DuckDuckGo si aucune candidate n'est valide.
+        
+    Returns:
+        L'URL de l'image retenue ou None.
+    """
+    best = _best_of(candidates or [], max_workers)
+    if best:
+        return best
+    
+    if search_term:
+        logger.info(f"No usable page image, searching fallback for: {search_term}")
+        return _best_of(_search_candidates(search_term), max_workers)
+    
+    return None
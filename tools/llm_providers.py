@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterator
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fournisseur LLM utilisé par défaut ('gemini' ou 'stub' pour les tests de charge hors ligne)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.5-flash")
+# Timeout dur (secondes) d'un appel Gemini
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "45"))
+
+# Réglages du stub local : latence simulée (s), taux d'échec (0-1), graine du hasard
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0.5"))
+LLM_STUB_FAILURE_RATE = float(os.getenv("LLM_STUB_FAILURE_RATE", "0"))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED", "42"))
+# Délai entre deux fragments quand le stub répond en streaming (s)
+LLM_STUB_CHUNK_DELAY = float(os.getenv("LLM_STUB_CHUNK_DELAY", "0.02"))
+
+@dataclass
+class LLMResponse:
+    """Réponse d'un fournisseur LLM, indépendante du SDK utilisé."""
+    text: str
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    model: str = ""
+
+class LLMProvider:
+    """
+    Interface commune des fournisseurs LLM.
+    generate() est synchrone (le service de génération l'exécute dans un thread)
+    et lève une exception en cas d'échec.
+    """
+    name = "base"
+    default_model = ""
+    # Les appels comptent-ils dans la limite requêtes/minute partagée ?
+    rate_limited = True
+
+    def is_configured(self) -> bool:
+        return True
+
+    def missing_config_error(self) -> str:
+        return f"Error: LLM provider '{self.name}' is not configured."
+
+    def generate(self, prompt: str, model: str | None = None, json_mode: bool = False) -> LLMResponse:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, model: str | None = None) -> Iterator[str]:
+        """Produit la réponse par fragments ; par défaut, un seul fragment (pas de streaming natif)."""
+        yield self.generate(prompt, model=model).text
+
+    def warm_up(self, model: str | None = None):
+        """Prépare le client (configuration, modèle) pour que le premier appel soit plus rapide."""
+
+class GeminiProvider(LLMProvider):
+    """Fournisseur Gemini (google.generativeai) : le SDK est configuré une seule fois par clé API."""
+    name = "gemini"
+    default_model = GEMINI_MODEL
+
+    def __init__(self, timeout: float = GEMINI_TIMEOUT):
+        self.timeout = timeout
+        self._models = {}
+        self._configured_key = None
+        self._lock = threading.Lock()
+
+    def is_configured(self) -> bool:
+        return bool(os.getenv("GEMINI_API_KEY"))
+
+    def missing_config_error(self) -> str:
+        return "Error: GEMINI_API_KEY not found in .env file."
+
+    def get_model(self, model_name: str | None = None):
+        """
+        Retourne le modèle Gemini, configuré une seule fois par processus (et par clé API).
+        Retourne None si GEMINI_API_KEY est absente.
+        """
+        model_name = model_name or self.default_model
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            return None
+
+        with self._lock:
+            if api_key != self._configured_key:
+                # Première utilisation ou rotation de clé : on (re)configure et on vide le cache
+                genai.configure(api_key=api_key)
+                self._configured_key = api_key
+                self._models.clear()
+            if model_name not in self._models:
+                self._models[model_name] = genai.GenerativeModel(model_name)
+            return self._models[model_name]
+
+    def reset(self):
+        """Oublie la configuration et les modèles en cache (tests, changement de clé forcé)."""
+        with self._lock:
+            self._configured_key = None
+            self._models.clear()
+
+    def generate(self, prompt: str, model: str | None = None, json_mode: bool = False) -> LLMResponse:
+        kwargs = {"request_options": {"timeout": self.timeout}}
+        if json_mode:
+            kwargs["generation_config"] = {"response_mime_type": "application/json"}
+        response = self.get_model(model).generate_content(prompt, **kwargs)
+        prompt_tokens, output_tokens = _gemini_usage(response)
+        return LLMResponse(response.text, prompt_tokens, output_tokens, model or self.default_model)
+
+    def stream(self, prompt: str, model: str | None = None) -> Iterator[str]:
+        response = self.get_model(model).generate_content(
+            prompt, stream=True, request_options={"timeout": self.timeout}
+        )
+        for chunk in response:
+            # Un fragment sans texte (ex: métadonnées de fin) lève une ValueError sur .text
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+
+    def warm_up(self, model: str | None = None):
+        self.get_model(model)
+
+def _gemini_usage(response) -> tuple[int, int]:
+    """Retourne (tokens du prompt, tokens générés) d'une réponse Gemini (0 si indisponible)."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return 0, 0
+    prompt_tokens = getattr(usage, 'prompt_token_count', 0)
+    output_tokens = getattr(usage, 'candidates_token_count', 0)
+    return (
+        prompt_tokens if isinstance(prompt_tokens, int) else 0,
+        output_tokens if isinstance(output_tokens, int) else 0
+    )
+
+class StubProvider(LLMProvider):
+    """
+    Fournisseur local déterministe, pour tester le pipeline hors ligne (tests de charge).
+    La réponse dépend uniquement du prompt ; la latence et le taux d'échec sont configurables
+    et les échecs sont tirés d'un générateur pseudo-aléatoire à graine fixe.
+    """
+    name = "stub"
+    default_model = "stub-1"
+    rate_limited = False
+
+    def __init__(self, latency: float = LLM_STUB_LATENCY, failure_rate: float = LLM_STUB_FAILURE_RATE,
+                 seed: int = LLM_STUB_SEED, chunk_delay: float = LLM_STUB_CHUNK_DELAY):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.chunk_delay = chunk_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, model: str | None = None, json_mode: bool = False) -> LLMResponse:
+        model = model or self.default_model
+        with self._lock:
+            fails = self._random.random() < self.failure_rate
+        if self.latency > 0:
+            time.sleep(self.latency)
+        if fails:
+            raise RuntimeError("Stub LLM simulated failure")
+
+        digest = hashlib.sha256(f"{model}\x1f{prompt}".encode()).hexdigest()[:8]
+        # Prompt batch : un tweet par article, au format JSON attendu
+        article_ids = [int(n) for n in re.findall(r'^### ARTICLE (\d+)', prompt, re.MULTILINE)]
+        if json_mode and article_ids:
+            text = json.dumps([{"id": i, "tweet": f"Tweet de test {digest}-{i}"} for i in article_ids])
+        else:
+            text = f"Tweet de test {digest}"
+        return LLMResponse(text, len(prompt) // 4, len(text) // 4, model)
+
+    def stream(self, prompt: str, model: str | None = None) -> Iterator[str]:
+        # La latence simulée précède le premier fragment, puis un mot par fragment
+        words = self.generate(prompt, model=model).text.split(" ")
+        for i, word in enumerate(words):
+            if i and self.chunk_delay > 0:
+                time.sleep(self.chunk_delay)
+            yield word if i == 0 else f" {word}"
+
+PROVIDERS = {
+    'gemini': GeminiProvider,
+    'stub': StubProvider,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def get_provider(name: str | None = None) -> LLMProvider:
+    """Retourne le fournisseur demandé (par défaut LLM_PROVIDER), instancié une fois par processus."""
+    name = (name or os.getenv("LLM_PROVIDER", LLM_PROVIDER)).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = PROVIDERS[name]()
+        return _instances[name]
+
+def reset_providers():
+    """Oublie les fournisseurs instanciés (tests, changement de configuration)."""
+    with _instances_lock:
+        _instances.clear()
@@ -0,0 +1,139 @@
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+import requests
+from PIL import Image
+import database
+
+logger = logging.getLogger(__name__)
+
+# Taille max téléchargée (octets) : au-delà, le téléchargement est interrompu
+MEDIA_MAX_DOWNLOAD_BYTES = int(os.getenv("MEDIA_MAX_DOWNLOAD_BYTES", str(20 * 1024 * 1024)))
+# Limites Twitter pour une image (5 Mo, GIF 15 Mo) et côté max conservé après redimensionnement
+MEDIA_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+MEDIA_MAX_GIF_BYTES = 15 * 1024 * 1024
+MEDIA_MAX_DIMENSION = int(os.getenv("MEDIA_MAX_DIMENSION", "4096"))
+# Durée de validité d'un media_id si Twitter ne la précise pas (il expire au bout de 24h)
+MEDIA_ID_TTL_HOURS = int(os.getenv("MEDIA_ID_TTL_HOURS", "20"))
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+JPEG_QUALITIES = (85, 75, 65, 50)
+# Formats acceptés tels quels par l'upload (les autres sont convertis)
+UPLOADABLE_FORMATS = ('jpeg', 'png', 'gif')
+
+def download_image(image_url: str, max_bytes: int = MEDIA_MAX_DOWNLOAD_BYTES) -> bytes:
+    """Télécharge une image en streaming ; lève ValueError si elle dépasse max_bytes."""
+    with requests.get(image_url, timeout=10, stream=True) as response:
+        response.raise_for_status()
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ValueError(f"Image too large ({declared} bytes, max {max_bytes})")
+
+        buffer = bytearray()
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+            buffer.extend(chunk)
+            if len(buffer) > max_bytes:
+                raise ValueError(f"Image too large (more than {max_bytes} bytes)")
+    return bytes(buffer)
+
+def sniff_format(data: bytes) -> str | None:
+    """Format réel de l'image d'après ses premiers octets ('jpeg', 'png', 'gif', 'webp'...), ou None."""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[:2] == b'BM':
+        return 'bmp'
+    if data[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    if data[4:12] in (b'ftypavif', b'ftypheic', b'ftypheix', b'ftypmif1'):
+        return 'avif' if data[8:12] == b'avif' else 'heic'
+    return None
+
+def image_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _encode(image: Image.Image, fmt: str, quality: int = 85) -> bytes:
+    output = io.BytesIO()
+    if fmt == 'jpeg':
+        image.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+def _transcode(image: Image.Image, max_bytes: int) -> tuple[bytes, str]:
+    """Redimensionne puis compresse jusqu'à passer sous max_bytes (PNG si transparence, sinon JPEG)."""
+    if max(image.size) > MEDIA_MAX_DIMENSION:
+        image.thumbnail((MEDIA_MAX_DIMENSION, MEDIA_MAX_DIMENSION), Image.LANCZOS)
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if has_alpha:
+        data = _encode(image.convert('RGBA'), 'png')
+        if len(data) <= max_bytes:
+            return data, 'png'
+        # Trop lourd en PNG : on aplatit la transparence sur fond blanc
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image.convert('RGBA'), mask=image.convert('RGBA').split()[-1])
+        image = background
+    image = image.convert('RGB')
+
+    while True:
+        for quality in JPEG_QUALITIES:
+            data = _encode(image, 'jpeg', quality)
+            if len(data) <= max_bytes:
+                return data, 'jpeg'
+        # Toujours trop lourd à qualité minimale : on réduit les dimensions
+        width, height = image.size
+        if min(width, height) < 64:
+            raise ValueError("Image cannot be compressed under the upload limit")
+        image = image.resize((int(width * 0.75), int(height * 0.75)), Image.LANCZOS)
+
+def prepare_image(data: bytes) -> tuple[bytes, str]:
+    """
+    Adapte une image aux limites de Twitter : les JPEG/PNG/GIF conformes sont envoyés tels quels,
+    les autres formats (WebP, AVIF...) sont convertis et les images trop grandes réduites.
+
+    Returns:
+        tuple: (octets à uploader, format 'jpeg' | 'png' | 'gif')
+    """
+    fmt = sniff_format(data)
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Exception as e:
+        raise ValueError(f"Unsupported image format ({fmt or 'unknown'}): {e}")
+
+    max_bytes = MEDIA_MAX_GIF_BYTES if fmt == 'gif' else MEDIA_MAX_UPLOAD_BYTES
+    if fmt in UPLOADABLE_FORMATS and len(data) <= max_bytes and max(image.size) <= MEDIA_MAX_DIMENSION:
+        return data, fmt
+
+    # GIF trop lourd : seule la première image est conservée
+    image.load()
+    return _transcode(image, MEDIA_MAX_UPLOAD_BYTES)
+
+def get_cached_media(account: str, image_hash: str | None = None, source_url: str | None = None) -> dict | None:
+    """{'media_id', 'expires_at'} encore valide pour cette image (hash) ou cette URL, None sinon (ou si la base est indisponible)."""
+    try:
+        return database.get_cached_media(account, image_hash=image_hash, source_url=source_url)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read media cache: {e}")
+        return None
+
+def cache_media_id(image_hash: str, account: str, source_url: str, media_id,
+                   expires_after_secs: int | None = None, expires_at: datetime | None = None) -> datetime:
+    """Mémorise un media_id jusqu'à son expiration (avec une marge d'une heure) ; retourne cette date."""
+    if expires_at is None and expires_after_secs:
+        expires_at = datetime.now() + timedelta(seconds=expires_after_secs) - timedelta(hours=1)
+    elif expires_at is None:
+        expires_at = datetime.now() + timedelta(hours=MEDIA_ID_TTL_HOURS)
+    try:
+        database.put_cached_media_id(image_hash, account, source_url, str(media_id), expires_at)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not store media cache entry: {e}")
+    return expires_at
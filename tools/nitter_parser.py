@@ -0,0 +1,128 @@
+import re
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+
+# Éléments sans balise fermante (ne comptent pas dans la profondeur)
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# Icônes des statistiques Nitter -> libellé attendu par le parsing des métriques (likes avant quotes)
+STAT_LABELS = (
+    ('icon-retweet', 'retweets'),
+    ('icon-heart', 'likes'),
+    ('icon-quote', 'quotes'),
+    ('icon-comment', 'replies'),
+    ('icon-views', 'views'),
+    ('icon-play', 'views'),
+)
+
+class _TimelineParser(HTMLParser):
+    """
+    Parcourt une page de recherche Nitter (rendue côté serveur) et extrait, pour chaque
+    .timeline-item : texte, lien, titre de la date et statistiques.
+    """
+    def __init__(self, max_items: int):
+        super().__init__(convert_charrefs=True)
+        self.max_items = max_items
+        self.entries = []
+        self.depth = 0
+        self.item = None
+        # Profondeur d'ouverture des zones en cours (.timeline-item, .tweet-content, .tweet-stats...)
+        self.regions = {}
+        self.current_stat = None
+
+    def _open(self, region: str):
+        self.regions[region] = self.depth
+
+    def _in(self, region: str) -> bool:
+        return region in self.regions
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get('class') or '').split()
+        if tag not in VOID_TAGS:
+            self.depth += 1
+
+        if 'timeline-item' in classes and not self._in('item'):
+            if len(self.entries) >= self.max_items:
+                return
+            self.item = {'text': '', 'href': '', 'date_title': None, 'stats': {}}
+            self._open('item')
+            return
+        if not self._in('item'):
+            return
+
+        if 'tweet-content' in classes and not self._in('content') and not self.item['text']:
+            self._open('content')
+        elif tag == 'br' and self._in('content'):
+            self.item['text'] += '\n'
+        elif tag == 'a' and 'tweet-link' in classes and not self.item['href']:
+            self.item['href'] = attrs.get('href') or ''
+        elif 'tweet-date' in classes:
+            self._open('date')
+        elif tag == 'a' and self._in('date') and self.item['date_title'] is None:
+            self.item['date_title'] = attrs.get('title')
+        elif 'tweet-stats' in classes:
+            self._open('stats')
+        elif self._in('stats'):
+            for icon, label in STAT_LABELS:
+                if icon in classes:
+                    self.current_stat = label
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        self.depth -= 1
+        for region, depth in list(self.regions.items()):
+            if self.depth < depth:
+                del self.regions[region]
+        if self.item is not None and not self._in('item'):
+            self.entries.append(self.item)
+            self.item = None
+
+    def handle_data(self, data):
+        if self.item is None:
+            return
+        if self._in('content'):
+            self.item['text'] += data
+        elif self._in('stats') and self.current_stat and data.strip():
+            value = data.strip()
+            # Séparateur de milliers ("1,234") : retiré pour ne pas être lu comme une décimale
+            if re.fullmatch(r'\d{1,3}(,\d{3})+', value):
+                value = value.replace(',', '')
+            self.item['stats'].setdefault(self.current_stat, value)
+            self.current_stat = None
+
+def parse_timeline_html(html: str, max_items: int = 15) -> list[dict]:
+    """
+    Entrées de la timeline d'une page Nitter, au même format que l'extraction dans le navigateur :
+    {'text', 'href', 'date_title', 'stats_text'} (stats au format "12 retweets, 34 likes, 10k views").
+    """
+    parser = _TimelineParser(max_items)
+    parser.feed(html)
+    parser.close()
+    return [
+        {
+            'text': entry['text'].strip(),
+            'href': entry['href'],
+            'date_title': entry['date_title'],
+            'stats_text': ", ".join(
+                f"{entry['stats'][label]} {label}" for label in dict.fromkeys(label for _, label in STAT_LABELS)
+                if label in entry['stats']
+            ) or None,
+        }
+        for entry in parser.entries
+    ]
+
+def parse_nitter_date(date_title: str) -> datetime | None:
+    """
+    Date exacte d'un tweet à partir du title Nitter ("Dec 20, 2023 · 3:45 PM UTC"),
+    convertie en heure locale (naïve, comme le reste de l'application). None si illisible.
+    """
+    if not date_title:
+        return None
+    try:
+        normalized = ' '.join(date_title.replace('·', ' ').replace('UTC', ' ').split())
+        created_at = datetime.strptime(normalized, "%b %d, %Y %I:%M %p")
+    except ValueError:
+        return None
+    return created_at.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
@@ -0,0 +1,105 @@
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+import database
+
+logger = logging.getLogger(__name__)
+
+# Instances Nitter utilisables, séparées par des virgules (la première est préférée à santé égale)
+NITTER_INSTANCES = [
+    url.strip().rstrip('/')
+    for url in os.getenv("NITTER_INSTANCES", "https://nitter.poast.org,https://nitter.net,https://xcancel.com").split(',')
+    if url.strip()
+]
+# Pause d'une instance après un rate limit ou des échecs répétés (doublée à chaque échec consécutif)
+NITTER_COOLDOWN_SECONDS = int(os.getenv("NITTER_COOLDOWN_SECONDS", "300"))
+NITTER_MAX_COOLDOWN_SECONDS = 6 * 3600
+# Poids des dernières requêtes dans les moyennes glissantes
+HEALTH_EWMA_ALPHA = 0.3
+
+OUTCOME_OK = 'ok'
+OUTCOME_EMPTY = 'empty'
+OUTCOME_RATE_LIMITED = 'rate_limited'
+OUTCOME_ERROR = 'error'
+
+# Pénalités (en secondes de latence équivalente) appliquées au taux de chaque type d'échec
+_PENALTIES = {'rate_limit_rate': 10.0, 'error_rate': 6.0, 'empty_rate': 3.0}
+
+def _default_state(instance: str) -> dict:
+    return {
+        'instance': instance, 'requests': 0, 'latency_ms': 0.0, 'rate_limit_rate': 0.0,
+        'empty_rate': 0.0, 'error_rate': 0.0, 'consecutive_failures': 0, 'cooldown_until': None
+    }
+
+def _load_health() -> dict:
+    try:
+        return database.get_nitter_health()
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read Nitter health: {e}")
+        return {}
+
+def health_score(state: dict) -> float:
+    """Pénalité d'une instance (plus bas = plus sain) : latence moyenne + taux d'échecs pondérés."""
+    penalty = state['latency_ms'] / 1000
+    for key, weight in _PENALTIES.items():
+        penalty += state[key] * weight
+    return penalty
+
+def ranked_instances(exclude=(), now: datetime | None = None, allow_cooldown: bool = True) -> list[str]:
+    """
+    Instances disponibles de la plus saine à la moins saine, hors `exclude`.
+    Les instances en pause ne sont proposées qu'en dernier recours (toutes en pause),
+    et jamais si `allow_cooldown` est faux.
+    """
+    now = now or datetime.now()
+    health = _load_health()
+    candidates = [url for url in NITTER_INSTANCES if url not in exclude]
+    states = {url: health.get(url) or _default_state(url) for url in candidates}
+
+    available = [url for url in candidates if not states[url]['cooldown_until'] or states[url]['cooldown_until'] <= now]
+    if not available and allow_cooldown:
+        # Toutes en pause : la première à sortir de pause
+        return sorted(candidates, key=lambda url: states[url]['cooldown_until'])
+    return sorted(available, key=lambda url: health_score(states[url]))
+
+def assign_instances(topics: list[str]) -> dict:
+    """Répartit les sujets sur les instances saines (tour de rôle, les plus saines d'abord)."""
+    ranking = ranked_instances()
+    if not ranking:
+        return {}
+    return {topic: ranking[i % len(ranking)] for i, topic in enumerate(topics)}
+
+def record_result(instance: str, outcome: str, latency_ms: float = 0.0) -> dict:
+    """Met à jour (et persiste) la santé d'une instance après une requête ; retourne le nouvel état."""
+    state = _load_health().get(instance) or _default_state(instance)
+
+    def ewma(previous: float, value: float) -> float:
+        return value if state['requests'] == 0 else HEALTH_EWMA_ALPHA * value + (1 - HEALTH_EWMA_ALPHA) * previous
+
+    if latency_ms:
+        state['latency_ms'] = ewma(state['latency_ms'], latency_ms)
+    state['rate_limit_rate'] = ewma(state['rate_limit_rate'], 1.0 if outcome == OUTCOME_RATE_LIMITED else 0.0)
+    state['empty_rate'] = ewma(state['empty_rate'], 1.0 if outcome == OUTCOME_EMPTY else 0.0)
+    state['error_rate'] = ewma(state['error_rate'], 1.0 if outcome == OUTCOME_ERROR else 0.0)
+    state['requests'] += 1
+
+    if outcome == OUTCOME_OK:
+        state['consecutive_failures'] = 0
+        state['cooldown_until'] = None
+    else:
+        state['consecutive_failures'] += 1
+        # Rate limit : pause immédiate ; autres échecs : pause à partir du deuxième consécutif
+        if outcome == OUTCOME_RATE_LIMITED or state['consecutive_failures'] >= 2:
+            seconds = min(NITTER_COOLDOWN_SECONDS * 2 ** (state['consecutive_failures'] - 1), NITTER_MAX_COOLDOWN_SECONDS)
+            state['cooldown_until'] = datetime.now() + timedelta(seconds=seconds)
+            logger.warning(f"Nitter instance {instance} cooling down for {seconds}s after {outcome}")
+
+    try:
+        database.save_nitter_health(
+            instance, state['requests'], state['latency_ms'], state['rate_limit_rate'], state['empty_rate'],
+            state['error_rate'], state['consecutive_failures'], state['cooldown_until']
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Could not store Nitter health: {e}")
+    return state
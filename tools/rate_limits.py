@@ -0,0 +1,101 @@
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+import database
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_TWEETS = "POST /2/tweets"
+ENDPOINT_MEDIA = "POST /1.1/media/upload"
+ENDPOINT_SEARCH = "GET /2/tweets/search/recent"
+# Nom du compte par défaut si la table accounts est illisible
+DEFAULT_ACCOUNT = "default"
+# Attente appliquée sur un 429 sans en-tête x-rate-limit-reset (secondes)
+DEFAULT_RATE_LIMIT_BACKOFF = int(os.getenv("DEFAULT_RATE_LIMIT_BACKOFF", "900"))
+
+_last = threading.local()
+
+def parse_rate_limit_headers(headers) -> dict | None:
+    """Extrait {'limit', 'remaining', 'reset_at'} des en-têtes x-rate-limit-* (None s'ils sont absents)."""
+    if not headers or 'x-rate-limit-reset' not in headers:
+        return None
+    try:
+        return {
+            'limit': int(headers.get('x-rate-limit-limit', 0)),
+            'remaining': int(headers.get('x-rate-limit-remaining', 0)),
+            'reset_at': datetime.fromtimestamp(int(headers['x-rate-limit-reset']))
+        }
+    except (TypeError, ValueError):
+        return None
+
+def capture_response(response, *args, **kwargs):
+    """Hook requests : mémorise (par thread) les en-têtes de rate limit de la dernière réponse Twitter."""
+    info = parse_rate_limit_headers(response.headers)
+    if info:
+        _last.info = info
+    return response
+
+def last_rate_limit() -> dict | None:
+    """Infos de rate limit de la dernière réponse reçue par ce thread."""
+    return getattr(_last, 'info', None)
+
+def clear_last_rate_limit():
+    _last.info = None
+
+def default_account_name() -> str:
+    """
+    Nom du compte par défaut (ligne DEFAULT_ACCOUNT_ID de la table accounts) : les publications
+    sans compte (bouton de test, MCP) partagent ainsi l'état de rate limit du scheduler.
+    """
+    try:
+        account = database.get_account(database.DEFAULT_ACCOUNT_ID)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read default account: {e}")
+        account = None
+    return account['name'] if account else DEFAULT_ACCOUNT
+
+def record_response(endpoint: str, account: str | None = None, info: dict | None = None):
+    """
+    Persiste l'état de la fenêtre après une réponse : quota restant à 0 => prochain appel
+    autorisé à la réinitialisation de la fenêtre. Sans compte : le compte par défaut.
+    """
+    account = account or default_account_name()
+    info = info or last_rate_limit()
+    if not info:
+        return
+    next_allowed_at = info['reset_at'] if info['remaining'] <= 0 else None
+    try:
+        database.update_rate_limit(endpoint, account, info['remaining'], info['limit'], info['reset_at'], next_allowed_at)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not store rate limit state: {e}")
+
+def record_rate_limited(endpoint: str, account: str | None = None, headers=None) -> datetime:
+    """Persiste un 429 : retourne la date à partir de laquelle l'endpoint peut être rappelé."""
+    account = account or default_account_name()
+    info = parse_rate_limit_headers(headers) or last_rate_limit()
+    if info and info['reset_at'] > datetime.now():
+        retry_at = info['reset_at']
+    else:
+        retry_at = datetime.now() + timedelta(seconds=DEFAULT_RATE_LIMIT_BACKOFF)
+    try:
+        database.update_rate_limit(
+            endpoint, account, 0, info['limit'] if info else None, info['reset_at'] if info else None, retry_at
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Could not store rate limit state: {e}")
+    logger.warning(f"Rate limited on {endpoint} ({account}) until {retry_at:%H:%M:%S}.")
+    return retry_at
+
+def next_allowed_at(endpoint: str, account: str | None = None) -> datetime | None:
+    """Date avant laquelle il ne faut pas appeler l'endpoint, ou None s'il est disponible."""
+    account = account or default_account_name()
+    try:
+        state = database.get_rate_limit(endpoint, account)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read rate limit state: {e}")
+        return None
+    if not state or not state['next_allowed_at'] or state['next_allowed_at'] <= datetime.now():
+        return None
+    return state['next_allowed_at']
@@ -1,29 +1,138 @@
 import asyncio
+import os
+import signal
+import logging
+import threading
 from playwright.async_api import async_playwright
 
-async def scrape_website(url: str) -> dict:
+logger = logging.getLogger(__name__)
+
+# Timeouts de navigation (ms) : une page bloquée ne doit pas monopoliser le cycle de veille
+GOTO_TIMEOUT_MS = int(os.getenv("SCRAPE_GOTO_TIMEOUT_MS", "30000"))
+NETWORKIDLE_TIMEOUT_MS = int(os.getenv("SCRAPE_NETWORKIDLE_TIMEOUT_MS", "5000"))
+# Délai max pour fermer Chromium proprement avant que le watchdog ne le tue
+BROWSER_CLOSE_TIMEOUT = float(os.getenv("BROWSER_CLOSE_TIMEOUT", "10"))
+# Taille max du texte extrait (le prompt est ensuite résumé, voir tools/summarizer.py)
+SCRAPE_MAX_CHARS = int(os.getenv("SCRAPE_MAX_CHARS", "10000"))
+
+LAUNCH_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--disable-infobars',
+    '--window-position=0,0',
+    '--ignore-certificate-errors',
+    '--ignore-certificate-errors-spki-list',
+    '--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+]
+
+def _driver_pid(p) -> int | None:
+    """
+    PID du driver Playwright de cette instance (async_playwright() en lance un par appel).
+    Lu via l'API privée de Playwright : None (et erreur loggée) si elle a changé.
+    """
+    try:
+        return p._impl_obj._connection._transport._proc.pid
+    except AttributeError:
+        logger.error("Cannot find the Playwright driver PID (private API changed?): Chromium watchdog disabled")
+        return None
+
+def _browser_pids(driver_pid: int | None) -> set[int]:
+    """
+    PIDs des processus Chromium lancés directement par ce driver (Linux, via /proc).
+    Playwright les lance en tête de leur propre groupe de processus : tuer le groupe tue
+    tout le navigateur (renderers, GPU...), sans toucher aux navigateurs des autres scrapes.
+    Retourne un ensemble vide si /proc n'est pas disponible.
+    """
+    if driver_pid is None or not os.path.isdir('/proc'):
+        return set()
+    
+    pids = set()
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # Le nom du processus peut contenir des espaces : on lit après la dernière parenthèse
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            if ppid != driver_pid:
+                continue
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                cmdline = f.read().decode(errors='ignore').lower()
+        except (OSError, IndexError, ValueError):
+            continue
+        if 'chrom' in cmdline or 'headless_shell' in cmdline:
+            pids.add(int(entry))
+    return pids
+
+async def _launch_browser(p, watchdog_seconds: float | None = None):
+    """
+    Lance Chromium et retourne (browser, pids, watchdog). Les PIDs sont ceux des enfants Chromium du
+    driver de cette instance Playwright. Avec watchdog_seconds (timeout de l'étape), un watchdog tue le
+    navigateur à l'échéance, même s'il est bloqué en plein scrape ; il est désarmé à la fermeture.
+    """
+    browser = await p.chromium.launch(headless=True, args=LAUNCH_ARGS)
+    driver_pid = _driver_pid(p)
+    pids = _browser_pids(driver_pid)
+    if driver_pid is not None and not pids:
+        logger.warning(f"No Chromium process found under Playwright driver {driver_pid}: watchdog disabled")
+    watchdog = None
+    if watchdog_seconds is not None and pids:
+        def kill_on_timeout():
+            killed = _kill_pids(pids)
+            if killed:
+                logger.warning(f"Scrape exceeded {watchdog_seconds:.0f}s, killed Chromium processes {sorted(killed)}")
+        watchdog = threading.Timer(watchdog_seconds, kill_on_timeout)
+        watchdog.daemon = True
+        watchdog.start()
+    return browser, pids, watchdog
+
+def _kill_pids(pids: set[int]) -> set[int]:
+    """Tue (SIGKILL) les navigateurs encore vivants, avec leur groupe de processus, et retourne ceux qui l'étaient."""
+    killed = set()
+    for pid in pids:
+        try:
+            if os.getpgid(pid) == pid:
+                os.killpg(pid, signal.SIGKILL)
+            else:
+                os.kill(pid, signal.SIGKILL)
+            killed.add(pid)
+        except (ProcessLookupError, PermissionError):
+            pass
+    return killed
+
+async def _close_browser(browser, pids: set[int], watchdog: threading.Timer | None = None):
+    """
+    Ferme le navigateur ; s'il est bloqué (ou si la fermeture échoue), le watchdog
+    tue les processus Chromium correspondants pour ne pas laisser de zombie.
+    """
+    try:
+        await asyncio.wait_for(browser.close(), timeout=BROWSER_CLOSE_TIMEOUT)
+    except asyncio.CancelledError:
+        _kill_pids(pids)
+        raise
+    except Exception as e:
+        killed = _kill_pids(pids)
+        if killed:
+            logger.warning(f"Browser did not close cleanly ({e!r}), killed Chromium processes {sorted(killed)}")
+    finally:
+        if watchdog:
+            watchdog.cancel()
+
+async def scrape_website(url: str, watchdog_seconds: float | None = None) -> dict:
     """
     Scrape le contenu principal d'une page web.
     Extrait le titre, la date, l'auteur, le contenu principal et l'image.
+    Chromium est tué au-delà de watchdog_seconds (timeout de l'étape) s'il ne s'est pas fermé.
     
     Returns:
         dict: {'content': str, 'image_url': str | None}
     """
     browser = None
+    browser_pids = set()
+    watchdog = None
     try:
         async with async_playwright() as p:
             # Launch with arguments to hide automation
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-infobars',
-                    '--window-position=0,0',
-                    '--ignore-certificate-errors',
-                    '--ignore-certificate-errors-spki-list',
-                    '--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                ]
-            )
+            browser, browser_pids, watchdog = await _launch_browser(p, watchdog_seconds)
             
             # Create context with realistic profile
             context = await browser.new_context(
@@ -50,9 +159,9 @@ async def scrape_website(url: str) -> dict:
                 'Referer': 'https://www.google.com/'
             })
             
-            await page.goto(url, timeout=60000)
+            await page.goto(url, timeout=GOTO_TIMEOUT_MS)
             try:
-                await page.wait_for_load_state("networkidle", timeout=10000)
+                await page.wait_for_load_state("networkidle", timeout=NETWORKIDLE_TIMEOUT_MS)
             except:
                 pass # Continue if networkidle times out
             
@@ -119,22 +228,30 @@ async def scrape_website(url: str) -> dict:
                 }
             """)
             
-            # Extraction de l'image principale
-            image_url = await page.evaluate("""
+            # Extraction des images candidates (og:image puis images de l'article)
+            image_candidates = await page.evaluate("""
                 () => {
-                    // Chercher l'image Open Graph (meilleure qualité)
-                    const ogImage = document.querySelector('meta[property="og:image"], meta[name="twitter:image"]');
-                    if (ogImage && ogImage.content) return ogImage.content;
+                    const candidates = [];
+                    const seen = new Set();
+                    const add = (url, source, width, height) => {
+                        if (!url || seen.has(url) || url.startsWith('data:')) return;
+                        seen.add(url);
+                        candidates.push({url: url, source: source, width: width || 0, height: height || 0});
+                    };
+                    
+                    // Image Open Graph / Twitter Card (meilleure qualité)
+                    document.querySelectorAll('meta[property="og:image"], meta[name="twitter:image"]')
+                        .forEach(meta => add(meta.content, 'og'));
                     
-                    // Sinon, chercher la première image dans l'article
+                    // Images dans l'article
                     const articleImages = document.querySelectorAll('article img, main img, .article-content img, .post-content img');
-                    if (articleImages.length > 0) {
-                        return articleImages[0].src;
-                    }
+                    Array.from(articleImages).slice(0, 5)
+                        .forEach(img => add(img.currentSrc || img.src, 'article', img.naturalWidth, img.naturalHeight));
                     
-                    return null;
+                    return candidates;
                 }
-            """)
+            """) or []
+            image_url = image_candidates[0]['url'] if image_candidates else None
             
             # Formatage du résultat
             result = f"Title: {title}\n"
@@ -178,11 +295,13 @@ async def scrape_website(url: str) -> dict:
                     'error': 'Article too old (> 7 days)'
                 }
 
-            result += f"\nContent:\n{content[:3000]}"  # Limiter à 3000 caractères
+            # Le texte complet est conservé : le résumé extractif le réduit avant l'appel au LLM
+            result += f"\nContent:\n{content[:SCRAPE_MAX_CHARS]}"
             
             return {
                 'content': result,
-                'image_url': image_url
+                'image_url': image_url,
+                'image_candidates': image_candidates
             }
             
     except Exception as e:
@@ -192,25 +311,17 @@ async def scrape_website(url: str) -> dict:
         }
     finally:
         if browser:
-            await browser.close()
+            await _close_browser(browser, browser_pids, watchdog)
 
-async def get_links_from_page(url: str) -> list[str]:
-    """Extrait tous les liens d'une page."""
+async def get_links_from_page(url: str, watchdog_seconds: float | None = None) -> list[str]:
+    """Extrait tous les liens d'une page (Chromium tué au-delà de watchdog_seconds, voir scrape_website)."""
     browser = None # Initialize browser to None
+    browser_pids = set()
+    watchdog = None
     try:
         async with async_playwright() as p:
             # Launch with arguments to hide automation
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-infobars',
-                    '--window-position=0,0',
-                    '--ignore-certificate-errors',
-                    '--ignore-certificate-errors-spki-list',
-                    '--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                ]
-            )
+            browser, browser_pids, watchdog = await _launch_browser(p, watchdog_seconds)
             
             # Create context with realistic profile
             context = await browser.new_context(
@@ -237,9 +348,9 @@ async def get_links_from_page(url: str) -> list[str]:
                 'Referer': 'https://www.google.com/'
             })
             
-            await page.goto(url, timeout=60000)
+            await page.goto(url, timeout=GOTO_TIMEOUT_MS)
             try:
-                await page.wait_for_load_state("networkidle", timeout=10000)
+                await page.wait_for_load_state("networkidle", timeout=NETWORKIDLE_TIMEOUT_MS)
             except:
                 pass # Continue if networkidle times out
             
@@ -255,7 +366,7 @@ async def get_links_from_page(url: str) -> list[str]:
         return []
     finally:
         if browser:
-            await browser.close()
+            await _close_browser(browser, browser_pids, watchdog)
 
 if __name__ == "__main__":
     # Test simple si exécuté directement
@@ -0,0 +1,119 @@
+import math
+import os
+import re
+from collections import Counter
+
+# Taille max du contexte envoyé au LLM (en caractères)
+PROMPT_CONTEXT_CHARS = int(os.getenv("PROMPT_CONTEXT_CHARS", "1200"))
+# À incrémenter si l'algorithme change : invalide les générations en cache
+SUMMARIZER_VERSION = "2"
+
+HEADER_PREFIXES = ("Title:", "Author:", "Published:", "Snippet:")
+
+# Débuts de ligne typiques des liens et blocs de navigation non nettoyés par le scraper
+BOILERPLATE_PREFIXES = re.compile(
+    r"^(?:(?:lire aussi|à lire|voir aussi|read more|share this|partager sur|abonnez-vous|inscrivez-vous|"
+    r"connectez-vous|subscribe|sign up|log in|publicité|advertisement)\b|related(?: articles?| posts?| stories)?\s*:)",
+    re.IGNORECASE
+)
+# Phrases complètes des bannières cookies, newsletters et pieds de page (jamais un mot isolé :
+# "JavaScript" ou "politique de confidentialité" apparaissent aussi dans les articles)
+BOILERPLATE_PHRASES = re.compile(
+    r"\b(?:(?:nous utilisons|ce site utilise|we use|this site uses) (?:des |les )?cookies|"
+    r"accepte[rz]? (?:tous )?les cookies|accept (?:all )?cookies|(?:notre|our) newsletter|"
+    r"tous droits réservés|all rights reserved|(?:activez|activer|enable) (?:le )?javascript)\b",
+    re.IGNORECASE
+)
+
+STOPWORDS = set("""
+le la les un une des du de d l et ou en au aux à a est sont été être sur pour par dans avec
+ce cet cette ces son sa ses leur leurs qui que quoi dont où ne pas plus se s il elle ils elles
+on nous vous je tu y the a an and or of to in on for with is are was were be been by at as
+it its this that these those from has have had not but will would can
+""".split())
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?…])\s+(?=[A-ZÀ-ÖØ-Þ0-9"«])|\n+')
+WORD = re.compile(r"[\wÀ-ÿ]+", re.UNICODE)
+
+def _tokens(text: str) -> list[str]:
+    return [w for w in WORD.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+def _is_boilerplate(sentence: str) -> bool:
+    words = sentence.split()
+    if len(words) < 5:
+        return True
+    # Listes de liens / menus : beaucoup de séparateurs, peu de ponctuation de phrase
+    if sentence.count('|') >= 2 or sentence.count('›') >= 2 or sentence.count('•') >= 2:
+        return True
+    return bool(BOILERPLATE_PREFIXES.search(sentence) or BOILERPLATE_PHRASES.search(sentence))
+
+def split_source(source_content: str) -> tuple[list[str], str]:
+    """Sépare l'en-tête du scraper (Title:, Author:...) du corps de l'article."""
+    header, body = [], []
+    for line in source_content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith(HEADER_PREFIXES):
+            header.append(stripped)
+        elif stripped and stripped != "Content:":
+            body.append(stripped)
+    return header, "\n".join(body)
+
+def score_sentences(sentences: list[str], query: str) -> list[float]:
+    """
+    Score TF-IDF de chaque phrase (les phrases jouant le rôle de documents),
+    renforcé par le recouvrement avec le sujet/titre, la position et la présence de chiffres.
+    """
+    tokenized = [_tokens(s) for s in sentences]
+    document_frequency = Counter(word for words in tokenized for word in set(words))
+    count = len(sentences)
+    idf = {word: math.log((1 + count) / (1 + df)) + 1 for word, df in document_frequency.items()}
+    query_terms = set(_tokens(query))
+
+    scores = []
+    for position, words in enumerate(tokenized):
+        if not words:
+            scores.append(0.0)
+            continue
+        tf = Counter(words)
+        score = sum((n / len(words)) * idf[word] for word, n in tf.items())
+        score += 0.5 * len(query_terms.intersection(tf))
+        score += 0.3 if re.search(r'\d', sentences[position]) else 0
+        score += 0.5 / (1 + position)
+        scores.append(score)
+    return scores
+
+def summarize_source(source_content: str, topic: str = "", max_chars: int = PROMPT_CONTEXT_CHARS) -> str:
+    """
+    Résumé extractif local : garde l'en-tête (titre, auteur, date) puis les phrases
+    les mieux notées, dans leur ordre d'origine, jusqu'à max_chars caractères.
+    Le texte est retourné tel quel s'il tient déjà dans le budget.
+    """
+    if not source_content or len(source_content) <= max_chars:
+        return source_content
+
+    header, body = split_source(source_content)
+    title = next((line[len("Title:"):].strip() for line in header if line.startswith("Title:")), "")
+
+    sentences = []
+    for sentence in SENTENCE_SPLIT.split(body):
+        sentence = sentence.strip()
+        if sentence and not _is_boilerplate(sentence) and sentence not in sentences:
+            sentences.append(sentence)
+    if not sentences:
+        return source_content[:max_chars]
+
+    # En-tête trop long (snippet...) : tronqué pour laisser au moins la moitié du budget au corps
+    header_text = "\n".join(header)[:max_chars // 2]
+    budget = max(max_chars - len(header_text) - 1, 0)
+    scores = score_sentences(sentences, f"{topic} {title}")
+
+    selected, used = set(), 0
+    for index in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        length = len(sentences[index]) + 1
+        if used + length > budget:
+            continue
+        selected.add(index)
+        used += length
+
+    summary = " ".join(sentences[i] for i in sorted(selected))
+    return f"{header_text}\n{summary}" if header_text else summary
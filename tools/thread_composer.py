@@ -0,0 +1,87 @@
+import json
+import re
+from tools.tweet_validator import weighted_length, TWEET_MAX_WEIGHTED_LENGTH
+
+SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+
+def _numbered(text: str, index: int, total: int) -> str:
+    return f"{text} {index}/{total}"
+
+def _split_long_word(word: str, budget: int) -> list[str]:
+    """Coupe un mot (hors URL) plus long que le budget, caractère par caractère."""
+    pieces, current = [], ""
+    for char in word:
+        if current and weighted_length(current + char) > budget:
+            pieces.append(current)
+            current = ""
+        current += char
+    return pieces + [current] if current else pieces
+
+def _pack(units: list[str], budget: int) -> list[str]:
+    """Regroupe des unités (phrases puis mots) en parties de longueur pondérée <= budget."""
+    parts, current = [], ""
+    for unit in units:
+        candidate = f"{current} {unit}" if current else unit
+        if weighted_length(candidate) <= budget:
+            current = candidate
+            continue
+        if current:
+            parts.append(current)
+            current = ""
+        if weighted_length(unit) <= budget:
+            current = unit
+            continue
+        # Phrase trop longue : découpage par mots (une URL n'est jamais coupée, elle compte 23)
+        for word in unit.split():
+            pieces = [word] if word.startswith("http") else _split_long_word(word, budget)
+            for piece in pieces:
+                candidate = f"{current} {piece}" if current else piece
+                if weighted_length(candidate) <= budget:
+                    current = candidate
+                else:
+                    if current:
+                        parts.append(current)
+                    current = piece
+    if current:
+        parts.append(current)
+    return parts
+
+def split_into_thread(content: str, max_length: int = TWEET_MAX_WEIGHTED_LENGTH) -> list[str]:
+    """
+    Découpe un texte trop long en thread numéroté ("... 1/3"), chaque partie respectant
+    la longueur pondérée de Twitter. Les coupures se font de préférence entre phrases.
+    Un texte qui tient dans un tweet est retourné tel quel (une seule partie).
+    """
+    content = content.strip()
+    if weighted_length(content) <= max_length:
+        return [content]
+
+    units = []
+    for paragraph in content.split("\n"):
+        units.extend(s for s in SENTENCE_END.split(paragraph.strip()) if s)
+
+    # Le suffixe " i/N" dépend du nombre de parties : on recalcule jusqu'à stabilité
+    total = 2
+    while True:
+        suffix_length = weighted_length(_numbered("", total, total))
+        parts = _pack(units, max_length - suffix_length)
+        if len(parts) <= total:
+            break
+        total = len(parts)
+    return [_numbered(part, i, len(parts)) for i, part in enumerate(parts, 1)]
+
+def parse_thread_content(thread_content: str | None) -> list[str] | None:
+    """Retourne les parties stockées dans la colonne thread_content (JSON), ou None."""
+    if not thread_content:
+        return None
+    try:
+        parts = json.loads(thread_content)
+    except json.JSONDecodeError:
+        # Ancien format : texte libre publié en réponse au tweet principal
+        return None
+    return parts if isinstance(parts, list) and parts else None
+
+def compose_thread_content(content: str) -> str | None:
+    """Parties du thread sérialisées pour thread_content, ou None si le texte tient dans un tweet."""
+    parts = split_into_thread(content)
+    return json.dumps(parts, ensure_ascii=False) if len(parts) > 1 else None
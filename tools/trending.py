@@ -0,0 +1,54 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+import database
+from tools.twitter_scraper import collect_french_tech_tweets, refresh_tweet_metrics
+
+logger = logging.getLogger(__name__)
+
+# Fréquence des relevés de métriques du top (worker) et fenêtre de calcul des tendances
+TRENDING_SNAPSHOT_MINUTES = int(os.getenv("TRENDING_SNAPSHOT_MINUTES", "15"))
+TRENDING_WINDOW_HOURS = float(os.getenv("TRENDING_WINDOW_HOURS", "24"))
+# Pénalité d'âge : vélocité / (âge en heures + 2) ^ gravité (0 = vélocité brute)
+TRENDING_AGE_GRAVITY = float(os.getenv("TRENDING_AGE_GRAVITY", "0.5"))
+TRENDING_RETENTION_DAYS = int(os.getenv("TRENDING_RETENTION_DAYS", "7"))
+# Tweets suivis (encore dans la fenêtre) relevés à nouveau sur leur page de statut à chaque relevé
+TRENDING_REFRESH_MAX = int(os.getenv("TRENDING_REFRESH_MAX", "60"))
+
+async def _collect_snapshot(use_browser: bool) -> list[dict]:
+    tweets = await collect_french_tech_tweets(use_browser=use_browser)
+    # Tweets suivis sortis de la recherche "récents" : sans nouveau relevé, pas de vélocité
+    seen = {tweet['id'] for tweet in tweets}
+    since = datetime.now() - timedelta(hours=TRENDING_WINDOW_HOURS)
+    tracked = [t for t in database.get_tracked_tweets(since, TRENDING_REFRESH_MAX) if t['id'] not in seen]
+    return tweets + await refresh_tweet_metrics(tracked)
+
+def record_snapshot(use_browser: bool = False) -> int:
+    """
+    Relève les métriques de tous les tweets du top et des tweets suivis encore dans la fenêtre
+    (HTTP seul par défaut : pas de Chromium dans le worker) et les ajoute à la série.
+    Retourne le nombre de tweets relevés.
+    """
+    tweets = asyncio.run(_collect_snapshot(use_browser))
+    return database.record_metric_snapshots(tweets)
+
+def trending_score(tweet: dict, now: datetime) -> float:
+    """
+    Engagement gagné par heure, pénalisé par l'âge du tweet.
+    Sans relevé précédent, la vélocité est l'engagement moyen par heure depuis la publication.
+    """
+    age_hours = max((now - tweet['created_at']).total_seconds() / 3600, 0)
+    velocity = tweet['velocity']
+    if velocity is None:
+        velocity = tweet['engagement'] / max(age_hours, 1 / 60)
+    return velocity / (age_hours + 2) ** TRENDING_AGE_GRAVITY
+
+def get_trending_tweets(limit: int = 3, now: datetime | None = None) -> list[dict]:
+    """Tweets qui montent le plus vite sur la fenêtre TRENDING_WINDOW_HOURS (score de tendance décroissant)."""
+    now = now or datetime.now()
+    tweets = database.get_engagement_velocity(TRENDING_WINDOW_HOURS, now)
+    for tweet in tweets:
+        tweet['trending_score'] = trending_score(tweet, now)
+    tweets.sort(key=lambda t: t['trending_score'], reverse=True)
+    return tweets[:limit]
@@ -0,0 +1,183 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Longueur pondérée max d'un tweet (règles Twitter : URL = 23, emoji et CJK = 2)
+TWEET_MAX_WEIGHTED_LENGTH = int(os.getenv("TWEET_MAX_WEIGHTED_LENGTH", "280"))
+URL_WEIGHT = 23
+# Au-delà de cette similarité (Jaccard estimée) avec un tweet récent, le brouillon est un doublon
+SIMILARITY_THRESHOLD = float(os.getenv("TWEET_SIMILARITY_THRESHOLD", "0.6"))
+# Nombre de tweets récents (envoyés ou en file) indexés, et fréquence de rechargement depuis la base
+RECENT_TWEETS_LIMIT = int(os.getenv("RECENT_TWEETS_LIMIT", "300"))
+RECENT_INDEX_REFRESH_SECONDS = int(os.getenv("RECENT_INDEX_REFRESH_SECONDS", "300"))
+
+URL_PATTERN = re.compile(r'https?://\S+', re.IGNORECASE)
+# Drapeaux (paires d'indicateurs régionaux) et séquences emoji (modificateurs, ZWJ) comptent pour 2
+EMOJI_SEQUENCE = re.compile(
+    r'[\U0001F1E6-\U0001F1FF]{2}'
+    r'|[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF]'
+    r'(?:[\uFE0F\U0001F3FB-\U0001F3FF]|\u200D[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF]\uFE0F?)*'
+)
+# Plages de poids 1 selon twitter-text (latin, ponctuation générale...)
+LIGHT_RANGES = ((0, 4351), (8192, 8205), (8208, 8223), (8242, 8247))
+NUMBER_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+def _char_weight(char: str) -> int:
+    code = ord(char)
+    return 1 if any(low <= code <= high for low, high in LIGHT_RANGES) else 2
+
+def weighted_length(text: str) -> int:
+    """Longueur d'un tweet telle que comptée par Twitter."""
+    text = unicodedata.normalize('NFC', text)
+    length = URL_WEIGHT * len(URL_PATTERN.findall(text))
+    text = URL_PATTERN.sub('', text)
+    length += 2 * len(EMOJI_SEQUENCE.findall(text))
+    text = EMOJI_SEQUENCE.sub('', text)
+    return length + sum(_char_weight(char) for char in text)
+
+def extract_key_facts(text: str) -> list[str]:
+    """Chiffres clés d'un titre (ex: '600', '2,5') qu'un tweet sur le sujet doit reprendre."""
+    return list(dict.fromkeys(NUMBER_PATTERN.findall(text or '')))
+
+def _normalize_number(value: str) -> str:
+    return value.replace(',', '.')
+
+def missing_facts(text: str, required_facts: list[str]) -> list[str]:
+    """Retourne les faits requis absents du tweet (comparaison des nombres, '2,5' == '2.5', '1 000' == '1000')."""
+    # Séparateurs de milliers (espace, espace fine insécable) retirés avant comparaison
+    compact = re.sub(r'(?<=\d)[\s\u202f](?=\d{3}\b)', '', text)
+    present = {_normalize_number(n) for n in NUMBER_PATTERN.findall(compact)}
+    return [fact for fact in required_facts if _normalize_number(fact) not in present]
+
+# --- Index de similarité (MinHash + LSH) ---
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 4
+_MERSENNE_PRIME = (1 << 61) - 1
+_HASH_PARAMS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), 'big') % _MERSENNE_PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), 'big') % _MERSENNE_PRIME)
+    for i in range(MINHASH_PERMUTATIONS)
+]
+
+def _shingles(text: str) -> set[int]:
+    text = URL_PATTERN.sub(' ', text.lower())
+    text = re.sub(r'[^\w]+', ' ', text).strip()
+    grams = {text[i:i + SHINGLE_SIZE] for i in range(max(len(text) - SHINGLE_SIZE + 1, 1))}
+    return {int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), 'big') for g in grams}
+
+def minhash_signature(text: str) -> tuple[int, ...]:
+    shingles = _shingles(text)
+    return tuple(min((a * s + b) % _MERSENNE_PRIME for s in shingles) for a, b in _HASH_PARAMS)
+
+def _bands(signature: tuple[int, ...]) -> list[tuple]:
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return [(band, signature[band * rows:(band + 1) * rows]) for band in range(LSH_BANDS)]
+
+class RecentTweetsIndex:
+    """
+    Index en mémoire des derniers tweets (envoyés et en file) pour détecter les quasi-doublons.
+    Les signatures MinHash sont rangées dans des buckets LSH : une requête ne compare
+    le brouillon qu'aux tweets partageant au moins une bande, pas à tout l'historique.
+    """
+    def __init__(self):
+        self._signatures = {}
+        self._texts = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.loaded_at = 0.0
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def add(self, tweet_id, text: str):
+        signature = minhash_signature(text)
+        with self._lock:
+            self._signatures[tweet_id] = signature
+            self._texts[tweet_id] = text
+            for band in _bands(signature):
+                self._buckets.setdefault(band, set()).add(tweet_id)
+
+    def load(self, tweets: list[dict]):
+        """Remplace le contenu de l'index par les tweets donnés ({'id', 'content'})."""
+        with self._lock:
+            self._signatures.clear()
+            self._texts.clear()
+            self._buckets.clear()
+        for tweet in tweets:
+            self.add(tweet['id'], tweet['content'])
+        self.loaded_at = time.monotonic()
+
+    def most_similar(self, text: str, exclude_id=None) -> tuple[object, float]:
+        """Retourne (id, similarité estimée) du tweet indexé le plus proche, ou (None, 0.0)."""
+        signature = minhash_signature(text)
+        with self._lock:
+            candidates = set()
+            for band in _bands(signature):
+                candidates |= self._buckets.get(band, set())
+            candidates.discard(exclude_id)
+            best_id, best_score = None, 0.0
+            for candidate in candidates:
+                other = self._signatures[candidate]
+                score = sum(x == y for x, y in zip(signature, other)) / MINHASH_PERMUTATIONS
+                if score > best_score:
+                    best_id, best_score = candidate, score
+        return best_id, best_score
+
+_recent_index = RecentTweetsIndex()
+
+def get_recent_index(refresh: bool = False) -> RecentTweetsIndex:
+    """Retourne l'index partagé, rechargé depuis la base s'il est trop ancien."""
+    if refresh or not _recent_index.loaded_at or time.monotonic() - _recent_index.loaded_at > RECENT_INDEX_REFRESH_SECONDS:
+        from database import get_recent_tweets
+        try:
+            _recent_index.load(get_recent_tweets(RECENT_TWEETS_LIMIT))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not load recent tweets for similarity check: {e}")
+    return _recent_index
+
+def reset_recent_index():
+    """Vide l'index partagé (tests, changement de base)."""
+    _recent_index.load([])
+    _recent_index.loaded_at = 0.0
+
+def validate_tweet(text: str, required_facts: list[str] | None = None, index: RecentTweetsIndex | None = None) -> dict:
+    """
+    Vérifie un brouillon : longueur pondérée, faits requis, quasi-doublon d'un tweet récent.
+
+    Returns:
+        dict: {'ok', 'problems', 'weighted_length', 'missing_facts', 'similar_to', 'similarity', 'duplicate'}
+    """
+    problems = []
+    length = weighted_length(text)
+    if length > TWEET_MAX_WEIGHTED_LENGTH:
+        problems.append(f"Le tweet fait {length} caractères (pondérés), le maximum est {TWEET_MAX_WEIGHTED_LENGTH}.")
+
+    missing = missing_facts(text, required_facts or [])
+    if missing:
+        problems.append(f"Les chiffres clés suivants manquent : {', '.join(missing)}.")
+
+    similar_to, similarity = (None, 0.0)
+    if index is not None:
+        similar_to, similarity = index.most_similar(text)
+    duplicate = similarity >= SIMILARITY_THRESHOLD
+    if duplicate:
+        problems.append("Le tweet est presque identique à un tweet récent : change d'angle et de formulation.")
+
+    return {
+        'ok': not problems,
+        'problems': problems,
+        'weighted_length': length,
+        'missing_facts': missing,
+        'similar_to': similar_to,
+        'similarity': round(similarity, 2),
+        'duplicate': duplicate
+    }
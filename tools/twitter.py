@@ -1,87 +1,251 @@
 import tweepy
 import os
+import re
 import requests
-import tempfile
+from requests.adapters import HTTPAdapter
+import io
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from tools.thread_composer import split_into_thread
+from tools import media, rate_limits
 
 load_dotenv()
 
-def get_twitter_client():
-    """Crée et retourne un client Twitter."""
-    api_key = os.getenv("TWITTER_API_KEY")
-    api_secret = os.getenv("TWITTER_API_SECRET")
-    access_token = os.getenv("TWITTER_ACCESS_TOKEN")
-    access_token_secret = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
+# Connexions keep-alive conservées par client (envois concurrents compris)
+TWITTER_POOL_SIZE = int(os.getenv("TWITTER_POOL_SIZE", "10"))
+# Nombre max de jeux d'identifiants gardés en mémoire (rotation, plusieurs comptes)
+MAX_CLIENT_SETS = 8
+# Pages (next_token) lues au plus par recherche de veille
+SEARCH_MAX_PAGES = int(os.getenv("TWITTER_SEARCH_MAX_PAGES", "3"))
 
-    if not all([api_key, api_secret, access_token, access_token_secret]):
+class TwitterClients:
+    """Clients v2 (tweepy.Client) et v1.1 (tweepy.API, médias) d'un jeu d'identifiants."""
+    def __init__(self, credentials: tuple):
+        api_key, api_secret, access_token, access_token_secret = credentials
+        self.v2 = tweepy.Client(
+            consumer_key=api_key,
+            consumer_secret=api_secret,
+            access_token=access_token,
+            access_token_secret=access_token_secret
+        )
+        auth = tweepy.OAuth1UserHandler(
+            api_key,
+            api_secret,
+            access_token,
+            access_token_secret
+        )
+        self.v1 = tweepy.API(auth)
+        # Pool de connexions HTTP réutilisées : plus de handshake TLS à chaque envoi
+        for client in (self.v2, self.v1):
+            session = getattr(client, 'session', None)
+            if isinstance(session, requests.Session):
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=TWITTER_POOL_SIZE)
+                session.mount("https://", adapter)
+                # En-têtes x-rate-limit-* de chaque réponse, lus sans appel supplémentaire
+                session.hooks['response'].append(rate_limits.capture_response)
+
+    def close(self):
+        for client in (self.v2, self.v1):
+            session = getattr(client, 'session', None)
+            if isinstance(session, requests.Session):
+                session.close()
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+def get_credentials(env_prefix: str = "TWITTER_") -> tuple | None:
+    """Identifiants Twitter de l'environnement ({env_prefix}API_KEY, ...), ou None s'il en manque."""
+    credentials = (
+        os.getenv(f"{env_prefix}API_KEY"),
+        os.getenv(f"{env_prefix}API_SECRET"),
+        os.getenv(f"{env_prefix}ACCESS_TOKEN"),
+        os.getenv(f"{env_prefix}ACCESS_TOKEN_SECRET")
+    )
+    return credentials if all(credentials) else None
+
+def get_clients(credentials: tuple | None = None) -> TwitterClients | None:
+    """
+    Retourne les clients Twitter du jeu d'identifiants (par défaut ceux de l'environnement),
+    créés une seule fois puis réutilisés. Une rotation d'identifiants crée de nouveaux clients ;
+    les plus anciens sont fermés au-delà de MAX_CLIENT_SETS.
+    """
+    credentials = credentials or get_credentials()
+    if not credentials:
         return None
+    
+    with _clients_lock:
+        clients = _clients.get(credentials)
+        if clients is None:
+            clients = TwitterClients(credentials)
+            _clients[credentials] = clients
+            while len(_clients) > MAX_CLIENT_SETS:
+                _, evicted = _clients.popitem(last=False)
+                evicted.close()
+        else:
+            _clients.move_to_end(credentials)
+        return clients
+
+def reset_twitter_clients():
+    """Ferme et oublie tous les clients (tests, rotation forcée)."""
+    with _clients_lock:
+        for clients in _clients.values():
+            clients.close()
+        _clients.clear()
+
+def get_twitter_client():
+    """Retourne le client Twitter v2 partagé (None si les identifiants manquent)."""
+    clients = get_clients()
+    return clients.v2 if clients else None
+
+def get_account_clients(account: dict | None = None) -> tuple[str, TwitterClients | None]:
+    """
+    Nom du compte (clé de ses rate limits et de son cache média) et ses clients.
+    Sans compte : identifiants TWITTER_* du .env, sous le nom du compte par défaut.
+    Les clients sont None si les identifiants manquent.
+    """
+    if not account:
+        return rate_limits.default_account_name(), get_clients()
+    credentials = get_credentials(account.get('env_prefix') or "TWITTER_")
+    return account['name'], get_clients(credentials) if credentials else None
+
+@dataclass
+class PostResult:
+    """
+    Résultat d'une publication (tweet ou thread).
+
+    status : 'sent', 'rate_limited' (à retenter après retry_after) ou 'failed'.
+    error_class : nom de la classe d'erreur (ex: 'Forbidden', 'TooManyRequests', 'MissingCredentials').
+    Les durées (ms) détaillent le téléchargement et l'upload de l'image puis la publication.
+    """
+    status: str
+    tweet_id: str | None = None
+    error: str | None = None
+    error_class: str | None = None
+    retry_after: datetime | None = None
+    posted_ids: list[str] = field(default_factory=list)
+    without_links: bool = False
+    download_ms: int = 0
+    upload_ms: int = 0
+    post_ms: int = 0
 
-    return tweepy.Client(
-        consumer_key=api_key,
-        consumer_secret=api_secret,
-        access_token=access_token,
-        access_token_secret=access_token_secret
+    @property
+    def ok(self) -> bool:
+        return self.status == 'sent'
+
+    @property
+    def total_ms(self) -> int:
+        return self.download_ms + self.upload_ms + self.post_ms
+
+    def __str__(self) -> str:
+        """Message lisible (outil MCP, scripts)."""
+        if self.ok:
+            kind = f"Thread posted successfully ({len(self.posted_ids)} tweets)" if len(self.posted_ids) > 1 else "Tweet posted successfully"
+            return f"{kind}{' (without links)' if self.without_links else ''}! ID: {self.tweet_id}"
+        return f"Error posting tweet: {self.error}"
+
+MISSING_CREDENTIALS = "Twitter credentials not found in .env file."
+
+def _elapsed_ms(started: float) -> int:
+    return int((time.perf_counter() - started) * 1000)
+
+def _rate_limited(retry_at: datetime, context: str = "") -> PostResult:
+    return PostResult(
+        'rate_limited',
+        error=f"{context}429 Too Many Requests (rate limited until {retry_at:%Y-%m-%d %H:%M:%S})",
+        error_class='TooManyRequests',
+        retry_after=retry_at
     )
 
-def post_tweet(content: str, image_url: str = None) -> str:
+def prepare_media(image_url: str, account: dict | None = None) -> dict | None:
+    """
+    Uploade l'image d'un tweet sur Twitter (API v1.1), en réutilisant le media_id d'une image
+    déjà envoyée (même URL ou même contenu) tant qu'il est valide : un nouvel essai ne refait
+    ni le téléchargement ni l'upload.
+    Retourne {'media_id', 'expires_at', 'download_ms', 'upload_ms'}, ou None si l'upload échoue
+    (on publie sans image).
+    """
+    account_name, clients = get_account_clients(account)
+    if not clients:
+        return None
+    try:
+        cached = media.get_cached_media(account_name, source_url=image_url)
+        if cached:
+            return {**cached, 'download_ms': 0, 'upload_ms': 0}
+        if rate_limits.next_allowed_at(rate_limits.ENDPOINT_MEDIA, account_name):
+            print("Media upload rate limited: posting without image.")
+            return None
+        
+        # Téléchargement en streaming, plafonné en taille
+        started = time.perf_counter()
+        data = media.download_image(image_url)
+        download_ms = _elapsed_ms(started)
+        digest = media.image_hash(data)
+        cached = media.get_cached_media(account_name, image_hash=digest)
+        if cached:
+            # Même image sous une autre URL
+            media.cache_media_id(digest, account_name, image_url, cached['media_id'], expires_at=cached['expires_at'])
+            return {**cached, 'download_ms': download_ms, 'upload_ms': 0}
+        
+        # Format réel détecté, conversion et réduction aux limites de Twitter
+        started = time.perf_counter()
+        payload, fmt = media.prepare_image(data)
+        uploaded = clients.v1.media_upload(filename=f"image.{fmt}", file=io.BytesIO(payload))
+        media_id = str(uploaded.media_id)
+        expires_after = getattr(uploaded, 'expires_after_secs', None)
+        expires_at = media.cache_media_id(
+            digest, account_name, image_url, media_id, expires_after if isinstance(expires_after, int) else None
+        )
+        return {'media_id': media_id, 'expires_at': expires_at, 'download_ms': download_ms, 'upload_ms': _elapsed_ms(started)}
+        
+    except tweepy.errors.TooManyRequests as e:
+        rate_limits.record_rate_limited(rate_limits.ENDPOINT_MEDIA, account_name, headers=e.response.headers)
+        print(f"Failed to upload image: {e}")
+        return None
+    except Exception as img_error:
+        print(f"Failed to upload image: {img_error}")
+        # Continue sans image si ça échoue
+        return None
+
+def upload_media(image_url: str, account: dict | None = None) -> list:
+    """Retourne la liste des media_ids de l'image (vide si l'upload échoue)."""
+    prepared = prepare_media(image_url, account)
+    return [prepared['media_id']] if prepared else []
+
+def post_tweet(content: str, image_url: str = None, media_ids: list = None, account: dict = None) -> PostResult:
     """
-    Poste un tweet sur le compte configuré.
+    Poste un tweet sur le compte donné (par défaut, celui des identifiants TWITTER_* du .env).
     
     Args:
         content: Le contenu du tweet.
         image_url: URL optionnelle d'une image à attacher.
+        media_ids: media_ids déjà uploadés (pré-upload) : l'image n'est alors pas retraitée.
+        account: Compte de publication ({'name', 'env_prefix'}, ligne de la table accounts).
         
     Returns:
-        L'URL du tweet publié ou un message d'erreur.
+        PostResult (statut, ID du tweet publié ou erreur, durées).
     """
-    api_key = os.getenv("TWITTER_API_KEY")
-    api_secret = os.getenv("TWITTER_API_SECRET")
-    access_token = os.getenv("TWITTER_ACCESS_TOKEN")
-    access_token_secret = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
+    account_name, clients = get_account_clients(account)
+    if not clients:
+        return PostResult('failed', error=MISSING_CREDENTIALS, error_class='MissingCredentials')
+    client = clients.v2
 
-    if not all([api_key, api_secret, access_token, access_token_secret]):
-        return "Error: Twitter credentials not found in .env file."
+    retry_at = rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS, account_name)
+    if retry_at:
+        return _rate_limited(retry_at)
 
+    rate_limits.clear_last_rate_limit()
+    result = PostResult('failed')
     try:
-        client = tweepy.Client(
-            consumer_key=api_key,
-            consumer_secret=api_secret,
-            access_token=access_token,
-            access_token_secret=access_token_secret
-        )
-        
-        media_ids = []
-        
-        # Si une image est fournie, la télécharger et l'uploader
-        if image_url:
-            try:
-                # Télécharger l'image
-                response = requests.get(image_url, timeout=10)
-                response.raise_for_status()
-                
-                # Sauvegarder temporairement
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_file:
-                    tmp_file.write(response.content)
-                    tmp_path = tmp_file.name
-                
-                # Uploader sur Twitter (API v1.1 pour les médias)
-                auth = tweepy.OAuth1UserHandler(
-                    api_key,
-                    api_secret,
-                    access_token,
-                    access_token_secret
-                )
-                api_v1 = tweepy.API(auth)
-                media = api_v1.media_upload(tmp_path)
-                media_ids.append(media.media_id)
-                
-                # Nettoyer le fichier temporaire
-                os.unlink(tmp_path)
-                
-            except Exception as img_error:
-                print(f"Failed to upload image: {img_error}")
-                # Continue sans image si ça échoue
+        if not media_ids and image_url:
+            prepared = prepare_media(image_url, account)
+            media_ids = [prepared['media_id']] if prepared else []
+            if prepared:
+                result.download_ms, result.upload_ms = prepared['download_ms'], prepared['upload_ms']
         
         # Fonction interne pour poster
         def attempt_post(text, media_ids=None):
@@ -90,98 +254,201 @@ def post_tweet(content: str, image_url: str = None) -> str:
             else:
                 return client.create_tweet(text=text)
 
+        started = time.perf_counter()
         try:
             # Post du tweet principal
             response = attempt_post(content, media_ids)
-            main_tweet_id = response.data['id']
-            result_msg = f"Tweet posted successfully! ID: {main_tweet_id}"
-            
-            return result_msg
+            rate_limits.record_response(rate_limits.ENDPOINT_TWEETS, account_name)
 
         except tweepy.errors.Forbidden as e:
             # Si erreur 403 (souvent due à un lien bloqué ou contenu flaggé)
-            if "403" in str(e) and "http" in main_tweet_content:
+            if "403" in str(e) and "http" in content:
                 print(f"⚠️ 403 Forbidden detected. Retrying without links. Error: {e}")
                 
                 # Retirer les liens avec regex
-                clean_content = re.sub(r'http\S+', '', main_tweet_content).strip()
+                clean_content = re.sub(r'http\S+', '', content).strip()
                 
                 # Retenter sans lien (et sans image si c'était le problème, mais on garde l'image pour l'instant)
                 # Souvent c'est le lien dans le texte qui bloque
                 try:
                     response = attempt_post(clean_content, media_ids)
-                    return f"Tweet posted successfully (without links)! ID: {response.data['id']}"
+                    rate_limits.record_response(rate_limits.ENDPOINT_TWEETS, account_name)
+                    result.without_links = True
+                except tweepy.errors.TooManyRequests:
+                    # Rate limit pendant la reprise : l'envoi est différé (voir plus bas), pas en échec
+                    raise
                 except Exception as retry_error:
-                    return f"Error posting tweet (retry failed): {str(retry_error)}"
+                    result.post_ms = _elapsed_ms(started)
+                    result.error, result.error_class = f"(retry failed) {retry_error}", type(retry_error).__name__
+                    return result
             else:
                 raise e
+        
+        result.post_ms = _elapsed_ms(started)
+        result.status = 'sent'
+        result.tweet_id = str(response.data['id'])
+        result.posted_ids = [result.tweet_id]
+        return result
 
     except tweepy.errors.TooManyRequests as e:
-        print(f"⚠️ 429 Too Many Requests. Retrying in 15 minutes...")
-        # Si c'est un script long, on pourrait attendre, mais ici on retourne l'erreur pour que le scheduler réessaie plus tard
-        # Ou on implémente un petit retry si c'est juste un burst
-        import time
+        # Pas d'attente ici : la date de reprise est enregistrée et l'envoi sera retenté plus tard
+        retry_at = rate_limits.record_rate_limited(rate_limits.ENDPOINT_TWEETS, account_name, headers=e.response.headers)
+        limited = _rate_limited(retry_at)
+        limited.download_ms, limited.upload_ms = result.download_ms, result.upload_ms
+        return limited
+
+    except Exception as e:
+        result.error, result.error_class = str(e), type(e).__name__
+        return result
+
+def post_thread(content: str, image_url: str = None, parts: list[str] = None,
+                posted_ids: list[str] = None, on_part_posted=None, media_ids: list = None,
+                account: dict = None) -> PostResult:
+    """
+    Publie un thread : chaque partie répond à la précédente (in_reply_to_tweet_id).
+
+    L'upload de l'image du premier tweet démarre immédiatement, en parallèle de la
+    préparation des parties. Si posted_ids contient les IDs de parties déjà publiées
+    (envoi précédent interrompu), la publication reprend à la partie suivante.
+    
+    Args:
+        content: Le texte complet (découpé si parts n'est pas fourni).
+        image_url: URL optionnelle d'une image à attacher au premier tweet.
+        parts: Parties déjà découpées (colonne thread_content).
+        posted_ids: IDs Twitter des parties déjà publiées.
+        on_part_posted: Callback appelé avec la liste des IDs après chaque partie publiée.
+        media_ids: media_ids déjà uploadés pour le premier tweet (pré-upload).
+        account: Compte de publication (par défaut, celui du .env).
         
-        max_retries = 3
-        retry_delay = 60 # 1 minute initial delay
+    Returns:
+        PostResult : tweet_id est l'ID du premier tweet, posted_ids ceux de toutes les parties publiées.
+    """
+    account_name, clients = get_account_clients(account)
+    if not clients:
+        return PostResult('failed', error=MISSING_CREDENTIALS, error_class='MissingCredentials')
+    client = clients.v2
+
+    retry_at = rate_limits.next_allowed_at(rate_limits.ENDPOINT_TWEETS, account_name)
+    if retry_at:
+        return _rate_limited(retry_at)
+
+    rate_limits.clear_last_rate_limit()
+    posted_ids = list(posted_ids or [])
+    result = PostResult('failed', posted_ids=posted_ids)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        media_future = None
+        if image_url and not posted_ids and not media_ids:
+            media_future = executor.submit(prepare_media, image_url, account)
         
-        for attempt in range(max_retries):
-            try:
-                print(f"🔄 Retry attempt {attempt+1}/{max_retries} in {retry_delay}s...")
-                time.sleep(retry_delay)
-                
-                response = attempt_post(main_tweet_content, media_ids)
-                main_tweet_id = response.data['id']
-                result_msg = f"Tweet posted successfully (after retry)! ID: {main_tweet_id}"
-                
-                if thread_content:
-                    try:
-                        time.sleep(2) # Pause entre tweet et thread
-                        thread_response = attempt_post(thread_content, reply_to_id=main_tweet_id)
-                        result_msg += f" + Thread ID: {thread_response.data['id']}"
-                    except Exception:
-                        result_msg += " (Thread failed)"
-                
-                return result_msg
-                
-            except tweepy.errors.TooManyRequests:
-                retry_delay *= 2 # Exponential backoff
-                continue
-            except Exception as retry_error:
-                return f"Error posting tweet (retry failed): {str(retry_error)}"
+        # Préparation des parties pendant l'upload du média
+        parts = [part.strip() for part in (parts or split_into_thread(content))]
         
-        return f"Error posting tweet: 429 Too Many Requests (Max retries exceeded)"
+        for index in range(len(posted_ids), len(parts)):
+            kwargs = {'text': parts[index]}
+            if posted_ids:
+                kwargs['in_reply_to_tweet_id'] = posted_ids[-1]
+            if index == 0:
+                if media_future:
+                    prepared = media_future.result()
+                    media_ids = [prepared['media_id']] if prepared else []
+                    if prepared:
+                        result.download_ms, result.upload_ms = prepared['download_ms'], prepared['upload_ms']
+                if media_ids:
+                    kwargs['media_ids'] = media_ids
+            context = f"thread part {index + 1}/{len(parts)} ({len(posted_ids)} already posted): "
+            started = time.perf_counter()
+            try:
+                response = client.create_tweet(**kwargs)
+                rate_limits.record_response(rate_limits.ENDPOINT_TWEETS, account_name)
+            except tweepy.errors.TooManyRequests as e:
+                retry_at = rate_limits.record_rate_limited(rate_limits.ENDPOINT_TWEETS, account_name, headers=e.response.headers)
+                limited = _rate_limited(retry_at, context)
+                limited.posted_ids = posted_ids
+                limited.tweet_id = posted_ids[0] if posted_ids else None
+                return limited
+            except Exception as e:
+                result.post_ms += _elapsed_ms(started)
+                result.error, result.error_class = f"{context}{e}", type(e).__name__
+                result.tweet_id = posted_ids[0] if posted_ids else None
+                return result
+            result.post_ms += _elapsed_ms(started)
+            
+            posted_ids.append(str(response.data['id']))
+            if on_part_posted:
+                on_part_posted(posted_ids)
+    
+    result.status = 'sent'
+    result.tweet_id = posted_ids[0]
+    return result
 
-    except Exception as e:
-        return f"Error posting tweet: {str(e)}"
+@dataclass
+class SearchResult:
+    """
+    Résultat d'une recherche : tweets du plus récent au plus ancien.
+
+    truncated : la recherche s'est arrêtée avant le dernier tweet (limite de pages, rate limit
+    ou erreur) ; des tweets plus anciens que le dernier retourné peuvent manquer.
+    """
+    tweets: list[dict] = field(default_factory=list)
+    truncated: bool = False
 
-def search_tweets(query: str, max_results: int = 10) -> list[dict]:
+def search_tweets(query: str, max_results: int = 100, since_id: str | None = None,
+                  max_pages: int = SEARCH_MAX_PAGES, account: dict = None) -> SearchResult:
     """
-    Recherche des tweets récents.
+    Recherche des tweets récents, du plus récent au plus ancien.
+    Avec since_id, seuls les tweets plus récents que ce curseur sont demandés ; les pages
+    suivantes (next_token, max_results tweets par page) sont lues dans la limite de max_pages.
+    L'auteur est obtenu par expansion dans la même requête (pas d'appel par tweet).
     Note: Nécessite un accès API Basic ou Pro pour la recherche v2.
     """
-    client = get_twitter_client()
-    if not client:
-        return []
-        
+    account_name, clients = get_account_clients(account)
+    if not clients:
+        return SearchResult(truncated=True)
+    if rate_limits.next_allowed_at(rate_limits.ENDPOINT_SEARCH, account_name):
+        return SearchResult(truncated=True)
+
+    params = {
+        'query': query,
+        # L'API v2 impose 10 à 100 résultats par page
+        'max_results': max(10, min(max_results, 100)),
+        'tweet_fields': ['created_at', 'author_id'],
+        'expansions': ['author_id'],
+        'user_fields': ['username'],
+    }
+    if since_id:
+        params['since_id'] = str(since_id)
+
+    results = []
+    next_token = None
     try:
-        # search_recent_tweets est pour l'API v2
-        tweets = client.search_recent_tweets(query=query, max_results=max_results, tweet_fields=['created_at', 'author_id'])
-        if not tweets.data:
-            return []
-            
-        results = []
-        for tweet in tweets.data:
-            results.append({
-                'id': tweet.id,
-                'text': tweet.text,
-                'created_at': tweet.created_at
-            })
-        return results
+        for _ in range(max(1, max_pages)):
+            rate_limits.clear_last_rate_limit()
+            # search_recent_tweets est pour l'API v2
+            response = clients.v2.search_recent_tweets(**params, next_token=next_token)
+            rate_limits.record_response(rate_limits.ENDPOINT_SEARCH, account_name)
+
+            users = {user.id: user.username for user in (response.includes or {}).get('users', [])}
+            for tweet in response.data or []:
+                results.append({
+                    'id': str(tweet.id),
+                    'text': tweet.text,
+                    'created_at': tweet.created_at,
+                    'username': users.get(tweet.author_id)
+                })
+
+            next_token = (response.meta or {}).get('next_token')
+            if not next_token:
+                return SearchResult(results)
+        # Limite de pages atteinte : il reste des tweets plus anciens
+        return SearchResult(results, truncated=True)
+    except tweepy.errors.TooManyRequests as e:
+        rate_limits.record_rate_limited(rate_limits.ENDPOINT_SEARCH, account_name, headers=e.response.headers)
+        print(f"Search rate limited, returning {len(results)} tweets")
+        return SearchResult(results, truncated=True)
     except Exception as e:
         # Fallback ou log
         print(f"Error searching tweets: {e}")
-        return []
+        return SearchResult(results, truncated=True)
 
 def get_top_french_tech_tweets() -> list[dict]:
     """
@@ -3,179 +3,381 @@ from datetime import datetime, timedelta
 import re
 import asyncio
 import logging
+import os
+import requests
+from urllib.parse import urlparse
+from tools import nitter_pool
+from tools.nitter_parser import parse_timeline_html, parse_nitter_date
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def scrape_top_french_tech_tweets() -> list[dict]:
+# Liste des sujets à chercher
+TOPICS = ["IA", "Twitch", "Crypto", "gaming"]
+# Budget global d'une récupération du top (secondes) : au-delà, résultats partiels
+NITTER_BUDGET_SECONDS = float(os.getenv("NITTER_BUDGET_SECONDS", "20"))
+NITTER_MAX_ATTEMPTS = 3
+NITTER_RETRY_BACKOFF_SECONDS = float(os.getenv("NITTER_RETRY_BACKOFF_SECONDS", "1"))
+# Timeline chargée, aucun résultat, ou page d'erreur (rate limit) : la page est prête à être lue
+TIMELINE_READY_SELECTOR = ".timeline-item, .timeline-none, .error-panel"
+# Marqueurs d'une vraie page de recherche Nitter dans la réponse HTTP (sinon : challenge anti-bot)
+TIMELINE_MARKERS = ('timeline-item', 'timeline-none', 'error-panel')
+NITTER_HTTP_TIMEOUT_SECONDS = float(os.getenv("NITTER_HTTP_TIMEOUT_SECONDS", "8"))
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+# Tweets analysés par sujet (les premiers de la timeline)
+TIMELINE_MAX_ITEMS = 15
+# Pages de statut relevées en parallèle lors du rafraîchissement des métriques des tweets suivis
+NITTER_REFRESH_CONCURRENCY = int(os.getenv("NITTER_REFRESH_CONCURRENCY", "4"))
+
+# Exécuté dans la page : texte, lien, date et statistiques des premiers .timeline-item, en un seul tableau
+EXTRACT_TIMELINE_JS = """
+(items, maxItems) => items.slice(0, maxItems).map(item => {
+    const pick = selector => item.querySelector(selector);
+    const content = pick('.tweet-content');
+    const link = pick('.tweet-link');
+    const date = pick('.tweet-date a');
+    const stats = pick('.tweet-stats');
+    return {
+        text: content ? content.innerText : '',
+        href: link ? link.getAttribute('href') : '',
+        date_title: date ? date.getAttribute('title') : null,
+        stats_text: stats ? stats.innerText : null,
+    };
+})
+"""
+
+def _parse_timeline_entry(entry: dict, topic: str) -> dict | None:
+    """Construit un tweet à partir d'une entrée extraite de la timeline (None s'il est filtré ou illisible)."""
+    try:
+        text = entry.get('text') or ""
+        
+        if len(text) < 10:
+            return None
+        
+        href = entry.get('href') or ""
+        
+        # Convertir nitter URL en twitter URL
+        if href.startswith('/'):
+            parts = href.split('#')[0].split('/')
+            if len(parts) >= 4:
+                username = parts[1]
+                tweet_id = parts[3]
+                tweet_url = f"https://twitter.com/{username}/status/{tweet_id}"
+            else:
+                return None
+        else:
+            return None
+        
+        date_title = entry.get('date_title')
+        
+        if not date_title:
+            return None
+        
+        # Date exacte (format: "Dec 20, 2023 · 3:45 PM UTC"), en heure locale
+        created_at = parse_nitter_date(date_title)
+        if not created_at:
+            return None
+        
+        # Filtrer : moins de 24h
+        if (datetime.now() - created_at) > timedelta(hours=24):
+            return None
+        
+        # Métriques (Nitter affiche likes et RT en texte)
+        stats_text = entry.get('stats_text')
+        likes = 0
+        retweets = 0
+        views = 0
+        
+        if stats_text:
+            # Parse format: "12 retweets, 34 likes, 10k views"
+            retweet_match = re.search(r'([\d,.]+[kKmM]?)\s*retweet', stats_text, re.IGNORECASE)
+            like_match = re.search(r'([\d,.]+[kKmM]?)\s*(?:like|quote)', stats_text, re.IGNORECASE)
+            view_match = re.search(r'([\d,.]+[kKmM]?)\s*view', stats_text, re.IGNORECASE)
+            
+            if retweet_match:
+                retweets = parse_twitter_number(retweet_match.group(1))
+            if like_match:
+                likes = parse_twitter_number(like_match.group(1))
+            if view_match:
+                views = parse_twitter_number(view_match.group(1))
+        
+        # Score d'engagement
+        score = likes + (retweets * 2)
+        
+        return {
+            'id': tweet_id,
+            'text': text,
+            'url': tweet_url,
+            'likes': likes,
+            'retweets': retweets,
+            'views': views,
+            'created_at': created_at,
+            'score': score,
+            'topic': topic
+        }
+    except Exception as e:
+        logger.warning(f"Error parsing tweet: {e}")
+        return None
+
+class NitterRateLimited(Exception):
+    """L'instance Nitter signale un rate limit."""
+
+class NitterBlocked(Exception):
+    """L'instance refuse les requêtes HTTP simples (anti-bot, challenge JS) : passer par le navigateur."""
+
+def _next_instance(tried: list[str]) -> str | None:
+    """
+    Instance la plus saine pas encore essayée pour ce sujet, sinon la plus saine déjà essayée.
+    Une instance en pause n'est jamais reprise : None si toutes sont en pause.
+    """
+    ranking = (
+        nitter_pool.ranked_instances(exclude=tried, allow_cooldown=False)
+        or nitter_pool.ranked_instances(allow_cooldown=False)
+    )
+    return ranking[0] if ranking else None
+
+def _search_url(instance: str, topic: str) -> str:
+    return f"{instance}/search?f=tweets&q={topic}%20lang%3Afr&since=&until=&near="
+
+def _is_rate_limited(html: str) -> bool:
+    return "Rate limit exceeded" in html or "Instance has been rate limited" in html
+
+async def _search_topic(topic: str, deadline: float, all_tweets: list, fetch_entries, instance: str | None = None) -> bool:
     """
-    Scrape Twitter pour récupérer les 3 tweets français tech les plus populaires des dernières 24h.
-    Sujets : IA, Twitch, Crypto, Jeux Vidéo.
+    Cherche un sujet sur `instance` puis, en cas d'échec (rate limit, erreur, timeline vide),
+    sur l'instance saine suivante. fetch_entries(url, timeout) retourne les entrées de la timeline.
+    Les tweets retenus sont ajoutés à all_tweets au fil de l'eau (résultats partiels si le budget expire).
     
     Returns:
-        Liste de dictionnaires contenant : id, text, url, likes, retweets, created_at, score
+        False si l'instance bloque ce mode d'accès (NitterBlocked), True sinon.
     """
-    
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            viewport={'width': 1920, 'height': 1080},
-            user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        )
-        page = await context.new_page()
-        
-        # Liste des sujets à chercher
-        topics = ["IA", "Twitch", "Crypto", "gaming"]
-        all_tweets = []
+    loop = asyncio.get_running_loop()
+    tried = []
+    instance = instance or _next_instance(tried)
+    # Retry logic pour chaque sujet (Nitter est instable)
+    for attempt in range(NITTER_MAX_ATTEMPTS):
+        remaining = deadline - loop.time()
+        if remaining <= 0 or not instance:
+            return True
+        tried.append(instance)
+        outcome = nitter_pool.OUTCOME_ERROR
+        started = loop.time()
+        latency_ms = 0.0
+        try:
+            logger.info(f"Searching for: {topic} on {instance} (Attempt {attempt+1}/{NITTER_MAX_ATTEMPTS})")
+            entries = await fetch_entries(_search_url(instance, topic), remaining)
+            latency_ms = (loop.time() - started) * 1000
+            logger.info(f"Found {len(entries)} timeline items for {topic} on {instance}")
+            
+            if not entries:
+                # Si pas de tweets, l'instance est peut-être dégradée : on essaie la suivante
+                logger.warning(f"No tweets found for {topic}, retrying...")
+                outcome = nitter_pool.OUTCOME_EMPTY
+            else:
+                outcome = nitter_pool.OUTCOME_OK
+                for entry in entries:
+                    tweet = _parse_timeline_entry(entry, topic)
+                    if tweet:
+                        all_tweets.append(tweet)
         
-        for topic in topics:
-            # Retry logic pour chaque sujet (Nitter est instable)
-            for attempt in range(3):
-                try:
-                    # URL de recherche Twitter adaptée (Twitter peut bloquer sans login)
-                    # On utilise nitter.poast.org (instance alternative plus stable)
-                    search_url = f"https://nitter.poast.org/search?f=tweets&q={topic}%20lang%3Afr&since=&until=&near="
-                    
-                    logger.info(f"Searching for: {topic} on Nitter (Attempt {attempt+1}/3)")
-                    
-                    # Utiliser domcontentloaded pour être plus rapide et éviter les timeouts sur des ressources tierces
-                    await page.goto(search_url, wait_until="domcontentloaded", timeout=30000)
-                    
-                    # Attendre un peu que le JS s'exécute si nécessaire (Nitter est SSR mais bon)
-                    await asyncio.sleep(2)
-                    
-                    # Vérifier si on a une erreur Nitter
-                    content = await page.content()
-                    if "Rate limit exceeded" in content or "Instance has been rate limited" in content:
-                        logger.warning(f"Nitter Rate Limit detected for {topic}")
-                        await asyncio.sleep(5) # Attendre plus longtemps
-                        continue
-                    
-                    # Nitter utilise des sélecteurs différents
-                    try:
-                        tweets = await page.query_selector_all('.timeline-item')
-                    except Exception as e:
-                        # Si le contexte est détruit, on retry
-                        logger.warning(f"Context error during query_selector: {e}")
-                        continue
-                        
-                    logger.info(f"Found {len(tweets)} timeline items for {topic}")
-                    
-                    if not tweets:
-                        # Si pas de tweets, peut-être que la page n'a pas chargé, on retry
-                        logger.warning(f"No tweets found for {topic}, retrying...")
-                        continue
-
-                    for tweet_elem in tweets[:15]:  # Analyser les 15 premiers
-                        try:
-                            # Extraire le texte
-                            text_elem = await tweet_elem.query_selector('.tweet-content')
-                            text = await text_elem.inner_text() if text_elem else ""
-                            
-                            if len(text) < 10:
-                                continue
-                            
-                            # Extraire le lien
-                            link_elem = await tweet_elem.query_selector('.tweet-link')
-                            href = await link_elem.get_attribute('href') if link_elem else ""
-                            
-                            # Convertir nitter URL en twitter URL
-                            if href.startswith('/'):
-                                parts = href.split('#')[0].split('/')
-                                if len(parts) >= 4:
-                                    username = parts[1]
-                                    tweet_id = parts[3]
-                                    tweet_url = f"https://twitter.com/{username}/status/{tweet_id}"
-                                else:
-                                    continue
-                            else:
-                                continue
-                            
-                            # Extraire la date
-                            date_elem = await tweet_elem.query_selector('.tweet-date a')
-                            date_title = await date_elem.get_attribute('title') if date_elem else None
-                            
-                            if not date_title:
-                                continue
-                            
-                            try:
-                                # Parse la date  (format: "Dec 20, 2023 · 3:45 PM UTC")
-                                created_at = datetime.strptime(date_title.split(' ·')[0], "%b %d, %Y")
-                                # On approxime l'heure à maintenant si pas disponible
-                                created_at = created_at.replace(hour=12, minute=0, tzinfo=None)
-                            except:
-                                continue
-                            
-                            # Filtrer : moins de 24h (approximation car Nitter ne donne pas toujours l'heure)
-                            if (datetime.now() - created_at) > timedelta(hours=24):
-                                continue
-                            
-                            # Extraire les métriques (Nitter affiche likes et RT en texte)
-                            stats_elem = await tweet_elem.query_selector('.tweet-stats')
-                            likes = 0
-                            retweets = 0
-                            views = 0
-                            
-                            if stats_elem:
-                                stats_text = await stats_elem.inner_text()
-                                # Parse format: "12 retweets, 34 likes, 10k views"
-                                retweet_match = re.search(r'([\d,.]+[kKmM]?)\s*retweet', stats_text, re.IGNORECASE)
-                                like_match = re.search(r'([\d,.]+[kKmM]?)\s*(?:like|quote)', stats_text, re.IGNORECASE)
-                                view_match = re.search(r'([\d,.]+[kKmM]?)\s*view', stats_text, re.IGNORECASE)
-                                
-                                if retweet_match:
-                                    retweets = parse_twitter_number(retweet_match.group(1))
-                                if like_match:
-                                    likes = parse_twitter_number(like_match.group(1))
-                                if view_match:
-                                    views = parse_twitter_number(view_match.group(1))
-                            
-                            # Score d'engagement
-                            score = likes + (retweets * 2)
-
-                            # Filtrer par vues (10k minimum)
-                            # Note: Si les vues ne sont pas affichées (0), on garde si le score est très élevé (>1000)
-                            # car certaines instances Nitter n'affichent pas les vues.
-                            # Mais l'user a demandé "10 000 views sinon on ne garde pas"
-                            # Donc on va être strict.
-                            if views < 10000:
-                                 # Exception : Si on a vraiment beaucoup d'engagement (ex: 500 likes) mais que Nitter n'affiche pas les vues (views=0)
-                                 # On pourrait vouloir le garder. Mais pour l'instant, respectons la consigne stricte.
-                                 # Sauf si views == 0 (info manquante) ET score > 500 (banger probable)
-                                 if views == 0 and score > 500:
-                                     pass # On garde au bénéfice du doute
-                                 else:
-                                     continue
-                            
-                            all_tweets.append({
-                                'id': tweet_id,
-                                'text': text,
-                                'url': tweet_url,
-                                'likes': likes,
-                                'retweets': retweets,
-                                'views': views,
-                                'created_at': created_at,
-                                'score': score,
-                                'topic': topic
-                            })
-                            
-                        except Exception as e:
-                            logger.warning(f"Error parsing tweet: {e}")
-                            continue
-                    
-                    # Si on arrive ici sans erreur majeure, on break la boucle de retry
-                    break
-                    
-                except Exception as e:
-                    logger.error(f"Error searching for {topic} (Attempt {attempt+1}): {e}")
-                    await asyncio.sleep(2)
-                    continue
+        except NitterBlocked as e:
+            logger.info(f"{instance} blocks {topic} search: {e}")
+            return False
+        except NitterRateLimited:
+            logger.warning(f"Nitter Rate Limit detected for {topic} on {instance}")
+            latency_ms = (loop.time() - started) * 1000
+            outcome = nitter_pool.OUTCOME_RATE_LIMITED
+        except Exception as e:
+            logger.error(f"Error searching for {topic} on {instance} (Attempt {attempt+1}): {e}")
+            if loop.time() >= deadline:
+                # Interrompu par le budget global : pas imputable à l'instance
+                return True
         
-        await browser.close()
+        nitter_pool.record_result(instance, outcome, latency_ms)
+        if outcome == nitter_pool.OUTCOME_OK:
+            return True
         
-        # Trier par score et retourner top 3
-        all_tweets.sort(key=lambda x: x['score'], reverse=True)
-        return all_tweets[:3]
+        previous, instance = instance, _next_instance(tried)
+        if instance == previous:
+            # Aucune autre instance disponible : courte pause avant de réessayer la même
+            await asyncio.sleep(NITTER_RETRY_BACKOFF_SECONDS * (attempt + 1))
+    return True
+
+def _http_get(url: str, timeout: float) -> requests.Response:
+    return requests.get(url, headers={'User-Agent': USER_AGENT, 'Accept-Language': 'fr,en'}, timeout=timeout)
+
+async def _fetch_topic_http(topic: str, deadline: float, all_tweets: list, instance: str | None = None) -> bool:
+    """Recherche d'un sujet par simple requête HTTP (pages Nitter rendues côté serveur), sans navigateur."""
+    async def fetch_entries(url: str, timeout: float) -> list[dict]:
+        response = await asyncio.to_thread(_http_get, url, min(timeout, NITTER_HTTP_TIMEOUT_SECONDS))
+        if response.status_code == 429 or _is_rate_limited(response.text):
+            raise NitterRateLimited()
+        if response.status_code in (401, 403, 503) or not any(marker in response.text for marker in TIMELINE_MARKERS):
+            # Challenge anti-bot ou page inattendue : seul un vrai navigateur passera
+            raise NitterBlocked(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        return parse_timeline_html(response.text, TIMELINE_MAX_ITEMS)
+    
+    return await _search_topic(topic, deadline, all_tweets, fetch_entries, instance)
+
+async def _scrape_topic(context, topic: str, deadline: float, all_tweets: list, instance: str | None = None):
+    """Recherche d'un sujet dans sa propre page du contexte Playwright partagé (repli si HTTP est bloqué)."""
+    loop = asyncio.get_running_loop()
+    page = await context.new_page()
+    
+    async def fetch_entries(url: str, timeout: float) -> list[dict]:
+        # Utiliser domcontentloaded pour être plus rapide et éviter les timeouts sur des ressources tierces
+        await page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
+        # Attente événementielle : la timeline, ou la page d'erreur / de résultat vide de Nitter
+        await page.wait_for_selector(TIMELINE_READY_SELECTOR, timeout=max(deadline - loop.time(), 0.1) * 1000)
+        if _is_rate_limited(await page.content()):
+            raise NitterRateLimited()
+        # Toute la timeline en un seul aller-retour (au lieu de ~8 par tweet)
+        return await page.eval_on_selector_all('.timeline-item', EXTRACT_TIMELINE_JS, TIMELINE_MAX_ITEMS)
+    
+    try:
+        await _search_topic(topic, deadline, all_tweets, fetch_entries, instance)
+    finally:
+        await page.close()
+
+async def _run_until(coroutines: list, deadline: float, label: str) -> list:
+    """Lance les recherches en parallèle ; celles encore en cours à l'échéance sont annulées (résultat None)."""
+    tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+    timeout = max(deadline - asyncio.get_running_loop().time(), 0)
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        logger.warning(f"Nitter budget exhausted ({label}): {len(pending)} topics cancelled, returning partial results")
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return [task.result() if task in done and not task.exception() else None for task in tasks]
+
+def _passes_view_filter(tweet: dict) -> bool:
+    """
+    Filtre du top : 10 000 vues minimum.
+    Certaines instances Nitter n'affichent pas les vues (0) : on garde alors un tweet à fort
+    engagement (score > 500, banger probable) au bénéfice du doute.
+    """
+    if tweet['views'] >= 10000:
+        return True
+    return tweet['views'] == 0 and tweet['score'] > 500
+
+def top_by_engagement(tweets: list[dict], limit: int = 3) -> list[dict]:
+    """Top d'un relevé : tweets d'au moins 10k vues, triés par score (likes + 2 x retweets)."""
+    ranked = sorted((tweet for tweet in tweets if _passes_view_filter(tweet)), key=lambda x: x['score'], reverse=True)
+    return ranked[:limit]
+
+async def collect_french_tech_tweets(budget_seconds: float = None, use_browser: bool = True) -> list[dict]:
+    """
+    Scrape Twitter pour relever tous les tweets français tech des dernières 24h (sans filtre de vues).
+    Sujets : IA, Twitch, Crypto, Jeux Vidéo, cherchés en parallèle et répartis sur les instances
+    Nitter les plus saines (NITTER_INSTANCES), avec bascule en cas d'échec.
+    Les pages sont d'abord récupérées en HTTP simple ; Chromium n'est lancé que pour les sujets
+    dont l'instance bloque ce mode d'accès (jamais si use_browser=False, ex: depuis le worker).
+    Au-delà de budget_seconds (défaut : NITTER_BUDGET_SECONDS), les recherches en cours sont
+    abandonnées et les tweets déjà collectés sont retournés.
+    
+    Returns:
+        Liste de dictionnaires contenant : id, text, url, likes, retweets, views, created_at, score, topic
+    """
+    budget_seconds = NITTER_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget_seconds
+    all_tweets = []
+    
+    # Sujets répartis sur les instances les plus saines, en parallèle
+    assignments = nitter_pool.assign_instances(TOPICS)
+    results = await _run_until(
+        [_fetch_topic_http(topic, deadline, all_tweets, assignments.get(topic)) for topic in TOPICS], deadline, "http"
+    )
+    blocked = [topic for topic, handled in zip(TOPICS, results) if handled is False]
+    
+    if blocked and use_browser and loop.time() < deadline:
+        logger.info(f"HTTP access blocked for {blocked}, falling back to Playwright")
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            try:
+                context = await browser.new_context(viewport={'width': 1920, 'height': 1080}, user_agent=USER_AGENT)
+                await _run_until(
+                    [_scrape_topic(context, topic, deadline, all_tweets, assignments.get(topic)) for topic in blocked],
+                    deadline, "browser"
+                )
+            finally:
+                await browser.close()
+    
+    return all_tweets
+
+def _entry_tweet_id(entry: dict) -> str | None:
+    parts = (entry.get('href') or '').split('#')[0].split('/')
+    return parts[3] if len(parts) >= 4 else None
+
+async def _fetch_tweet_http(tweet: dict, instance: str, deadline: float) -> dict | None:
+    """Métriques actuelles d'un tweet suivi, lues sur sa page de statut Nitter (None si illisible)."""
+    loop = asyncio.get_running_loop()
+    url = f"{instance}{urlparse(tweet['url']).path}"
+    started = loop.time()
+    try:
+        response = await asyncio.to_thread(_http_get, url, min(max(deadline - started, 0.1), NITTER_HTTP_TIMEOUT_SECONDS))
+    except Exception as e:
+        logger.warning(f"Error refreshing tweet {tweet['id']} on {instance}: {e}")
+        nitter_pool.record_result(instance, nitter_pool.OUTCOME_ERROR)
+        return None
+    latency_ms = (loop.time() - started) * 1000
+    
+    if response.status_code == 429 or _is_rate_limited(response.text):
+        nitter_pool.record_result(instance, nitter_pool.OUTCOME_RATE_LIMITED, latency_ms)
+        return None
+    if response.status_code == 404:
+        return None # Tweet supprimé : pas imputable à l'instance
+    if response.status_code != 200:
+        nitter_pool.record_result(instance, nitter_pool.OUTCOME_ERROR, latency_ms)
+        return None
+    nitter_pool.record_result(instance, nitter_pool.OUTCOME_OK, latency_ms)
+    
+    # La page de statut liste aussi les tweets parents et les réponses : seul le tweet suivi compte
+    for entry in parse_timeline_html(response.text, TIMELINE_MAX_ITEMS):
+        if _entry_tweet_id(entry) == tweet['id']:
+            return _parse_timeline_entry(entry, tweet.get('topic'))
+    return None
+
+async def refresh_tweet_metrics(tweets: list[dict], budget_seconds: float = None) -> list[dict]:
+    """
+    Relève à nouveau les métriques de tweets déjà suivis ({id, url, topic}) sur leur page de statut
+    Nitter, en HTTP simple, réparties sur les instances disponibles. Au-delà de budget_seconds
+    (défaut : NITTER_BUDGET_SECONDS), retourne les tweets déjà relevés.
+    
+    Returns:
+        Liste de dictionnaires au format de collect_french_tech_tweets
+    """
+    if not tweets:
+        return []
+    instances = nitter_pool.ranked_instances(allow_cooldown=False)
+    if not instances:
+        logger.warning("All Nitter instances cooling down, tracked tweets not refreshed")
+        return []
+    
+    budget_seconds = NITTER_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget_seconds
+    semaphore = asyncio.Semaphore(NITTER_REFRESH_CONCURRENCY)
+    
+    async def refresh(index: int, tweet: dict):
+        async with semaphore:
+            if loop.time() >= deadline:
+                return None
+            return await _fetch_tweet_http(tweet, instances[index % len(instances)], deadline)
+    
+    results = await _run_until([refresh(i, tweet) for i, tweet in enumerate(tweets)], deadline, "refresh")
+    return [tweet for tweet in results if tweet]
+
+async def scrape_top_french_tech_tweets(budget_seconds: float = None, use_browser: bool = True) -> list[dict]:
+    """
+    Récupère les 3 tweets français tech les plus populaires des dernières 24h (voir collect_french_tech_tweets).
+    
+    Returns:
+        Liste de dictionnaires contenant : id, text, url, likes, retweets, views, created_at, score, topic
+    """
+    return top_by_engagement(await collect_french_tech_tweets(budget_seconds, use_browser))
 
 def parse_twitter_number(text: str) -> int:
     """